@@ -0,0 +1,137 @@
+"""
+Native async versions of the mock PSP endpoints and the webhook listener.
+
+They share the scenario logic with core/views.py but write to the database
+through the async ORM (or the ingestion buffer) and send callbacks with a
+shared httpx client, so a slow callback never pins a worker. Enabled via
+ASYNC_API_VIEWS (see urls.py).
+"""
+
+from asgiref.sync import sync_to_async
+from django.views.decorators.csrf import csrf_exempt
+
+from core.fastjson import FastJsonResponse, parse_body
+from core.faults import inject_faults
+from core.idempotency import idempotent
+from core.ingest import astore_webhook_log
+from core.ledger import get_ledger
+from core.log import get_logger
+from core.views import (
+    TRANSACTION_CALLBACK, WITHDRAWAL_CALLBACK,
+    _account_result, _callback_log_fields, _listener_log_fields,
+    _transaction_result, _withdraw_result,
+)
+
+logger = get_logger(__name__)
+
+
+async def _scenario(result_fn, body):
+    """
+    Runs a scenario function; with the persistent ledger tier it touches the
+    sync ORM, so it goes to a thread.
+    """
+    if get_ledger().persist:
+        return await sync_to_async(result_fn)(body)
+    return result_fn(body)
+
+
+async def _aemit_callback(kind, callback_url, callback_payload):
+    """
+    Async counterpart of core.views._emit_callback.
+    """
+    logger.debug("callback.processing", type=kind['type'], callback_url=callback_url)
+
+    # ALWAYS save callback to our local DB (Webhook Inbox)
+    try:
+        await astore_webhook_log(**_callback_log_fields(kind, callback_url, callback_payload))
+        logger.debug("callback.stored", type=kind['type'])
+    except Exception:
+        logger.exception("callback.store_failed", type=kind['type'])
+
+    # ALSO send to external callback URL if provided
+    if callback_url:
+        try:
+            from core.delivery import adispatch_callback
+            if not await adispatch_callback(callback_url, callback_payload, delay=kind["delay"]):
+                logger.warning("callback.rejected", url=callback_url, reason="queue full")
+            else:
+                logger.debug("callback.queued", url=callback_url, delay=kind["delay"])
+        except Exception:
+            logger.exception("callback.dispatch_failed", url=callback_url)
+
+
+@csrf_exempt
+@inject_faults('get_account')
+async def mock_get_account(request):
+    """
+    Simulates: api/get-eligible-account/ (async)
+    """
+    if request.method != 'POST':
+        return FastJsonResponse({'error': 'Method not allowed'}, status=405)
+
+    try:
+        body = parse_body(request)
+        return FastJsonResponse(_account_result(body))
+    except Exception as e:
+        return FastJsonResponse({'error': str(e)}, status=400)
+
+
+@csrf_exempt
+@inject_faults('create_transaction')
+@idempotent('create_transaction')
+async def mock_create_transaction(request):
+    """
+    Simulates: api/create-transaction/ (async)
+    """
+    if request.method != 'POST':
+        return FastJsonResponse({'error': 'Method not allowed'}, status=405)
+
+    try:
+        body = parse_body(request)
+        status, result_data, callback_payload = await _scenario(_transaction_result, body)
+        if callback_payload is not None:
+            await _aemit_callback(TRANSACTION_CALLBACK, body.get('callback_url'), callback_payload)
+        return FastJsonResponse(result_data, status=status)
+    except Exception as e:
+        logger.warning("transaction.error", error=str(e))
+        return FastJsonResponse({'error': str(e)}, status=400)
+
+
+@csrf_exempt
+@inject_faults('withdraw_request')
+@idempotent('withdraw_request')
+async def mock_withdraw_request(request):
+    """
+    Simulates: api/public/withdraw-request/ (async)
+    """
+    if request.method != 'POST':
+        return FastJsonResponse({'error': 'Method not allowed'}, status=405)
+
+    try:
+        body = parse_body(request)
+        status, result_data, callback_payload = await _scenario(_withdraw_result, body)
+        if callback_payload is not None:
+            await _aemit_callback(WITHDRAWAL_CALLBACK, body.get('callback_url'), callback_payload)
+        return FastJsonResponse(result_data, status=status)
+    except Exception as e:
+        return FastJsonResponse({'error': str(e)}, status=400)
+
+
+@csrf_exempt
+@inject_faults('webhook_listener')
+async def webhook_listener(request):
+    """
+    Accepts ANY webhook and stores it for inspection (async).
+    URL: /api/webhook-listener/
+    """
+    try:
+        fields = _listener_log_fields(request)
+        log = await astore_webhook_log(**fields)
+        logger.info("webhook.received", method=request.method, log_id=str(log.id),
+                    sender_ip=fields["sender_ip"], body=fields["body"])
+
+        return FastJsonResponse({"status": "received", "log_id": str(log.id)}, status=200)
+
+    except Exception as e:
+        logger.exception("webhook.store_failed", method=request.method)
+        return FastJsonResponse({"error": str(e)}, status=500)
@@ -0,0 +1,275 @@
+"""
+Reproducible end-to-end benchmark of the mock API and webhook listener.
+
+``LocalServer`` migrates a scratch SQLite database and starts gunicorn on it
+(gthread or uvicorn workers), ``CallbackReceiver`` stands in for a merchant's
+callback endpoint, and each scenario is a core.loadtest run against one
+endpoint. Results are plain JSON so they can be kept as baselines and
+compared by ``compare()``, which flags p99 and throughput regressions.
+
+Deliberately free of Django imports, like core/loadtest.py: the server runs
+in its own processes with its own settings.
+"""
+import json
+import os
+import platform
+import socket
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from core.loadtest import LatencyHistogram
+
+BENCH_USER = 'bench'
+BENCH_PASSWORD = 'bench-password'
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+class CallbackReceiver:
+    """
+    Threaded HTTP server answering 200 to every POST. Payloads whose
+    ``order_id`` is ``bench-<seq>-<send time ns>`` (see scenarios in the
+    bench_api command) give the request-to-callback lag.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.lag = LatencyHistogram()
+        self.received = 0
+        self.first = self.last = None
+        receiver = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+                self.send_response(200)
+                self.send_header('Content-Length', '2')
+                self.end_headers()
+                self.wfile.write(b'ok')
+                receiver.record(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', free_port()), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/callback"
+        self.thread = threading.Thread(target=self.server.serve_forever, name='bench-callbacks', daemon=True)
+
+    def record(self, body):
+        now = time.time_ns()
+        try:
+            sent = int(json.loads(body)['order_id'].rsplit('-', 1)[1])
+        except (ValueError, KeyError, IndexError, TypeError):
+            sent = None
+        with self.lock:
+            self.received += 1
+            self.first = self.first or time.perf_counter()
+            self.last = time.perf_counter()
+            if sent:
+                self.lag.record((now - sent) / 1e6)
+
+    def reset(self):
+        with self.lock:
+            self.lag = LatencyHistogram()
+            self.received = 0
+            self.first = self.last = None
+
+    def wait(self, expected, timeout):
+        """
+        Waits until ``expected`` callbacks arrived or no new one came for ``timeout`` seconds.
+        """
+        seen, idle_since = -1, time.monotonic()
+        while self.received < expected:
+            if self.received != seen:
+                seen, idle_since = self.received, time.monotonic()
+            elif time.monotonic() - idle_since > timeout:
+                break
+            time.sleep(0.05)
+
+    def summary(self, expected):
+        with self.lock:
+            span = (self.last - self.first) if self.received > 1 else None
+            return {
+                "expected": expected,
+                "received": self.received,
+                "lost": max(expected - self.received, 0),
+                "callbacks_per_sec": round(self.received / span, 2) if span else None,
+                "lag": self.lag.summary(),
+            }
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class LocalServer:
+    """
+    gunicorn (with gunicorn.conf.py) serving this project on a scratch
+    database, with a superuser for the login_required endpoints. ``env``
+    overrides settings (DB_PROFILE, WEBHOOK_LOG_BATCH_SIZE, ...).
+    """
+
+    def __init__(self, workdir, server_mode='wsgi', workers=2, threads=8, env=None, manage_py='manage.py'):
+        self.workdir = workdir
+        self.manage_py = manage_py
+        self.port = free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        self.db_path = os.path.join(workdir, 'bench.sqlite3')
+        self.env = {
+            **os.environ,
+            'DB_PATH': self.db_path,
+            'SERVER_MODE': server_mode,
+            'GUNICORN_BIND': f"127.0.0.1:{self.port}",
+            'WEB_CONCURRENCY': str(workers),
+            'GUNICORN_THREADS': str(threads),
+            'METRICS_DIR': os.path.join(workdir, 'metrics'),
+            'LOG_LEVEL': 'WARNING',
+            'DJANGO_SUPERUSER_USERNAME': BENCH_USER,
+            'DJANGO_SUPERUSER_EMAIL': 'bench@localhost',
+            'DJANGO_SUPERUSER_PASSWORD': BENCH_PASSWORD,
+            **(env or {}),
+        }
+        self.process = None
+        self.log = None
+
+    def _manage(self, *args):
+        subprocess.run([sys.executable, self.manage_py, *args], env=self.env, check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+
+    def command(self):
+        # The production profile, sized by the WEB_CONCURRENCY / GUNICORN_THREADS set above
+        config = os.path.join(os.path.dirname(os.path.abspath(self.manage_py)), 'gunicorn.conf.py')
+        return [sys.executable, '-m', 'gunicorn', '-c', config]
+
+    def start(self, timeout=30):
+        self._manage('migrate', '--noinput')
+        self._manage('createsuperuser', '--noinput')
+        self.log = open(os.path.join(self.workdir, 'server.log'), 'wb')
+        self.process = subprocess.Popen(self.command(), env=self.env, stdout=self.log, stderr=subprocess.STDOUT)
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"server exited with {self.process.returncode}, see {self.log.name}")
+            try:
+                requests.get(self.url + '/', timeout=1)
+                return self
+            except requests.RequestException:
+                time.sleep(0.2)
+        raise RuntimeError(f"server did not start within {timeout}s, see {self.log.name}")
+
+    def stop(self):
+        if self.process and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+        if self.log:
+            self.log.close()
+
+    def row_count(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            return conn.execute("SELECT count(*) FROM core_webhooklog").fetchone()[0]
+        finally:
+            conn.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def login_cookie(base_url, username=BENCH_USER, password=BENCH_PASSWORD):
+    """
+    Logs in through the login form and returns a Cookie header value.
+    """
+    with requests.Session() as session:
+        session.get(base_url + '/', timeout=10)
+        token = session.cookies.get('csrftoken')
+        resp = session.post(base_url + '/', data={'username': username, 'password': password,
+                                                  'csrfmiddlewaretoken': token},
+                            headers={'Referer': base_url + '/'}, timeout=10, allow_redirects=False)
+        if 'sessionid' not in session.cookies:
+            raise RuntimeError(f"login as {username!r} failed (HTTP {resp.status_code})")
+        return f"sessionid={session.cookies['sessionid']}; csrftoken={token}"
+
+
+def environment():
+    """
+    Where a result was measured; compare() warns when it differs from the baseline's.
+    """
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                timeout=5).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count(),
+            "git_commit": commit}
+
+
+def metrics_of(result):
+    """
+    Flat {name: (value, higher_is_better)} of the numbers compare() checks.
+    """
+    out = {}
+    for name, scenario in result["scenarios"].items():
+        out[f"{name}.throughput_rps"] = (scenario["throughput_rps"], True)
+        out[f"{name}.p99_ms"] = (scenario["latency"]["p99_ms"], False)
+        if scenario.get("db_rows_per_sec") is not None:
+            out[f"{name}.db_rows_per_sec"] = (scenario["db_rows_per_sec"], True)
+        if scenario.get("callbacks"):
+            out[f"{name}.callback_lag_p99_ms"] = (scenario["callbacks"]["lag"]["p99_ms"], False)
+    return out
+
+
+def compare(baseline, current, max_p99_regression=20.0, max_rps_regression=10.0):
+    """
+    Returns (rows, regressions, warnings). A p99 / lag more than
+    ``max_p99_regression`` percent higher, or a throughput / insert rate more
+    than ``max_rps_regression`` percent lower than the baseline is a regression.
+    """
+    warnings = []
+    if baseline.get("config") != current.get("config"):
+        warnings.append("benchmark config differs from the baseline; numbers may not be comparable")
+    base_env, cur_env = baseline.get("environment", {}), current.get("environment", {})
+    for key in ("cpus", "python", "platform"):
+        if base_env.get(key) != cur_env.get(key):
+            warnings.append(f"{key} differs: baseline {base_env.get(key)} vs now {cur_env.get(key)}")
+
+    base, cur = metrics_of(baseline), metrics_of(current)
+    rows, regressions = [], []
+    for name in sorted(set(base) | set(cur)):
+        if name not in base or name not in cur:
+            warnings.append(f"{name} only in {'baseline' if name in base else 'current run'}")
+            continue
+        (old, higher_is_better), (new, _) = base[name], cur[name]
+        if not old or new is None:
+            continue
+        change = (new - old) / old * 100
+        limit = max_rps_regression if higher_is_better else max_p99_regression
+        regressed = -change > limit if higher_is_better else change > limit
+        rows.append({"metric": name, "baseline": old, "current": new, "change_pct": round(change, 1),
+                     "regressed": regressed})
+        if regressed:
+            regressions.append(f"{name}: {old} -> {new} ({change:+.1f}%, limit {limit:g}%)")
+    return rows, regressions, warnings
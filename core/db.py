@@ -0,0 +1,22 @@
+"""
+SQLite connection tuning.
+
+Applied through the ``connection_created`` signal (wired up in CoreConfig.ready)
+because Django 5.0 has no ``init_command`` option for SQLite. The pragmas come
+from ``settings.SQLITE_PRAGMAS`` and are empty unless DB_PROFILE=performance.
+"""
+from django.conf import settings
+
+
+def apply_sqlite_pragmas(sender, connection, **kwargs):
+    """
+    Runs the configured PRAGMA statements on every new SQLite connection.
+    """
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = getattr(settings, 'SQLITE_PRAGMAS', {})
+    if not pragmas:
+        return
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
@@ -0,0 +1,371 @@
+"""
+Shared in-process webhook delivery engine.
+
+Callbacks are handed to a fixed pool of worker threads through a bounded
+queue, and every target host gets its own keep-alive ``requests.Session``,
+so a burst of transactions reuses a handful of connections instead of
+spawning one thread and one TCP/TLS handshake per callback.
+"""
+import heapq
+import itertools
+import os
+import queue
+import random
+import threading
+import time
+import weakref
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+from django.utils import timezone
+
+from core import metrics
+from core.log import get_logger
+
+logger = get_logger(__name__)
+
+
+class DeliveryEngine:
+    """
+    Fixed-size worker pool with a bounded job queue.
+
+    ``submit()`` blocks for at most ``enqueue_timeout`` seconds when the queue
+    is full and then rejects the job, so callers get backpressure instead of
+    an unbounded pile of pending callbacks.
+    """
+
+    def __init__(self, workers=16, queue_size=5000, timeout=5, enqueue_timeout=0.5):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.enqueue_timeout = enqueue_timeout
+
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._delayed = []  # heap of (due, seq, job)
+        self._delayed_cv = threading.Condition()
+        self._seq = itertools.count()
+        self._sessions = {}
+        self._sessions_lock = threading.Lock()
+        self._threads = []
+        self._start_lock = threading.Lock()
+        self._stopping = False
+
+        self._stats_lock = threading.Lock()
+        self._stats = {"submitted": 0, "rejected": 0, "delivered": 0, "failed": 0, "flushed_early": 0, "dropped": 0}
+
+    # --- Lifecycle ---
+
+    def start(self):
+        with self._start_lock:
+            if self._threads:
+                return
+            self._stopping = False
+            for i in range(self.workers):
+                t = threading.Thread(target=self._worker, name=f"webhook-delivery-{i}", daemon=True)
+                t.start()
+                self._threads.append(t)
+            t = threading.Thread(target=self._scheduler, name="webhook-delivery-scheduler", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def shutdown(self, timeout=5):
+        """
+        Stops the scheduler, moves delayed jobs into the queue (sent early
+        rather than lost with the process), lets workers drain the queue and
+        joins them. Jobs still unsent at the deadline are counted as dropped.
+        """
+        with self._start_lock:
+            if not self._threads:
+                return
+            deadline = time.monotonic() + timeout
+            with self._delayed_cv:
+                self._stopping = True
+                delayed = [job for _, _, job in sorted(self._delayed)]
+                self._delayed = []
+                self._delayed_cv.notify_all()
+            flushed = 0
+            for job in delayed:
+                try:
+                    self._queue.put(job, timeout=max(0, deadline - time.monotonic()))
+                except queue.Full:
+                    break
+                flushed += 1
+            if flushed:
+                self._count("flushed_early", flushed)
+                logger.info("callback.delayed_flushed", count=flushed)
+            for _ in range(self.workers):
+                try:
+                    self._queue.put(None, timeout=max(0, deadline - time.monotonic()))
+                except queue.Full:
+                    break
+            for t in self._threads:
+                t.join(max(0, deadline - time.monotonic()))
+            self._threads = []
+            dropped = len(delayed) - flushed + self._discard_queued()
+            if dropped:
+                self._count("dropped", dropped)
+                metrics.inc("callback_deliveries_total", dropped, transport="threaded", outcome="dropped")
+                logger.warning("callback.dropped_on_shutdown", count=dropped, timeout=timeout)
+            with self._sessions_lock:
+                for session in self._sessions.values():
+                    session.close()
+                self._sessions = {}
+
+    # --- Public API ---
+
+    def submit(self, url, payload, delay=0, on_result=None):
+        """
+        Queues a JSON POST to ``url``. Returns False if the queue is full.
+        ``on_result(status_code, text, latency_ms, error)`` runs on the worker thread.
+        """
+        self.start()
+        job = (url, payload, on_result)
+        if delay > 0:
+            with self._delayed_cv:
+                if len(self._delayed) + self._queue.qsize() >= self.queue_size:
+                    self._count("rejected")
+                    metrics.inc("callback_deliveries_total", transport="threaded", outcome="rejected")
+                    return False
+                heapq.heappush(self._delayed, (time.monotonic() + delay, next(self._seq), job))
+                self._delayed_cv.notify()
+        else:
+            try:
+                self._queue.put(job, timeout=self.enqueue_timeout)
+            except queue.Full:
+                self._count("rejected")
+                metrics.inc("callback_deliveries_total", transport="threaded", outcome="rejected")
+                return False
+        self._count("submitted")
+        return True
+
+    def stats(self):
+        with self._stats_lock:
+            data = dict(self._stats)
+        data.update({
+            "workers": self.workers,
+            "queue_size": self.queue_size,
+            "queued": self._queue.qsize(),
+            "delayed": len(self._delayed),
+            "hosts": len(self._sessions),
+        })
+        return data
+
+    def post(self, url, payload, timeout=None):
+        """
+        Sends one callback synchronously over the pooled session for its host.
+        Returns (status_code, text, latency_ms); raises on network errors.
+        """
+        session = self._session_for(url)
+        started = time.perf_counter()
+        try:
+            resp = session.post(url, json=payload, timeout=timeout or self.timeout)
+        except Exception:
+            metrics.record_delivery("threaded", None, time.perf_counter() - started)
+            raise
+        elapsed = time.perf_counter() - started
+        metrics.record_delivery("threaded", resp.status_code, elapsed)
+        return resp.status_code, resp.text, elapsed * 1000
+
+    # --- Internals ---
+
+    def _session_for(self, url):
+        parts = urlsplit(url)
+        key = (parts.scheme, parts.netloc)
+        session = self._sessions.get(key)
+        if session is None:
+            with self._sessions_lock:
+                session = self._sessions.get(key)
+                if session is None:
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.workers, max_retries=0)
+                    session.mount("http://", adapter)
+                    session.mount("https://", adapter)
+                    self._sessions[key] = session
+        return session
+
+    def _scheduler(self):
+        while True:
+            with self._delayed_cv:
+                while not self._stopping:
+                    if self._delayed:
+                        wait = self._delayed[0][0] - time.monotonic()
+                        if wait <= 0:
+                            break
+                        self._delayed_cv.wait(wait)
+                    else:
+                        self._delayed_cv.wait()
+                if self._stopping:
+                    return
+                _, _, job = heapq.heappop(self._delayed)
+            self._queue.put(job)
+
+    def _worker(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            url, payload, on_result = job
+            status_code, text, latency_ms, error = None, "", None, None
+            try:
+                status_code, text, latency_ms = self.post(url, payload)
+                self._count("delivered")
+                logger.info("callback.delivered", url=url, status=status_code,
+                            latency_ms=round(latency_ms, 2), response=text[:200])
+            except Exception as e:
+                error = str(e)
+                self._count("failed")
+                logger.warning("callback.failed", url=url, error=error)
+            if on_result is not None:
+                try:
+                    on_result(status_code, text, latency_ms, error)
+                except Exception:
+                    logger.exception("callback.result_handler_failed", url=url)
+
+    def _count(self, key, n=1):
+        with self._stats_lock:
+            self._stats[key] += n
+
+    def _discard_queued(self):
+        """
+        Empties the queue after shutdown; returns how many jobs were in it.
+        """
+        discarded = 0
+        while True:
+            try:
+                job = self._queue.get_nowait()
+            except queue.Empty:
+                return discarded
+            if job is not None:
+                discarded += 1
+
+
+_engine = None
+_engine_pid = None
+_engine_lock = threading.Lock()
+
+
+def get_engine():
+    """
+    Returns the process-wide engine, creating it lazily so forked gunicorn
+    workers never inherit a parent's (dead) threads.
+    """
+    global _engine, _engine_pid
+    pid = os.getpid()
+    if _engine is None or _engine_pid != pid:
+        with _engine_lock:
+            if _engine is None or _engine_pid != pid:
+                _engine = DeliveryEngine(
+                    workers=settings.WEBHOOK_DELIVERY_WORKERS,
+                    queue_size=settings.WEBHOOK_DELIVERY_QUEUE_SIZE,
+                    timeout=settings.WEBHOOK_DELIVERY_TIMEOUT,
+                    enqueue_timeout=settings.WEBHOOK_DELIVERY_ENQUEUE_TIMEOUT,
+                )
+                engine = _engine
+                metrics.gauge("callback_queue_depth", lambda: engine._queue.qsize() + len(engine._delayed))
+                _engine_pid = pid
+    return _engine
+
+
+def shutdown(timeout=5):
+    """
+    Drains this process's engine, if it has one (gunicorn worker_exit).
+    """
+    if _engine is not None and _engine_pid == os.getpid():
+        _engine.shutdown(timeout=timeout)
+
+
+def retry_delay(attempts, base=None, cap=None):
+    """
+    Exponential backoff with equal jitter for the ``attempts``-th failure:
+    half of the exponential step is fixed, the other half is random.
+    """
+    base = settings.WEBHOOK_OUTBOX_BACKOFF_BASE if base is None else base
+    cap = settings.WEBHOOK_OUTBOX_BACKOFF_CAP if cap is None else cap
+    step = min(cap, base * (2 ** max(0, attempts - 1)))
+    return step / 2 + random.uniform(0, step / 2)
+
+
+def _outbox_fields(url, payload, delay):
+    from datetime import timedelta
+    return {
+        "target_url": url,
+        "event": payload.get('event', ''),
+        "payload": payload,
+        "max_attempts": settings.WEBHOOK_OUTBOX_MAX_ATTEMPTS,
+        "next_attempt_at": timezone.now() + timedelta(seconds=delay),
+    }
+
+
+def dispatch_callback(url, payload, delay=0):
+    """
+    Hands a callback to the durable outbox when WEBHOOK_OUTBOX_ENABLED is set,
+    otherwise to the in-process engine. Returns False if it was rejected.
+    """
+    if settings.WEBHOOK_OUTBOX_ENABLED:
+        from core.models import OutboundCallback
+        OutboundCallback.objects.create(**_outbox_fields(url, payload, delay))
+        return True
+    return get_engine().submit(url, payload, delay=delay)
+
+
+# --- Async delivery (ASGI mode) ---
+
+_async_clients = weakref.WeakKeyDictionary()  # event loop -> httpx.AsyncClient
+_async_tasks = set()
+
+
+def _async_client():
+    """
+    One keep-alive httpx.AsyncClient per event loop (i.e. per uvicorn worker).
+    """
+    import asyncio
+    import httpx
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = httpx.AsyncClient(
+            timeout=settings.WEBHOOK_DELIVERY_TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=settings.WEBHOOK_DELIVERY_WORKERS * 4,
+                max_keepalive_connections=settings.WEBHOOK_DELIVERY_WORKERS,
+            ),
+        )
+        _async_clients[loop] = client
+    return client
+
+
+async def _apost(url, payload, delay):
+    import asyncio
+    if delay > 0:
+        await asyncio.sleep(delay)
+    started = time.perf_counter()
+    try:
+        resp = await _async_client().post(url, json=payload)
+        elapsed = time.perf_counter() - started
+        metrics.record_delivery("async", resp.status_code, elapsed)
+        logger.info("callback.delivered", url=url, status=resp.status_code,
+                    latency_ms=round(elapsed * 1000, 2), response=resp.text[:200])
+    except Exception as e:
+        metrics.record_delivery("async", None, time.perf_counter() - started)
+        logger.warning("callback.failed", url=url, error=str(e))
+
+
+async def adispatch_callback(url, payload, delay=0):
+    """
+    Async counterpart of dispatch_callback(). In-process callbacks run as
+    event-loop tasks; at most WEBHOOK_DELIVERY_QUEUE_SIZE may be pending.
+    """
+    import asyncio
+    if settings.WEBHOOK_OUTBOX_ENABLED:
+        from core.models import OutboundCallback
+        await OutboundCallback.objects.acreate(**_outbox_fields(url, payload, delay))
+        return True
+    if len(_async_tasks) >= settings.WEBHOOK_DELIVERY_QUEUE_SIZE:
+        metrics.inc("callback_deliveries_total", transport="async", outcome="rejected")
+        return False
+    task = asyncio.create_task(_apost(url, payload, delay))
+    _async_tasks.add(task)
+    task.add_done_callback(_async_tasks.discard)
+    return True
@@ -0,0 +1,311 @@
+"""
+Diagnostic probes behind run_diagnostic_test and the batch runner.
+
+``run_probe`` performs one request of a given test type; ``run_batch`` fans a
+list of targets x test types out over a bounded thread pool that shares one
+keep-alive connection pool, yielding each result as soon as it completes.
+"""
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from http.cookiejar import DefaultCookiePolicy
+
+import requests
+
+from core.timing import TimingAdapter, record_phases
+
+TEST_TYPES = ('browser', 'bot', 'http', 'custom')
+
+BROWSER_UA = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+DIAGNOSTIC_UA = "NexKasa-Diagnostic-Tool/1.0"
+
+CHUNK_SIZE = 64 * 1024
+PREVIEW_BYTES = 1024 * 1024          # largest body kept in memory (and parsed as JSON)
+MAX_BODY_BYTES = 10 * 1024 * 1024    # largest body counted before the probe gives up on it
+
+
+def make_session(pool_size=10):
+    """
+    Session for probes: pooled keep-alive connections, but no cookie jar
+    sharing between probes so one target's cookies never leak into another.
+    The adapter records per-phase timing (see core.timing).
+    """
+    session = requests.Session()
+    session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+    adapter = TimingAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+class BodyPreview:
+    """
+    A response body read under a byte budget: the first bytes are kept for
+    the preview, the rest is only counted (or not read at all).
+    """
+
+    def __init__(self, resp, data, size, complete, stopped, seconds, looks_like_json):
+        self.resp = resp
+        self.data = data
+        self.size = size
+        self.complete = complete
+        self.stopped = stopped
+        self.seconds = seconds
+        self.looks_like_json = looks_like_json
+
+    @property
+    def text(self):
+        return self.data.decode(self.resp.encoding or 'utf-8', errors='replace')
+
+    def json(self):
+        """
+        Parsed body. Raises ValueError unless the whole body is in the preview.
+        """
+        if not self.complete:
+            raise ValueError(f"Body truncated after {len(self.data)} bytes")
+        return json.loads(self.data)
+
+    def info(self):
+        declared = self.resp.headers.get('Content-Length')
+        return {
+            'bytes_read': self.size,
+            'content_length': int(declared) if declared and declared.isdigit() else None,
+            'preview_bytes': len(self.data),
+            'complete': self.complete,
+            'stopped': self.stopped,
+            'looks_like_json': self.looks_like_json,
+            'throughput_kbps': round(self.size / 1024 / self.seconds, 2) if self.seconds > 0 else None,
+        }
+
+
+def _sniff_json(chunk, content_type):
+    """
+    Decides from the first chunk whether the body is worth buffering for JSON.
+    """
+    if 'json' in content_type.lower():
+        return True
+    return chunk.lstrip(b'\xef\xbb\xbf \t\r\n')[:1] in (b'{', b'[')
+
+
+def read_body(resp, text_limit, preview_bytes=PREVIEW_BYTES, max_body_bytes=MAX_BODY_BYTES, deadline=None):
+    """
+    Streams ``resp`` in constant memory. Up to ``preview_bytes`` are kept when
+    the body looks like JSON, otherwise just enough for a ``text_limit``
+    character preview. Once the preview is full, reading stops early if the
+    server declared a Content-Length; an undeclared (chunked) body is counted
+    up to ``max_body_bytes`` or until ``deadline`` (monotonic), then dropped.
+    The connection is closed rather than reused when the body is not drained.
+    """
+    started = time.monotonic()
+    keep = None
+    data = bytearray()
+    size = 0
+    stopped = 'complete'
+    looks_like_json = False
+    declared = 'Content-Length' in resp.headers
+    try:
+        for chunk in resp.iter_content(CHUNK_SIZE):
+            if keep is None:
+                looks_like_json = _sniff_json(chunk, resp.headers.get('Content-Type', ''))
+                keep = preview_bytes if looks_like_json else min(preview_bytes, text_limit * 4)
+            size += len(chunk)
+            if len(data) < keep:
+                data += chunk[:keep - len(data)]
+            if size > keep and declared:
+                stopped = 'preview_full'
+                break
+            if size >= max_body_bytes:
+                stopped = 'byte_budget'
+                break
+            if deadline is not None and time.monotonic() > deadline:
+                stopped = 'deadline'
+                break
+        complete = stopped == 'complete' and size == len(data)
+        return BodyPreview(resp, bytes(data), size, complete, stopped, time.monotonic() - started, looks_like_json)
+    finally:
+        resp.close()
+
+
+def _send(session, recorder, method, url, text_limit, body_limits, **kwargs):
+    """
+    session.request with the body streamed here (see read_body), so its
+    transfer time is recorded and memory stays bounded. Returns (resp, body).
+    """
+    resp = session.request(method, url, stream=True, **kwargs)
+    body = read_body(resp, text_limit, deadline=time.monotonic() + kwargs.get('timeout', 10), **body_limits)
+    recorder.finish_body()
+    return resp, body
+
+
+def _json_or_text(body, limit):
+    try:
+        return body.json()
+    except ValueError:
+        return body.text[:limit]
+
+
+def run_probe(session, target_url, test_type, http_method='GET', payload=None, custom_headers=None, timeout=10,
+              preview_bytes=PREVIEW_BYTES, max_body_bytes=MAX_BODY_BYTES):
+    """
+    Runs one diagnostic request and returns the result dict shown by the dashboard,
+    including a ``timing`` breakdown (and per-hop timing for redirect chains) and
+    a ``body`` block with the size and throughput of the streamed response.
+    """
+    body_limits = {'preview_bytes': preview_bytes, 'max_body_bytes': max_body_bytes}
+    with record_phases() as recorder:
+        response_data = _run_probe(session, recorder, target_url, test_type, http_method,
+                                   payload, custom_headers, timeout, body_limits)
+    timing = recorder.summary()
+    if timing:
+        response_data['timing'] = timing
+    return response_data
+
+
+def _run_probe(session, recorder, target_url, test_type, http_method, payload, custom_headers, timeout, body_limits):
+    payload = {} if payload is None else payload
+    response_data = {}
+    headers = {}
+    verify_ssl = False # For local dev environments
+
+    if test_type == 'browser':
+        headers["User-Agent"] = BROWSER_UA
+        try:
+            resp, body = _send(session, recorder, http_method, target_url, 500, body_limits, headers=headers, json=payload, verify=verify_ssl, timeout=timeout)
+            response_data = {
+                'status_code': resp.status_code,
+                'method_used': resp.request.method,
+                'json': _json_or_text(body, 500) if resp.status_code == 200 else body.text[:500],
+                'body': body.info(),
+            }
+        except Exception as e:
+            response_data = {'error': str(e)}
+
+    elif test_type == 'bot':
+        headers["User-Agent"] = "" # Empty UA
+        try:
+            resp, body = _send(session, recorder, http_method, target_url, 500, body_limits, headers=headers, json=payload, verify=verify_ssl, timeout=timeout)
+            response_data = {
+                'status_code': resp.status_code,
+                'method_used': resp.request.method,
+                'json': _json_or_text(body, 500) if resp.status_code == 200 else body.text[:500],
+                'body': body.info(),
+            }
+        except Exception as e:
+            response_data = {'error': str(e)}
+
+    elif test_type == 'http':
+        # Force HTTP scheme
+        if target_url.startswith('https://'):
+            target_url = target_url.replace('https://', 'http://')
+        try:
+            resp, body = _send(session, recorder, http_method, target_url, 500, body_limits, json=payload, verify=verify_ssl, timeout=timeout)
+            response_data = {
+                'status_code': resp.status_code,
+                'method_used': resp.request.method,
+            }
+            if resp.history:
+                # Check for redirects
+                response_data['redirect_history'] = [r.url for r in resp.history]
+                response_data['final_url'] = resp.url
+            response_data['json'] = _json_or_text(body, 500) if resp.status_code == 200 else body.text[:500]
+            response_data['body'] = body.info()
+        except Exception as e:
+            response_data = {'error': str(e)}
+
+    elif test_type == 'custom':
+        # Fully custom request with Headers support (Postman-style)
+        request_headers = {"User-Agent": DIAGNOSTIC_UA}
+
+        # Merge custom headers from frontend
+        if custom_headers:
+            # Remove empty keys
+            clean_headers = {k: v for k, v in custom_headers.items() if k.strip()}
+            request_headers.update(clean_headers)
+
+        try:
+            resp, body = _send(
+                session,
+                recorder,
+                http_method,
+                target_url,
+                100000,
+                body_limits,
+                headers=request_headers,
+                json=payload,
+                verify=verify_ssl,
+                timeout=timeout
+            )
+
+            response_data = {
+                'status_code': resp.status_code,
+                'method_used': resp.request.method,
+                'headers_sent': dict(resp.request.headers),
+                'elapsed': resp.elapsed.total_seconds() * 1000, # ms
+                'response_headers': dict(resp.headers),
+                'body': body.info(),
+                # Try to parse JSON, if fails return text (up to 100KB) for HTML debugging
+                'json': _json_or_text(body, 100000)
+            }
+
+        except Exception as e:
+            response_data = {'error': str(e)}
+
+    return response_data
+
+
+def run_batch(jobs, concurrency=8, timeout=10, preview_bytes=PREVIEW_BYTES, max_body_bytes=MAX_BODY_BYTES):
+    """
+    Runs ``jobs`` (dicts with target_url, test_type and optional http_method,
+    payload, custom_headers) concurrently and yields
+    ``{"index", "target_url", "test_type", "duration_ms", "result"}`` in
+    completion order. Pending jobs are cancelled if the consumer stops early.
+    """
+    session = make_session(pool_size=concurrency)
+    pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="diagnostic")
+
+    def timed(job):
+        started = time.perf_counter()
+        result = run_probe(
+            session, job['target_url'], job['test_type'],
+            http_method=job.get('http_method', 'GET').upper(),
+            payload=job.get('payload'),
+            custom_headers=job.get('custom_headers'),
+            timeout=timeout,
+            preview_bytes=preview_bytes,
+            max_body_bytes=max_body_bytes,
+        )
+        return (time.perf_counter() - started) * 1000, result
+
+    try:
+        futures = {pool.submit(timed, job): (i, job) for i, job in enumerate(jobs)}
+        for future in as_completed(futures):
+            i, job = futures[future]
+            duration_ms, result = future.result()
+            yield {
+                "index": i,
+                "target_url": job['target_url'],
+                "test_type": job['test_type'],
+                "duration_ms": round(duration_ms, 2),
+                "result": result,
+            }
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+        session.close()
+
+
+def expand_jobs(targets, test_types, defaults=None):
+    """
+    Builds the targets x test_types job list. A target is a URL string or a
+    dict with target_url and per-target http_method / payload / custom_headers.
+    """
+    defaults = defaults or {}
+    jobs = []
+    for target in targets:
+        spec = {'target_url': target} if isinstance(target, str) else dict(target)
+        if not spec.get('target_url'):
+            raise ValueError("Every target needs a target_url")
+        for test_type in test_types:
+            if test_type not in TEST_TYPES:
+                raise ValueError(f"Unknown test_type: {test_type}")
+            jobs.append({**defaults, **spec, 'test_type': test_type})
+    return jobs
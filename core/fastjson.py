@@ -0,0 +1,71 @@
+"""
+JSON backend for the API views: orjson when it is installed (and allowed by
+JSON_BACKEND), the stdlib json module otherwise.
+
+``loads`` takes the request bytes as they are, with no intermediate str, and
+``FastJsonResponse`` is a drop-in for JsonResponse that serializes with the
+active backend. Anything orjson cannot encode natively (Decimal, lazy
+translations, ...) goes through DjangoJSONEncoder, as with JsonResponse.
+
+WebhookLog.raw_body and raw_text deliberately keep stdlib ``json.dumps``: the
+duplicate-raw-body check in core/ingest.py compares against that exact format.
+"""
+import json
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+BACKEND = 'orjson' if orjson is not None and settings.JSON_BACKEND in ('auto', 'orjson') else 'stdlib'
+
+_django_default = DjangoJSONEncoder().default
+
+if BACKEND == 'orjson':
+    _OPTIONS = orjson.OPT_NON_STR_KEYS
+
+    def loads(data):
+        """
+        Parses bytes (or str). Raises ValueError on invalid JSON.
+        """
+        return orjson.loads(data)
+
+    def dumps(obj):
+        """
+        Serializes to UTF-8 bytes.
+        """
+        return orjson.dumps(obj, default=_django_default, option=_OPTIONS)
+else:
+    def loads(data):
+        return json.loads(data)
+
+    def dumps(obj):
+        return json.dumps(obj, cls=DjangoJSONEncoder).encode()
+
+
+def dumps_str(obj):
+    return dumps(obj).decode()
+
+
+def parse_body(request):
+    """
+    The request body parsed straight from bytes.
+    """
+    return loads(request.body)
+
+
+class FastJsonResponse(HttpResponse):
+    """
+    JsonResponse with the fast backend. Like JsonResponse, non-dict data is
+    refused unless ``safe=False``.
+    """
+
+    def __init__(self, data, safe=True, **kwargs):
+        if safe and not isinstance(data, dict):
+            raise TypeError("In order to allow non-dict objects to be serialized set the safe parameter to False.")
+        kwargs.setdefault('content_type', 'application/json')
+        super().__init__(content=dumps(data), **kwargs)
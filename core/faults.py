@@ -0,0 +1,377 @@
+"""
+Latency and fault injection for the mock PSP endpoints.
+
+Named profiles live in a JSON file (MOCK_PROFILES_FILE) that every worker
+re-reads when its mtime changes, so profiles can be edited without a restart.
+A request picks a profile with the ``X-Mock-Profile`` header or a
+``mock_profile`` body field (falling back to MOCK_DEFAULT_PROFILE). A profile
+looks like::
+
+    "psp-degraded": {
+        "latency": {"type": "lognormal", "median_ms": 150, "sigma": 1.0, "max_ms": 20000},
+        "faults": {"error": 0.05, "timeout": 0.01, "reset": 0.01, "drip": 0.02},
+        "error_status": 503,
+        "timeout_s": 35,
+        "drip": {"chunk_bytes": 8, "interval_ms": 250},
+        "endpoints": {"create_transaction": {"faults": {"error": 0.2}}}
+    }
+
+Latency types: fixed (ms), uniform (min_ms, max_ms), normal (mean_ms,
+stddev_ms), lognormal (median_ms, sigma) and pareto (scale_ms, alpha); the
+last two give long tails. At most one fault is drawn per request:
+
+* ``error``   respond ``error_status`` without running the view
+* ``timeout`` hang ``timeout_s`` before running the view (the work still happens)
+* ``reset``   drop the connection (TCP RST under gunicorn, otherwise an aborted response)
+* ``drip``    run the view, then send its body a few bytes at a time
+
+Profiles are validated when the file is (re)loaded; a broken profile is logged
+and its last good version stays in effect.
+"""
+import asyncio
+import functools
+import json
+import math
+import os
+import random
+import socket
+import struct
+import threading
+import time
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
+
+from core.fastjson import FastJsonResponse, parse_body
+from core.log import get_logger
+
+logger = get_logger(__name__)
+
+PROFILE_HEADER = 'HTTP_X_MOCK_PROFILE'
+PROFILE_FIELD = 'mock_profile'
+FAULTS = ('error', 'timeout', 'reset', 'drip')
+
+
+LATENCY_PARAMS = {
+    'fixed': ('ms',),
+    'uniform': ('min_ms', 'max_ms'),
+    'normal': ('mean_ms', 'stddev_ms'),
+    'lognormal': ('median_ms', 'sigma'),
+    'pareto': ('scale_ms', 'alpha'),
+}
+
+
+def _number(value, what, minimum=0):
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value) or value < minimum:
+        raise ValueError(f"{what} must be a number >= {minimum}, got {value!r}")
+
+
+def validate_profile(profile):
+    """
+    Raises ValueError describing the first problem in a profile (including
+    each of its endpoint overrides), so it is rejected at load time instead
+    of failing the requests that use it.
+    """
+    if not isinstance(profile, dict):
+        raise ValueError("profile must be an object")
+    endpoints = profile.get('endpoints', {})
+    if not isinstance(endpoints, dict) or not all(isinstance(o, dict) for o in endpoints.values()):
+        raise ValueError("endpoints must map endpoint names to objects")
+    base = {k: v for k, v in profile.items() if k != 'endpoints'}
+    for endpoint, override in [(None, {})] + list(endpoints.items()):
+        where = f"endpoints.{endpoint}: " if endpoint else ""
+        merged = {**base, **override}
+        try:
+            latency = merged.get('latency')
+            if latency:
+                if not isinstance(latency, dict) or latency.get('type', 'fixed') not in LATENCY_PARAMS:
+                    raise ValueError(f"latency type must be one of {', '.join(LATENCY_PARAMS)}")
+                for param in LATENCY_PARAMS[latency.get('type', 'fixed')] + ('max_ms',):
+                    if param in latency:
+                        _number(latency[param], f"latency.{param}")
+                if latency.get('type') == 'pareto' and latency.get('alpha', 1.5) <= 0:
+                    raise ValueError("latency.alpha must be > 0")
+            faults = merged.get('faults', {})
+            if not isinstance(faults, dict) or set(faults) - set(FAULTS):
+                raise ValueError(f"faults keys must be among {', '.join(FAULTS)}")
+            for fault, rate in faults.items():
+                _number(rate, f"faults.{fault}")
+            if sum(faults.values()) > 1:
+                raise ValueError("fault rates add up to more than 1")
+            status = merged.get('error_status', 503)
+            if isinstance(status, bool) or not isinstance(status, int) or not 100 <= status <= 599:
+                raise ValueError(f"error_status must be an HTTP status code, got {status!r}")
+            _number(merged.get('timeout_s', 30), "timeout_s")
+            drip = merged.get('drip', {})
+            if not isinstance(drip, dict):
+                raise ValueError("drip must be an object")
+            _number(drip.get('chunk_bytes', 16), "drip.chunk_bytes", minimum=1)
+            _number(drip.get('interval_ms', 200), "drip.interval_ms")
+            FaultPlan('validation', merged)  # one dry-run draw
+        except (TypeError, ValueError, ArithmeticError) as e:
+            raise ValueError(f"{where}{e}") from None
+
+
+class ProfileStore:
+    """
+    Profiles from a JSON file, reloaded at most every ``check_interval``
+    seconds when the file's mtime changed. A broken edit keeps the last good
+    set; a broken profile keeps its last good version (or is left out).
+    """
+
+    def __init__(self, path, check_interval=1.0):
+        self.path = path
+        self.check_interval = check_interval
+        self._profiles = {}
+        self._mtime = None
+        self._checked = 0.0
+        self._lock = threading.Lock()
+
+    def profiles(self):
+        now = time.monotonic()
+        if now - self._checked >= self.check_interval:
+            with self._lock:
+                if now - self._checked >= self.check_interval:
+                    self._checked = now
+                    self._reload()
+        return self._profiles
+
+    def _reload(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            self._profiles, self._mtime = {}, None
+            return
+        if mtime == self._mtime:
+            return
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                profiles = json.load(f)
+            if not isinstance(profiles, dict):
+                raise ValueError("top level must be an object")
+        except (OSError, ValueError) as e:
+            logger.error("mock_profiles.invalid", path=str(self.path), error=str(e))
+            return
+        valid = {}
+        for name, profile in profiles.items():
+            try:
+                validate_profile(profile)
+                valid[name] = profile
+            except ValueError as e:
+                kept = name in self._profiles
+                logger.error("mock_profiles.invalid_profile", path=str(self.path), profile=name, error=str(e),
+                             kept_last_good=kept)
+                if kept:
+                    valid[name] = self._profiles[name]
+        profiles = valid
+        self._profiles, self._mtime = profiles, mtime
+        logger.info("mock_profiles.loaded", path=str(self.path), profiles=len(profiles))
+
+    def resolve(self, name, endpoint):
+        """
+        Profile ``name`` with the overrides for ``endpoint`` merged in, or None.
+        """
+        profile = self.profiles().get(name)
+        if profile is None:
+            return None
+        merged = {k: v for k, v in profile.items() if k != 'endpoints'}
+        merged.update(profile.get('endpoints', {}).get(endpoint, {}))
+        return merged
+
+
+def sample_latency(spec, rng=random):
+    """
+    Draws one delay in seconds from a latency spec (see module docstring).
+    """
+    if not spec:
+        return 0.0
+    kind = spec.get('type', 'fixed')
+    if kind == 'fixed':
+        ms = spec.get('ms', 0)
+    elif kind == 'uniform':
+        ms = rng.uniform(spec.get('min_ms', 0), spec.get('max_ms', 0))
+    elif kind == 'normal':
+        ms = rng.gauss(spec.get('mean_ms', 0), spec.get('stddev_ms', 0))
+    elif kind == 'lognormal':
+        ms = rng.lognormvariate(math.log(max(spec.get('median_ms', 1), 0.001)), spec.get('sigma', 1.0))
+    elif kind == 'pareto':
+        ms = spec.get('scale_ms', 1) * rng.paretovariate(spec.get('alpha', 1.5))
+    else:
+        raise ValueError(f"Unknown latency type: {kind}")
+    return max(0.0, min(ms, spec.get('max_ms', ms))) / 1000
+
+
+def pick_fault(rates, rng=random):
+    """
+    At most one fault per request: one draw against the cumulative rates.
+    """
+    draw = rng.random()
+    for fault in FAULTS:
+        draw -= rates.get(fault, 0)
+        if draw < 0:
+            return fault
+    return None
+
+
+class FaultPlan:
+    def __init__(self, name, profile, rng=random):
+        self.name = name
+        self.profile = profile
+        self.fault = pick_fault(profile.get('faults', {}), rng)
+        self.delay = sample_latency(profile.get('latency'), rng)
+        if self.fault == 'timeout':
+            self.delay += profile.get('timeout_s', 30)
+
+    def describe(self):
+        return f"profile={self.name}; delay_ms={self.delay * 1000:.0f}; fault={self.fault or 'none'}"
+
+    def error_response(self):
+        return FastJsonResponse({
+            "status": "error",
+            "error_code": "INJECTED_FAULT",
+            "message": f"Fault injected by mock profile '{self.name}'",
+        }, status=self.profile.get('error_status', 503))
+
+    def drip_response(self, response, asynchronous=False):
+        """
+        Re-sends ``response``'s body ``chunk_bytes`` at a time with a pause
+        between chunks; Content-Length stays correct so clients wait for it all.
+        """
+        drip = self.profile.get('drip', {})
+        size = max(1, int(drip.get('chunk_bytes', 16)))
+        interval = drip.get('interval_ms', 200) / 1000
+        content = response.content
+        chunks = [content[i:i + size] for i in range(0, len(content), size)]
+
+        def slow():
+            for i, chunk in enumerate(chunks):
+                if i:
+                    time.sleep(interval)
+                yield chunk
+
+        async def aslow():
+            for i, chunk in enumerate(chunks):
+                if i:
+                    await asyncio.sleep(interval)
+                yield chunk
+
+        dripped = StreamingHttpResponse(aslow() if asynchronous else slow(), status=response.status_code,
+                                        content_type=response['Content-Type'])
+        dripped['Content-Length'] = str(len(content))
+        return dripped
+
+    def reset_response(self, request, asynchronous=False):
+        """
+        Aborts the connection. Under gunicorn the socket gets SO_LINGER 0 first,
+        so the close that follows the aborted stream is a TCP reset.
+        """
+        sock = request.META.get('gunicorn.socket')
+        if sock is not None:
+            try:
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack('ii', 1, 0))
+            except OSError:
+                pass
+
+        message = f"Connection reset injected by mock profile '{self.name}'"
+
+        def abort():
+            yield b""
+            raise ConnectionResetError(message)
+
+        async def aabort():
+            yield b""
+            raise ConnectionResetError(message)
+
+        response = StreamingHttpResponse(aabort() if asynchronous else abort(), content_type='application/json')
+        response['Content-Length'] = '1024'
+        return response
+
+
+def profile_name(request):
+    """
+    Profile requested by header, then by body field, then the default.
+    """
+    name = request.META.get(PROFILE_HEADER)
+    if not name and request.body and PROFILE_FIELD.encode() in request.body:
+        try:
+            name = parse_body(request).get(PROFILE_FIELD)
+        except (ValueError, AttributeError):
+            name = None
+    return name or settings.MOCK_DEFAULT_PROFILE or None
+
+
+def plan_faults(request, endpoint):
+    """
+    Returns (plan, error_response). Both are None when no profile applies.
+    """
+    name = profile_name(request)
+    if not name:
+        return None, None
+    profile = get_store().resolve(name, endpoint)
+    if profile is None:
+        return None, FastJsonResponse({'error': f"Unknown mock profile: {name}"}, status=400)
+    try:
+        return FaultPlan(name, profile), None
+    except (TypeError, ValueError, ArithmeticError) as e:
+        # validate_profile() should have caught it; never turn the endpoint into a 500
+        logger.error("mock_profiles.plan_failed", profile=name, endpoint=endpoint, error=str(e))
+        return None, FastJsonResponse({'error': f"Invalid mock profile {name}: {e}"}, status=400)
+
+
+def inject_faults(endpoint):
+    """
+    Decorator applying the selected profile to a sync or async view. The
+    fault summary is echoed in an ``X-Mock-Fault`` response header.
+    """
+    def decorator(view):
+        if asyncio.iscoroutinefunction(view):
+            @functools.wraps(view)
+            async def wrapper(request, *args, **kwargs):
+                plan, rejected = plan_faults(request, endpoint)
+                if plan is None:
+                    return rejected or await view(request, *args, **kwargs)
+                if plan.delay:
+                    await asyncio.sleep(plan.delay)
+                if plan.fault == 'reset':
+                    return plan.reset_response(request, asynchronous=True)
+                if plan.fault == 'error':
+                    response = plan.error_response()
+                else:
+                    response = await view(request, *args, **kwargs)
+                    if plan.fault == 'drip':
+                        response = plan.drip_response(response, asynchronous=True)
+                response['X-Mock-Fault'] = plan.describe()
+                return response
+        else:
+            @functools.wraps(view)
+            def wrapper(request, *args, **kwargs):
+                plan, rejected = plan_faults(request, endpoint)
+                if plan is None:
+                    return rejected or view(request, *args, **kwargs)
+                if plan.delay:
+                    time.sleep(plan.delay)
+                if plan.fault == 'reset':
+                    return plan.reset_response(request)
+                if plan.fault == 'error':
+                    response = plan.error_response()
+                else:
+                    response = view(request, *args, **kwargs)
+                    if plan.fault == 'drip':
+                        response = plan.drip_response(response)
+                response['X-Mock-Fault'] = plan.describe()
+                return response
+        return wrapper
+    return decorator
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = ProfileStore(settings.MOCK_PROFILES_FILE, settings.MOCK_PROFILES_RELOAD_INTERVAL)
+    return _store
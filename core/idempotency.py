@@ -0,0 +1,331 @@
+"""
+Idempotency-key cache for the mock transaction and withdraw endpoints.
+
+A request is keyed on its ``Idempotency-Key`` header or, failing that, on the
+``external_id`` in its body. The first response for a key is stored and
+replayed byte for byte to every retry (with ``Idempotent-Replayed: true``),
+so retries create no new transaction, WebhookLog row or callback.
+
+* memory tier: per-process LRU bounded by IDEMPOTENCY_MAX_ENTRIES, entries
+  expire after IDEMPOTENCY_TTL;
+* DB tier (IDEMPOTENCY_DB_TIER, on by default when WEB_CONCURRENCY > 1): an
+  IdempotencyRecord row per key, inserted before the view runs, so its
+  primary key doubles as a cross-worker lock. Memory alone only protects
+  retries that reach the same process.
+
+A duplicate that arrives while the first request is still running gets 409
+with Retry-After. 5xx responses are never stored (they stay retryable), nor
+are 4xx ones without an explicit key. An explicit Idempotency-Key reused with
+a different body gets 422.
+"""
+import asyncio
+import functools
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse
+from django.utils import timezone
+
+from core.fastjson import FastJsonResponse, parse_body
+from core.models import IdempotencyRecord
+
+KEY_HEADER = 'HTTP_IDEMPOTENCY_KEY'
+MAX_KEY_LENGTH = 200
+CLAIM_ATTEMPTS = 3
+
+
+class StoredResponse:
+    __slots__ = ('fingerprint', 'status', 'content_type', 'body')
+
+    def __init__(self, fingerprint, status, content_type, body):
+        self.fingerprint = fingerprint
+        self.status = status
+        self.content_type = content_type
+        self.body = body
+
+    def replay(self):
+        response = HttpResponse(self.body, status=self.status, content_type=self.content_type)
+        response['Idempotent-Replayed'] = 'true'
+        return response
+
+
+class IdempotencyCache:
+    def __init__(self, ttl=86400, max_entries=100000, db_tier=False, lock_timeout=30):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.db_tier = db_tier
+        self.lock_timeout = lock_timeout
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()   # key -> (expires_at, StoredResponse), LRU order
+        self._in_flight = {}            # key -> started_at
+        self._next_db_sweep = 0.0
+        self.counters = {"stored": 0, "replayed": 0, "conflicts": 0, "mismatches": 0}
+
+    # --- memory tier ---
+
+    def _get_memory(self, key):
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            if item[0] < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return item[1]
+
+    def _put_memory(self, key, stored):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, stored)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    # --- protocol used by the decorator ---
+
+    def begin(self, key, fingerprint):
+        """
+        Returns a StoredResponse to replay, None if the caller now owns the
+        key, or the string 'busy' when another request holds it.
+        """
+        stored = self._get_memory(key)
+        if stored is not None:
+            return stored
+        now = time.monotonic()
+        with self._lock:
+            started = self._in_flight.get(key)
+            if started is not None and now - started < self.lock_timeout:
+                return 'busy'
+            self._in_flight[key] = now
+        if not self.db_tier:
+            return None
+        try:
+            claimed = self._claim_db(key, fingerprint)
+        except Exception:
+            self._release(key)
+            raise
+        if claimed is not None:
+            self._release(key)
+            if isinstance(claimed, StoredResponse):
+                self._put_memory(key, claimed)
+        return claimed
+
+    def _claim_db(self, key, fingerprint):
+        for _ in range(CLAIM_ATTEMPTS):
+            try:
+                with transaction.atomic():  # savepoint: a failed insert must not break an outer transaction
+                    IdempotencyRecord.objects.create(key=key, fingerprint=fingerprint)
+                self._sweep_db()
+                return None
+            except IntegrityError:
+                pass
+            row = IdempotencyRecord.objects.filter(key=key).first()
+            if row is not None:
+                break
+            # The holder deleted its claim in between (abandon / sweep): try again
+        else:
+            return 'busy'
+        cutoff = timezone.now() - timedelta(seconds=self.ttl)
+        if row.status_code is not None and row.created_at >= cutoff:
+            return StoredResponse(row.fingerprint, row.status_code, row.content_type, row.body)
+        stale = timezone.now() - timedelta(seconds=self.lock_timeout)
+        if row.status_code is None and row.created_at >= stale:
+            return 'busy'
+        # Expired result or abandoned claim: take the key over
+        taken = IdempotencyRecord.objects.filter(key=key, created_at=row.created_at).update(
+            fingerprint=fingerprint, status_code=None, content_type='', body='', created_at=timezone.now(),
+        )
+        return None if taken else 'busy'
+
+    def complete(self, key, stored):
+        self._put_memory(key, stored)
+        self.counters["stored"] += 1
+        try:
+            if self.db_tier:
+                IdempotencyRecord.objects.filter(key=key).update(
+                    status_code=stored.status, content_type=stored.content_type, body=stored.body,
+                )
+        finally:
+            self._release(key)
+
+    def abandon(self, key):
+        try:
+            if self.db_tier:
+                IdempotencyRecord.objects.filter(key=key, status_code__isnull=True).delete()
+        finally:
+            self._release(key)
+
+    def _release(self, key):
+        with self._lock:
+            self._in_flight.pop(key, None)
+
+    def _sweep_db(self):
+        now = time.monotonic()
+        if now < self._next_db_sweep:
+            return
+        self._next_db_sweep = now + max(self.ttl / 100, 60)
+        IdempotencyRecord.objects.filter(created_at__lt=timezone.now() - timedelta(seconds=self.ttl)).delete()
+
+    def stats(self):
+        with self._lock:
+            return {**self.counters, "entries": len(self._entries), "in_flight": len(self._in_flight),
+                    "db_tier": self.db_tier}
+
+
+def request_key(request, endpoint):
+    """
+    Returns (key, explicit) or (None, False) when the request carries neither
+    an Idempotency-Key header nor an external_id.
+    """
+    key = request.META.get(KEY_HEADER, '').strip()
+    explicit = bool(key)
+    if not key:
+        try:
+            body = parse_body(request)
+        except ValueError:
+            return None, False
+        external_id = body.get('external_id') if isinstance(body, dict) else None
+        if external_id in (None, ''):
+            return None, False
+        key = f"external_id:{external_id}"
+    key = f"{endpoint}:{key}"
+    if len(key) > MAX_KEY_LENGTH:
+        # Hashed, never truncated: two long keys sharing a prefix must not collide
+        key = f"{endpoint}:sha256:{hashlib.sha256(key.encode()).hexdigest()}"
+    return key, explicit
+
+
+def _check(stored, fingerprint, explicit, cache):
+    """
+    Replay response for a stored entry, or 422 for a reused explicit key.
+    """
+    if explicit and stored.fingerprint != fingerprint:
+        cache.counters["mismatches"] += 1
+        return FastJsonResponse({
+            "status": "failed",
+            "error_code": "IDEMPOTENCY_KEY_REUSED",
+            "message": "Idempotency-Key was already used with a different request body."
+        }, status=422)
+    cache.counters["replayed"] += 1
+    return stored.replay()
+
+
+def _busy(cache):
+    cache.counters["conflicts"] += 1
+    response = FastJsonResponse({
+        "status": "failed",
+        "error_code": "IDEMPOTENCY_IN_PROGRESS",
+        "message": "A request with the same idempotency key is still being processed."
+    }, status=409)
+    response['Retry-After'] = '1'
+    return response
+
+
+def _storable(response, explicit):
+    """
+    5xx stays retryable. Without an explicit key only successes are kept, so
+    a corrected request reusing the external_id of a rejected one is processed.
+    """
+    if response.streaming:
+        return False
+    return response.status_code < 500 if explicit else 200 <= response.status_code < 300
+
+
+def _stored(response, fingerprint):
+    return StoredResponse(fingerprint, response.status_code, response['Content-Type'],
+                          response.content.decode(response.charset or 'utf-8'))
+
+
+def idempotent(endpoint):
+    """
+    Decorator for a sync or async POST view.
+    """
+    def decorator(view):
+        if asyncio.iscoroutinefunction(view):
+            @functools.wraps(view)
+            async def wrapper(request, *args, **kwargs):
+                if not settings.IDEMPOTENCY_ENABLED or request.method != 'POST':
+                    return await view(request, *args, **kwargs)
+                key, explicit = request_key(request, endpoint)
+                if key is None:
+                    return await view(request, *args, **kwargs)
+                cache = get_cache()
+                fingerprint = hashlib.sha256(request.body).hexdigest()
+                call = sync_to_async if cache.db_tier else _direct
+                claimed = await call(cache.begin)(key, fingerprint)
+                if claimed == 'busy':
+                    return _busy(cache)
+                if claimed is not None:
+                    return _check(claimed, fingerprint, explicit, cache)
+                try:
+                    response = await view(request, *args, **kwargs)
+                except BaseException:
+                    await call(cache.abandon)(key)
+                    raise
+                if _storable(response, explicit):
+                    await call(cache.complete)(key, _stored(response, fingerprint))
+                else:
+                    await call(cache.abandon)(key)
+                return response
+        else:
+            @functools.wraps(view)
+            def wrapper(request, *args, **kwargs):
+                if not settings.IDEMPOTENCY_ENABLED or request.method != 'POST':
+                    return view(request, *args, **kwargs)
+                key, explicit = request_key(request, endpoint)
+                if key is None:
+                    return view(request, *args, **kwargs)
+                cache = get_cache()
+                fingerprint = hashlib.sha256(request.body).hexdigest()
+                claimed = cache.begin(key, fingerprint)
+                if claimed == 'busy':
+                    return _busy(cache)
+                if claimed is not None:
+                    return _check(claimed, fingerprint, explicit, cache)
+                try:
+                    response = view(request, *args, **kwargs)
+                except BaseException:
+                    cache.abandon(key)
+                    raise
+                if _storable(response, explicit):
+                    cache.complete(key, _stored(response, fingerprint))
+                else:
+                    cache.abandon(key)
+                return response
+        return wrapper
+    return decorator
+
+
+def _direct(fn):
+    async def call(*args):
+        return fn(*args)
+    return call
+
+
+_cache = None
+_cache_pid = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    global _cache, _cache_pid
+    pid = os.getpid()
+    if _cache is None or _cache_pid != pid:
+        with _cache_lock:
+            if _cache is None or _cache_pid != pid:
+                _cache = IdempotencyCache(
+                    ttl=settings.IDEMPOTENCY_TTL,
+                    max_entries=settings.IDEMPOTENCY_MAX_ENTRIES,
+                    db_tier=settings.IDEMPOTENCY_DB_TIER,
+                    lock_timeout=settings.IDEMPOTENCY_LOCK_TIMEOUT,
+                )
+                _cache_pid = pid
+    return _cache
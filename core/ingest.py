@@ -0,0 +1,309 @@
+"""
+Write-coalescing ingestion for WebhookLog.
+
+Every listener hit and simulated callback used to cost its own SQLite write
+transaction. Records are now queued in memory and written with bulk_create
+by a background thread once ``WEBHOOK_LOG_BATCH_SIZE`` rows are pending or
+``WEBHOOK_LOG_FLUSH_INTERVAL`` seconds have passed, whichever comes first.
+
+Buffering is opt-in (WEBHOOK_LOG_BUFFERED=1): callers get their ``log_id``
+before the row exists. A batch the database cannot take right now (locked,
+unavailable) goes back to the front of the queue, bounded by
+``WEBHOOK_LOG_MAX_PENDING``, and the flusher backs off before retrying; a
+batch the database rejects is written row by row so only the bad rows are lost.
+"""
+import atexit
+import json
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.db import OperationalError, close_old_connections
+
+from core import metrics
+from core.log import get_logger
+from core.models import WebhookLog
+from core.stream import get_hub
+
+logger = get_logger(__name__)
+
+# A sibling worker exiting checkpoints the WAL and can make SQLite answer
+# "database is locked" without waiting out busy_timeout; retry before requeueing.
+FLUSH_RETRY_DELAYS = (0.05, 0.2, 1.0)
+# Longest pause of the flusher after consecutive failed flushes
+FLUSH_MAX_BACKOFF = 30.0
+
+
+class LogBuffer:
+    """
+    Thread-safe buffer of unsaved WebhookLog instances. ``add()`` never touches
+    the database unless ``max_pending`` rows are already waiting, in which case
+    the caller writes its own row directly (backpressure instead of unbounded growth).
+    """
+
+    def __init__(self, batch_size=200, flush_interval=0.25, max_pending=20000):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+
+        self._pending = []
+        self._cv = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self._stopping = False
+        self._failures = 0
+        self._retry_at = 0.0
+        self._stats = {"records": 0, "flushes": 0, "direct_writes": 0, "failed": 0, "requeued": 0,
+                       "flush_ms": 0.0}
+
+    def start(self):
+        with self._cv:
+            if self._thread is None:
+                self._stopping = False
+                self._thread = threading.Thread(target=self._run, name="webhooklog-flusher", daemon=True)
+                self._thread.start()
+
+    def offer(self, log):
+        """
+        Queues an unsaved WebhookLog; returns False if the buffer is full and
+        the caller has to write the row itself.
+        """
+        self.start()
+        with self._cv:
+            if len(self._pending) >= self.max_pending:
+                self._stats["direct_writes"] += 1
+                return False
+            self._pending.append(log)
+            self._stats["records"] += 1
+            if len(self._pending) >= self.batch_size:
+                self._cv.notify()
+            return True
+
+    def add(self, **fields):
+        """
+        Queues one WebhookLog row and returns the (not yet saved) instance.
+        Its ``id`` and ``timestamp`` are already final.
+        """
+        log = WebhookLog(**fields)
+        if not self.offer(log):
+            started = time.perf_counter()
+            log.save(force_insert=True)
+            metrics.record_write("direct", 1, time.perf_counter() - started)
+        return log
+
+    def flush(self):
+        """
+        Writes everything pending in batches of ``batch_size``. Returns rows
+        written; stops early, with the failed batch requeued, when the
+        database is unavailable.
+        """
+        written = 0
+        with self._flush_lock:
+            while True:
+                with self._cv:
+                    batch = self._pending[:self.batch_size]
+                    del self._pending[:self.batch_size]
+                if not batch:
+                    self._failures = 0
+                    return written
+                started = time.perf_counter()
+                try:
+                    self._write(batch)
+                    unavailable = False
+                except OperationalError:
+                    kept = self._requeue(batch)
+                    logger.exception("webhooklog.flush_failed", requeued=kept, dropped=len(batch) - kept)
+                    self._back_off()
+                    return written
+                except Exception:
+                    logger.exception("webhooklog.batch_rejected", rows=len(batch))
+                    batch, unavailable = self._write_rows(batch)
+                elapsed = time.perf_counter() - started
+                written += len(batch)
+                get_hub().notify()
+                metrics.record_write("batch", len(batch), elapsed)
+                with self._cv:
+                    self._stats["flushes"] += 1
+                    self._stats["flush_ms"] += elapsed * 1000
+                if unavailable:
+                    self._back_off()
+                    return written
+
+    def _back_off(self):
+        self._failures += 1
+        self._retry_at = time.monotonic() + min(FLUSH_MAX_BACKOFF, self.flush_interval * 2 ** self._failures)
+
+    def _write(self, batch):
+        for delay in FLUSH_RETRY_DELAYS:
+            try:
+                WebhookLog.objects.bulk_create(batch)
+                return
+            except OperationalError as e:
+                if 'locked' not in str(e):
+                    raise
+                time.sleep(delay)
+        WebhookLog.objects.bulk_create(batch)
+
+    def _write_rows(self, batch):
+        """
+        Saves a batch bulk_create refused one row at a time. Rows the database
+        rejects are dropped; if it becomes unavailable midway the rest of the
+        batch is requeued. Returns (rows written, whether it became unavailable).
+        """
+        written = []
+        for i, log in enumerate(batch):
+            try:
+                log.save(force_insert=True)
+            except OperationalError:
+                rest = batch[i:]
+                kept = self._requeue(rest)
+                logger.exception("webhooklog.flush_failed", requeued=kept, dropped=len(rest) - kept)
+                return written, True
+            except Exception:
+                with self._cv:
+                    self._stats["failed"] += 1
+                logger.exception("webhooklog.row_rejected", log_id=str(log.id))
+            else:
+                written.append(log)
+        return written, False
+
+    def _requeue(self, batch):
+        """
+        Puts a batch that could not be written back in front of the queue,
+        as far as ``max_pending`` allows; returns how many rows were kept.
+        """
+        with self._cv:
+            kept = batch[:max(0, self.max_pending - len(self._pending))]
+            self._pending[:0] = kept
+            self._stats["requeued"] += len(kept)
+            self._stats["failed"] += len(batch) - len(kept)
+        return len(kept)
+
+    def shutdown(self):
+        """
+        Stops the flusher thread and writes whatever is still pending.
+        """
+        with self._cv:
+            self._stopping = True
+            self._cv.notify()
+            thread, self._thread = self._thread, None
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout=10)
+        self.flush()
+        with self._cv:
+            lost = len(self._pending)
+            self._pending.clear()
+            self._stats["failed"] += lost
+        if lost:
+            logger.error("webhooklog.dropped_on_shutdown", dropped=lost)
+
+    def stats(self):
+        """
+        Reports how many single-row write transactions batching has avoided.
+        """
+        with self._cv:
+            data = dict(self._stats)
+            data["pending"] = len(self._pending)
+        buffered = data["records"] - data["pending"] - data["failed"]
+        data["db_writes"] = data["flushes"] + data["direct_writes"]
+        data["writes_saved"] = max(0, buffered - data["flushes"])
+        data["avg_batch_size"] = round(buffered / data["flushes"], 2) if data["flushes"] else 0
+        data["write_amplification"] = round(data["flushes"] / buffered, 4) if buffered else 0
+        data["avg_flush_ms"] = round(data["flush_ms"] / data["flushes"], 3) if data["flushes"] else 0
+        data["flush_ms"] = round(data["flush_ms"], 3)
+        return data
+
+    def _run(self):
+        while True:
+            with self._cv:
+                # after a failed flush, wait out the backoff even if rows keep arriving
+                while not self._stopping and time.monotonic() < self._retry_at:
+                    self._cv.wait(self._retry_at - time.monotonic())
+                if not self._stopping and len(self._pending) < self.batch_size:
+                    self._cv.wait(self.flush_interval)
+                stopping = self._stopping
+            close_old_connections()
+            self.flush()
+            if stopping:
+                return
+
+
+_buffer = None
+_buffer_pid = None
+_buffer_lock = threading.Lock()
+
+
+def get_buffer():
+    """
+    Process-wide buffer, created lazily per process (safe across gunicorn forks)
+    and flushed at interpreter exit.
+    """
+    global _buffer, _buffer_pid
+    pid = os.getpid()
+    if _buffer is None or _buffer_pid != pid:
+        with _buffer_lock:
+            if _buffer is None or _buffer_pid != pid:
+                _buffer = LogBuffer(
+                    batch_size=settings.WEBHOOK_LOG_BATCH_SIZE,
+                    flush_interval=settings.WEBHOOK_LOG_FLUSH_INTERVAL,
+                    max_pending=settings.WEBHOOK_LOG_MAX_PENDING,
+                )
+                buffer = _buffer
+                metrics.gauge("webhooklog_pending_rows", lambda: len(buffer._pending))
+                _buffer_pid = pid
+                atexit.register(_buffer.shutdown)
+    return _buffer
+
+
+def shutdown():
+    """
+    Writes out this process's buffer, if it has one (gunicorn worker_exit).
+    """
+    if _buffer is not None and _buffer_pid == os.getpid():
+        _buffer.shutdown()
+
+
+def is_duplicate_raw_body(raw_body, body):
+    return raw_body is not None and body is not None and raw_body == json.dumps(body)
+
+
+def _compact(fields):
+    """
+    Drops ``raw_body`` when it is byte-for-byte ``json.dumps(body)``;
+    WebhookLog.raw_text rebuilds it on read.
+    """
+    if settings.WEBHOOK_LOG_DROP_DUPLICATE_RAW_BODY and is_duplicate_raw_body(fields.get('raw_body'), fields.get('body')):
+        fields['raw_body'] = None
+    return fields
+
+
+def store_webhook_log(**fields):
+    """
+    Stores a WebhookLog row, through the buffer when WEBHOOK_LOG_BUFFERED is on.
+    """
+    _compact(fields)
+    if settings.WEBHOOK_LOG_BUFFERED:
+        return get_buffer().add(**fields)
+    started = time.perf_counter()
+    log = WebhookLog.objects.create(**fields)
+    metrics.record_write("direct", 1, time.perf_counter() - started)
+    return log
+
+
+async def astore_webhook_log(**fields):
+    """
+    Async counterpart of store_webhook_log(); buffering never blocks the event loop.
+    """
+    _compact(fields)
+    if settings.WEBHOOK_LOG_BUFFERED:
+        log = WebhookLog(**fields)
+        if not get_buffer().offer(log):
+            started = time.perf_counter()
+            await log.asave(force_insert=True)
+            metrics.record_write("direct", 1, time.perf_counter() - started)
+        return log
+    started = time.perf_counter()
+    log = await WebhookLog.objects.acreate(**fields)
+    metrics.record_write("direct", 1, time.perf_counter() - started)
+    return log
@@ -0,0 +1,108 @@
+"""
+Lean request path for the public API endpoints.
+
+Webhook senders and PSP clients never carry a session, a CSRF token or a
+logged-in user, yet every request used to walk the full MIDDLEWARE stack
+(sessions, CSRF, auth, messages, clickjacking, whitenoise). ``wrap_wsgi`` /
+``wrap_asgi`` put a dispatcher in front of the project's application: paths
+starting with one of LEAN_API_PATHS go to a second Django handler built from
+LEAN_API_MIDDLEWARE, everything else (admin, dashboard, login-protected
+``api/`` views) keeps the full stack. Both handlers share settings, URLconf,
+views and request signals; only the middleware chain differs.
+
+Only list endpoints here that do not touch ``request.user``,
+``request.session`` or messages, and do not rely on CSRF protection.
+"""
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+
+_middleware_lock = threading.Lock()
+
+
+@contextmanager
+def _middleware(middleware):
+    """
+    BaseHandler.load_middleware() reads settings.MIDDLEWARE; point it at
+    another list while a handler is being built (once, at startup).
+    """
+    with _middleware_lock:
+        full = settings.MIDDLEWARE
+        settings.MIDDLEWARE = list(middleware)
+        try:
+            yield
+        finally:
+            settings.MIDDLEWARE = full
+
+
+class LeanWSGIHandler(WSGIHandler):
+    """
+    WSGIHandler with its own middleware list (LEAN_API_MIDDLEWARE by default).
+    """
+
+    def __init__(self, middleware=None):
+        self.middleware = settings.LEAN_API_MIDDLEWARE if middleware is None else middleware
+        super().__init__()
+
+    def load_middleware(self, is_async=False):
+        with _middleware(self.middleware):
+            super().load_middleware(is_async)
+
+
+class LeanASGIHandler(ASGIHandler):
+    """
+    ASGIHandler with its own middleware list (LEAN_API_MIDDLEWARE by default).
+    """
+
+    def __init__(self, middleware=None):
+        self.middleware = settings.LEAN_API_MIDDLEWARE if middleware is None else middleware
+        super().__init__()
+
+    def load_middleware(self, is_async=False):
+        with _middleware(self.middleware):
+            super().load_middleware(is_async)
+
+
+class LeanPathWSGIDispatcher:
+    def __init__(self, application, lean_application, paths):
+        self.application = application
+        self.lean_application = lean_application
+        self.paths = tuple(paths)
+
+    def __call__(self, environ, start_response):
+        if environ.get('PATH_INFO', '').startswith(self.paths):
+            return self.lean_application(environ, start_response)
+        return self.application(environ, start_response)
+
+
+class LeanPathASGIDispatcher:
+    def __init__(self, application, lean_application, paths):
+        self.application = application
+        self.lean_application = lean_application
+        self.paths = tuple(paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http' and scope['path'].startswith(self.paths):
+            return await self.lean_application(scope, receive, send)
+        return await self.application(scope, receive, send)
+
+
+def wrap_wsgi(application):
+    """
+    Routes LEAN_API_PATHS past the full middleware stack; a no-op when empty.
+    """
+    if not settings.LEAN_API_PATHS:
+        return application
+    return LeanPathWSGIDispatcher(application, LeanWSGIHandler(), settings.LEAN_API_PATHS)
+
+
+def wrap_asgi(application):
+    """
+    ASGI counterpart of wrap_wsgi(); lifespan and websocket scopes are untouched.
+    """
+    if not settings.LEAN_API_PATHS:
+        return application
+    return LeanPathASGIDispatcher(application, LeanASGIHandler(), settings.LEAN_API_PATHS)
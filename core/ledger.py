@@ -0,0 +1,276 @@
+"""
+Stateful ledger behind the mock PSP endpoints.
+
+* process tokens are HMAC-signed (``salted_hmac``) and carry their issue time,
+  so any worker validates them without shared state;
+* transaction ids are ``<prefix>-<process node><counter>``: unique within a
+  process by construction, across processes by the random node;
+* a token can back exactly one transaction, and a repeated external_id
+  returns the transaction it created the first time;
+* entries live in an insertion-ordered dict with O(1) indexes by token and by
+  external_id, evicted after MOCK_LEDGER_TTL or beyond MOCK_LEDGER_MAX_ENTRIES.
+
+With MOCK_LEDGER_PERSIST (the default when WEB_CONCURRENCY > 1) the
+MockTransaction table is the source of truth for those two rules and for
+status lookups across workers (its unique constraints decide races); memory
+stays a read-through cache. Without it every process has its own ledger, which
+is only correct when a single process serves all requests.
+"""
+import itertools
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare, salted_hmac
+
+from core.models import MockTransaction
+
+TOKEN_SALT = 'core.ledger.process_token'
+
+
+class LedgerError(Exception):
+    """
+    A request the ledger refuses; maps onto the mock's error response shape.
+    """
+
+    def __init__(self, error_code, message, status=400):
+        super().__init__(message)
+        self.error_code = error_code
+        self.message = message
+        self.status = status
+
+    def response(self):
+        return self.status, {"status": "failed", "error_code": self.error_code, "message": self.message}
+
+
+class LedgerEntry:
+    __slots__ = ('id', 'kind', 'external_id', 'token_id', 'amount', 'user_id', 'status', 'created_at')
+
+    def __init__(self, id, kind, external_id, token_id, amount, user_id, status, created_at):
+        self.id = id
+        self.kind = kind
+        self.external_id = external_id
+        self.token_id = token_id
+        self.amount = amount
+        self.user_id = user_id
+        self.status = status
+        self.created_at = created_at  # epoch seconds
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(row.id, row.kind, row.external_id, row.token_id, row.amount, row.user_id,
+                   row.status, row.created_at.timestamp())
+
+    def as_dict(self):
+        return {
+            "transaction_id": self.id,
+            "type": self.kind,
+            "external_id": self.external_id,
+            "amount": self.amount,
+            "status": self.status,
+            "created_at": datetime.fromtimestamp(self.created_at, tz=dt_timezone.utc).isoformat(),
+        }
+
+
+class Ledger:
+    PREFIXES = {MockTransaction.KIND_DEPOSIT: 'TRX', MockTransaction.KIND_WITHDRAWAL: 'W'}
+    STATUSES = {MockTransaction.KIND_DEPOSIT: 'APPROVED', MockTransaction.KIND_WITHDRAWAL: 'PAID'}
+
+    def __init__(self, ttl=3600, token_ttl=900, max_entries=200000, persist=False):
+        self.ttl = ttl
+        self.token_ttl = token_ttl
+        self.max_entries = max_entries
+        self.persist = persist
+
+        self._node = secrets.token_hex(3).upper()
+        self._counter = itertools.count(1)
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()   # id -> LedgerEntry, oldest first
+        self._by_token = {}             # token_id -> id
+        self._by_external = {}          # (kind, external_id) -> id
+        self._next_db_sweep = 0.0
+        self.counters = {"tokens": 0, "created": 0, "replayed": 0, "rejected": 0, "evicted": 0}
+
+    def _next_id(self):
+        return f"{self._node}{next(self._counter):06d}"
+
+    # --- tokens ---
+
+    def _sign(self, value):
+        return salted_hmac(TOKEN_SALT, value).hexdigest()[:16]
+
+    def issue_token(self):
+        token_id = f"{self._next_id()}-{int(time.time()):x}"
+        self.counters["tokens"] += 1
+        return f"{token_id}-{self._sign(token_id)}"
+
+    def verify_token(self, token):
+        """
+        Returns the token id, or raises LedgerError if it is forged or expired.
+        """
+        token_id, _, signature = str(token).rpartition('-')
+        if not token_id or not constant_time_compare(signature, self._sign(token_id)):
+            raise LedgerError("INVALID_TOKEN", "process_token is not valid.")
+        issued = int(token_id.rsplit('-', 1)[-1], 16)
+        if time.time() - issued > self.token_ttl:
+            raise LedgerError("TOKEN_EXPIRED", "process_token has expired.")
+        return token_id
+
+    # --- transactions ---
+
+    def create(self, kind, external_id=None, token=None, amount=None, user_id=None):
+        """
+        Returns (entry, created). ``created`` is False when external_id (or the
+        token) already produced a transaction, which is returned instead.
+        """
+        token_id = self.verify_token(token) if token else None
+        external_id = str(external_id) if external_id not in (None, '') else None
+        with self._lock:
+            existing = self._existing(kind, external_id, token_id)
+            if existing is None:
+                now = time.time()
+                self._evict(now)
+                entry = LedgerEntry(f"{self.PREFIXES[kind]}-{self._next_id()}", kind, external_id, token_id,
+                                    None if amount is None else str(amount), user_id, self.STATUSES[kind], now)
+                self._index(entry)
+        if existing is not None:
+            return self._replay(existing, external_id)
+
+        if self.persist:
+            try:
+                with transaction.atomic():
+                    MockTransaction.objects.create(
+                        id=entry.id, kind=kind, external_id=external_id, token_id=token_id,
+                        amount=entry.amount, user_id=user_id, status=entry.status,
+                    )
+            except IntegrityError:
+                # Another worker got there first: defer to its row
+                with self._lock:
+                    self._unindex(entry)
+                existing = self._db_existing(kind, external_id, token_id)
+                if existing is None:
+                    raise
+                with self._lock:
+                    self._index(existing)
+                return self._replay(existing, external_id)
+            self._sweep_db()
+        self.counters["created"] += 1
+        return entry, True
+
+    def _replay(self, existing, external_id):
+        if existing.external_id != external_id or external_id is None:
+            # Same token, different (or no) external_id: a second transaction
+            self.counters["rejected"] += 1
+            raise LedgerError("TOKEN_ALREADY_USED",
+                              f"process_token was already used for {existing.id}.", status=409)
+        self.counters["replayed"] += 1
+        return existing, False
+
+    def _existing(self, kind, external_id, token_id):
+        tx_id = None
+        if external_id is not None:
+            tx_id = self._by_external.get((kind, external_id))
+        if tx_id is None and token_id is not None:
+            tx_id = self._by_token.get(token_id)
+        return self._entries.get(tx_id) if tx_id else None
+
+    def _db_existing(self, kind, external_id, token_id):
+        row = None
+        if external_id is not None:
+            row = MockTransaction.objects.filter(kind=kind, external_id=external_id).first()
+        if row is None and token_id is not None:
+            row = MockTransaction.objects.filter(token_id=token_id).first()
+        return LedgerEntry.from_row(row) if row else None
+
+    def _index(self, entry):
+        self._entries[entry.id] = entry
+        if entry.token_id:
+            self._by_token[entry.token_id] = entry.id
+        if entry.external_id:
+            self._by_external[(entry.kind, entry.external_id)] = entry.id
+
+    def _unindex(self, entry):
+        self._entries.pop(entry.id, None)
+        if entry.token_id and self._by_token.get(entry.token_id) == entry.id:
+            del self._by_token[entry.token_id]
+        key = (entry.kind, entry.external_id)
+        if entry.external_id and self._by_external.get(key) == entry.id:
+            del self._by_external[key]
+
+    def _evict(self, now):
+        """
+        Drops expired entries and, if still full, the oldest ones. Amortized
+        O(1) per insert since entries are kept in creation order.
+        """
+        cutoff = now - self.ttl
+        while self._entries:
+            oldest = next(iter(self._entries.values()))
+            if oldest.created_at > cutoff and len(self._entries) < self.max_entries:
+                break
+            self._unindex(oldest)
+            self.counters["evicted"] += 1
+
+    def _sweep_db(self):
+        now = time.monotonic()
+        if now < self._next_db_sweep:
+            return
+        self._next_db_sweep = now + max(self.ttl / 10, 1)
+        MockTransaction.objects.filter(created_at__lt=timezone.now() - timedelta(seconds=self.ttl)).delete()
+
+    def lookup(self, transaction_id=None, external_id=None, kind=None):
+        """
+        Status lookup by transaction id, or by external_id (optionally per kind).
+        """
+        with self._lock:
+            if transaction_id:
+                entry = self._entries.get(transaction_id)
+            else:
+                kinds = [kind] if kind else list(self.PREFIXES)
+                ids = [self._by_external.get((k, str(external_id))) for k in kinds]
+                entry = next((self._entries[i] for i in ids if i in self._entries), None)
+        if entry is not None and time.time() - entry.created_at <= self.ttl:
+            return entry
+        if not self.persist:
+            return None
+        qs = MockTransaction.objects.filter(created_at__gte=timezone.now() - timedelta(seconds=self.ttl))
+        if transaction_id:
+            row = qs.filter(id=transaction_id).first()
+        else:
+            qs = qs.filter(external_id=str(external_id))
+            row = (qs.filter(kind=kind) if kind else qs).first()
+        return LedgerEntry.from_row(row) if row else None
+
+    def stats(self):
+        with self._lock:
+            size = len(self._entries)
+        return {**self.counters, "entries": size, "node": self._node, "persist": self.persist}
+
+
+_ledger = None
+_ledger_pid = None
+_ledger_lock = threading.Lock()
+
+
+def get_ledger():
+    """
+    Per-process ledger; a forked worker starts with its own node id and cache.
+    """
+    global _ledger, _ledger_pid
+    pid = os.getpid()
+    if _ledger is None or _ledger_pid != pid:
+        with _ledger_lock:
+            if _ledger is None or _ledger_pid != pid:
+                _ledger = Ledger(
+                    ttl=settings.MOCK_LEDGER_TTL,
+                    token_ttl=settings.MOCK_TOKEN_TTL,
+                    max_entries=settings.MOCK_LEDGER_MAX_ENTRIES,
+                    persist=settings.MOCK_LEDGER_PERSIST,
+                )
+                _ledger_pid = pid
+    return _ledger
@@ -0,0 +1,228 @@
+"""
+Load generation for the diagnostic tool.
+
+Runs a fixed-concurrency (closed loop) or fixed-RPS (open loop) load against a
+single endpoint with one keep-alive session per worker, discards a warm-up
+period and reports latency percentiles, an error breakdown and throughput per
+second. Deliberately free of Django imports so diagnostic.py can use it too.
+"""
+import math
+import threading
+import time
+from collections import Counter
+
+import requests
+from requests.adapters import HTTPAdapter
+
+PERCENTILES = (50, 90, 99, 99.9)
+
+
+class LatencyHistogram:
+    """
+    Log-bucketed latency histogram (about 1% relative precision) in the
+    spirit of HDR histograms: constant memory, cheap to record and mergeable
+    across worker threads.
+    """
+    GROWTH = 1.01
+    _LOG_GROWTH = math.log(GROWTH)
+
+    def __init__(self):
+        self.buckets = Counter()
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def record(self, value_ms):
+        value_ms = max(value_ms, 0.001)
+        self.buckets[int(math.log(value_ms * 1000) / self._LOG_GROWTH)] += 1
+        self.count += 1
+        self.total += value_ms
+        self.min = value_ms if self.min is None else min(self.min, value_ms)
+        self.max = value_ms if self.max is None else max(self.max, value_ms)
+
+    def merge(self, other):
+        self.buckets.update(other.buckets)
+        self.count += other.count
+        self.total += other.total
+        for attr, pick in (('min', min), ('max', max)):
+            theirs = getattr(other, attr)
+            if theirs is not None:
+                mine = getattr(self, attr)
+                setattr(self, attr, theirs if mine is None else pick(mine, theirs))
+        return self
+
+    def percentile(self, p):
+        if not self.count:
+            return None
+        rank = math.ceil(self.count * p / 100)
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= rank:
+                # Upper edge of the bucket, clamped to the observed max
+                return min(self.GROWTH ** (bucket + 1) / 1000, self.max)
+        return self.max
+
+    def summary(self):
+        data = {
+            "count": self.count,
+            "mean_ms": round(self.total / self.count, 3) if self.count else None,
+            "min_ms": round(self.min, 3) if self.min is not None else None,
+            "max_ms": round(self.max, 3) if self.max is not None else None,
+        }
+        for p in PERCENTILES:
+            value = self.percentile(p)
+            data[f"p{p:g}_ms".replace('.', '_')] = round(value, 3) if value is not None else None
+        return data
+
+
+class _WorkerStats:
+    def __init__(self):
+        self.histogram = LatencyHistogram()
+        self.outcomes = Counter()   # "200", "503", "ConnectTimeout", ...
+        self.timeline = Counter()   # second -> completed requests
+        self.timeline_errors = Counter()
+        self.bytes = 0
+
+
+def run_load_test(url, method='GET', headers=None, payload=None, concurrency=10, rps=None,
+                  duration=10.0, warmup=2.0, timeout=10.0, verify=False, max_body_bytes=10 * 1024 * 1024):
+    """
+    Drives load for ``warmup + duration`` seconds and returns a report dict.
+
+    With ``rps`` set, requests are scheduled at fixed intervals across the
+    workers (open loop) and latency is measured from the *scheduled* send
+    time, so queueing behind a slow server is not hidden (no coordinated
+    omission); nothing is sent after the deadline, and scheduled sends the
+    workers never got to are reported as ``missed``. Without it each worker
+    sends back-to-back (closed loop).
+    Bodies are streamed and only counted, up to ``max_body_bytes`` each.
+    ``payload`` may also be a callable returning a fresh body per request.
+    """
+    method = method.upper()
+    make_payload = payload if callable(payload) else None
+    body_kwargs = {} if payload in (None, {}) and method in ('GET', 'HEAD') else {'json': payload}
+    started = time.perf_counter()
+    measure_from = started + warmup
+    stop_at = measure_from + duration
+    interval = 1.0 / rps if rps else None
+    ticket = [0]
+    ticket_lock = threading.Lock()
+    stats = [_WorkerStats() for _ in range(concurrency)]
+
+    def next_send_time():
+        with ticket_lock:
+            n = ticket[0]
+            ticket[0] += 1
+        return started + n * interval
+
+    def worker(ws):
+        session = requests.Session()
+        session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=1, max_retries=0))
+        session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=1, max_retries=0))
+        try:
+            while True:
+                if interval:
+                    scheduled = next_send_time()
+                    if scheduled >= stop_at or time.perf_counter() >= stop_at:
+                        return  # behind schedule: the remaining tickets count as missed
+                    delay = scheduled - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                else:
+                    scheduled = time.perf_counter()
+                    if scheduled >= stop_at:
+                        return
+                outcome, size = None, 0
+                try:
+                    kwargs = {'json': make_payload()} if make_payload else body_kwargs
+                    resp = session.request(method, url, headers=headers, verify=verify, timeout=timeout,
+                                           stream=True, **kwargs)
+                    try:
+                        for chunk in resp.iter_content(64 * 1024):
+                            size += len(chunk)
+                            if size >= max_body_bytes:
+                                break
+                    finally:
+                        resp.close()
+                    outcome = str(resp.status_code)
+                    failed = resp.status_code >= 400
+                except requests.RequestException as e:
+                    outcome = type(e).__name__
+                    failed = True
+                finished = time.perf_counter()
+                if scheduled < measure_from:
+                    continue  # warm-up: connections and caches, not measured
+                ws.histogram.record((finished - scheduled) * 1000)
+                ws.outcomes[outcome] += 1
+                ws.bytes += size
+                second = int(finished - measure_from)
+                ws.timeline[second] += 1
+                if failed:
+                    ws.timeline_errors[second] += 1
+        finally:
+            session.close()
+
+    threads = [threading.Thread(target=worker, args=(ws,), name=f"loadtest-{i}", daemon=True) for i, ws in enumerate(stats)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    # The measured window, stretched by requests still in flight at the deadline
+    elapsed = max(time.perf_counter(), stop_at) - measure_from
+
+    histogram = LatencyHistogram()
+    outcomes, timeline, timeline_errors = Counter(), Counter(), Counter()
+    total_bytes = 0
+    for ws in stats:
+        histogram.merge(ws.histogram)
+        outcomes.update(ws.outcomes)
+        timeline.update(ws.timeline)
+        timeline_errors.update(ws.timeline_errors)
+        total_bytes += ws.bytes
+
+    errors = sum(n for outcome, n in outcomes.items() if not outcome.isdigit() or int(outcome) >= 400)
+    seconds = range(max(timeline) + 1 if timeline else 0)
+    missed = 0
+    if interval:
+        # Sends scheduled inside the measured window that never went out
+        scheduled = math.ceil((warmup + duration) / interval) - math.ceil(warmup / interval)
+        missed = max(0, scheduled - histogram.count)
+    return {
+        "config": {
+            "url": url, "method": method, "concurrency": concurrency, "target_rps": rps,
+            "duration_s": duration, "warmup_s": warmup, "mode": "open-loop" if rps else "closed-loop",
+        },
+        "requests": histogram.count,
+        "errors": errors,
+        "error_rate": round(errors / histogram.count, 4) if histogram.count else 0,
+        "missed": missed,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(histogram.count / elapsed, 2) if elapsed else None,
+        "bytes_received": total_bytes,
+        "latency": histogram.summary(),
+        "status_codes": dict(sorted(outcomes.items())),
+        "timeline": [
+            {"second": s, "requests": timeline.get(s, 0), "errors": timeline_errors.get(s, 0)}
+            for s in seconds
+        ],
+    }
+
+
+def format_report(report):
+    """
+    Human-readable summary used by diagnostic.py.
+    """
+    lat = report["latency"]
+    lines = [
+        f"Mode: {report['config']['mode']}  concurrency={report['config']['concurrency']}  "
+        f"target_rps={report['config']['target_rps']}  duration={report['config']['duration_s']}s",
+        f"Requests: {report['requests']}  errors: {report['errors']} ({report['error_rate'] * 100:.2f}%)  "
+        f"missed: {report['missed']}  throughput: {report['throughput_rps']} req/s over {report['elapsed_s']}s",
+        f"Latency ms: p50={lat['p50_ms']}  p90={lat['p90_ms']}  p99={lat['p99_ms']}  "
+        f"p99.9={lat['p99_9_ms']}  max={lat['max_ms']}",
+        "Status codes: " + ", ".join(f"{k}={v}" for k, v in report["status_codes"].items()),
+        "Throughput over time: " + " ".join(str(b["requests"]) for b in report["timeline"]),
+    ]
+    return "\n".join(lines)
@@ -0,0 +1,243 @@
+"""
+Non-blocking structured logging for the ``core`` app.
+
+Request threads only build a LogRecord and drop it on a bounded queue; a
+QueueListener thread formats it as one JSON line and writes it to stdout.
+When the queue is full the record is dropped and counted, so a slow stdout
+never stalls a request.
+
+    log = get_logger(__name__)
+    log.info("webhook.received", method=request.method, body=body_data)
+
+* LOG_LEVEL filters before anything is built;
+* LOG_SAMPLE_RATES (``event=rate,...``) keeps only that fraction of a
+  high-volume event, and the kept lines carry ``sample_rate``;
+* strings, bytes and serialized containers longer than LOG_MAX_FIELD_CHARS
+  are cut, so a large payload costs one bounded line.
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+from datetime import datetime, timezone
+
+from django.conf import settings
+
+from core.fastjson import dumps
+
+ROOT_LOGGER = 'core'
+
+
+def _dumps(obj):
+    try:
+        return dumps(obj).decode()
+    except (TypeError, ValueError):
+        return json.dumps(obj, default=str, ensure_ascii=False)
+
+
+def _truncate(value, limit):
+    if isinstance(value, bytes):
+        value = value.decode('utf-8', 'replace')
+    if isinstance(value, str):
+        if len(value) > limit:
+            return f"{value[:limit]}...(+{len(value) - limit} chars)"
+        return value
+    if isinstance(value, (dict, list, tuple)):
+        text = _dumps(value)
+        return value if len(text) <= limit else _truncate(text, limit)
+    return value
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    One JSON object per line: ts, level, logger, event, pid, then the fields.
+    """
+
+    def __init__(self, max_field_chars=512):
+        super().__init__()
+        self.max_field_chars = max_field_chars
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(timespec='milliseconds'),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "event": record.getMessage(),
+            "pid": record.process,
+        }
+        for key, value in getattr(record, 'fields', {}).items():
+            entry[key] = _truncate(value, self.max_field_chars)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc"] = _truncate(record.exc_text, self.max_field_chars * 8)
+        return _dumps(entry)
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that never blocks and leaves formatting to the listener.
+    """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # The stock prepare() formats on the calling thread; only resolve
+        # what cannot cross threads (args may be mutated, tracebacks die).
+        if record.args:
+            record.msg = record.getMessage()
+            record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class _BufferedStreamHandler(logging.StreamHandler):
+    """
+    Writes into a 64 KB buffer; the listener flushes it whenever the queue
+    runs empty, so a burst costs one write() instead of one per line.
+    """
+
+    def emit(self, record):
+        try:
+            self.stream.write(self.format(record) + self.terminator)
+        except Exception:
+            self.handleError(record)
+
+
+class _Listener(logging.handlers.QueueListener):
+    def dequeue(self, block):
+        if block and self.queue.empty():
+            for handler in self.handlers:
+                handler.flush()
+        return self.queue.get(block)
+
+
+class EventLogger:
+    """
+    Thin wrapper that takes an event name plus keyword fields.
+    """
+
+    def __init__(self, name):
+        self._logger = logging.getLogger(name)
+
+    def log(self, level, event, exc_info=None, **fields):
+        logger = self._logger
+        if not logger.isEnabledFor(level):
+            return
+        rate = _sample_rates.get(event)
+        if rate is not None:
+            if random.random() >= rate:
+                return
+            fields['sample_rate'] = rate
+        if exc_info is True:
+            exc_info = sys.exc_info()
+        # makeRecord + handle skips the caller stack walk of logger.log()
+        record = logger.makeRecord(logger.name, level, '(core)', 0, event, None, exc_info,
+                                   extra={'fields': fields})
+        logger.handle(record)
+
+    def debug(self, event, **fields):
+        self.log(logging.DEBUG, event, **fields)
+
+    def info(self, event, **fields):
+        self.log(logging.INFO, event, **fields)
+
+    def warning(self, event, **fields):
+        self.log(logging.WARNING, event, **fields)
+
+    def error(self, event, **fields):
+        self.log(logging.ERROR, event, **fields)
+
+    def exception(self, event, **fields):
+        self.log(logging.ERROR, event, exc_info=True, **fields)
+
+
+def get_logger(name):
+    return EventLogger(name)
+
+
+def parse_sample_rates(spec):
+    """
+    ``"webhook.received=0.1,callback.delivered=0.05"`` -> {event: rate}.
+    """
+    rates = {}
+    for item in filter(None, (part.strip() for part in spec.split(','))):
+        event, _, rate = item.partition('=')
+        rates[event.strip()] = min(1.0, max(0.0, float(rate)))
+    return rates
+
+
+_sample_rates = {}
+_handler = None
+_listener = None
+_configure_lock = threading.Lock()
+
+
+def _start_listener():
+    global _listener
+    stream = open(sys.stdout.fileno(), 'w', buffering=64 * 1024, encoding='utf-8', closefd=False)
+    handler = _BufferedStreamHandler(stream)
+    handler.setFormatter(JsonFormatter(max_field_chars=settings.LOG_MAX_FIELD_CHARS))
+    _listener = _Listener(_handler.queue, handler)
+    _listener.start()
+
+
+def _after_fork():
+    # Threads do not survive fork(): a preloaded gunicorn worker gets a fresh
+    # queue and listener of its own.
+    global _handler
+    if _handler is not None:
+        _handler.queue = queue.Queue(maxsize=settings.LOG_QUEUE_SIZE)
+        _handler.dropped = 0
+        _start_listener()
+
+
+def shutdown():
+    """
+    Stops the listener after it has written everything still queued.
+    """
+    if _listener is not None and _listener._thread is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.flush()
+
+
+def configure():
+    """
+    Attaches the queue handler to the ``core`` logger. Idempotent.
+    """
+    global _handler, _sample_rates
+    with _configure_lock:
+        if _handler is not None:
+            return
+        _sample_rates = parse_sample_rates(settings.LOG_SAMPLE_RATES)
+        _handler = NonBlockingQueueHandler(queue.Queue(maxsize=settings.LOG_QUEUE_SIZE))
+        logger = logging.getLogger(ROOT_LOGGER)
+        logger.setLevel(settings.LOG_LEVEL)
+        logger.addHandler(_handler)
+        logger.propagate = False
+        _start_listener()
+        os.register_at_fork(after_in_child=_after_fork)
+        atexit.register(shutdown)
+
+
+def stats():
+    if _handler is None:
+        return {"configured": False}
+    return {"configured": True, "queued": _handler.queue.qsize(), "dropped": _handler.dropped,
+            "level": settings.LOG_LEVEL, "sample_rates": _sample_rates}
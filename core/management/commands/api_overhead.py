@@ -0,0 +1,167 @@
+import io
+import json
+import logging
+import os
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+
+from core.lean import LeanWSGIHandler
+
+# (name, method, path, query string, body); none of them writes a WebhookLog row
+PROBES = (
+    ('test-connection', 'GET', '/api/test-connection/', '', b''),
+    ('transaction-status', 'GET', '/api/transaction-status/', 'transaction_id=TRX-OVERHEAD', b''),
+    ('get-eligible-account', 'POST', '/api/get-eligible-account/', '', b'{"amount": 150}'),
+)
+
+
+def import_times(module, server_mode):
+    """
+    Imports the application module and the URLconf (what a worker loads before
+    its first response) in a fresh interpreter under ``-X importtime``.
+    Returns [(module, self_us, cumulative_us)].
+    """
+    env = dict(os.environ, SERVER_MODE=server_mode)
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f"import {module}, {settings.ROOT_URLCONF}"],
+        capture_output=True, text=True, env=env, cwd=settings.BASE_DIR,
+    )
+    if proc.returncode:
+        raise CommandError(f"Importing {module} failed:\n{proc.stderr.strip()[-2000:]}")
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        rows.append((name.strip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+def _environ(method, path, query, body):
+    return {
+        'REQUEST_METHOD': method, 'PATH_INFO': path, 'QUERY_STRING': query, 'SCRIPT_NAME': '',
+        'SERVER_NAME': 'localhost', 'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1',
+        'HTTP_HOST': 'localhost', 'REMOTE_ADDR': '127.0.0.1', 'HTTP_USER_AGENT': 'api-overhead',
+        'CONTENT_TYPE': 'application/json', 'CONTENT_LENGTH': str(len(body)),
+        'wsgi.input': io.BytesIO(body), 'wsgi.errors': sys.stderr, 'wsgi.url_scheme': 'http',
+        'wsgi.version': (1, 0), 'wsgi.multithread': True, 'wsgi.multiprocess': True, 'wsgi.run_once': False,
+    }
+
+
+def time_requests(application, probe, count):
+    """
+    Microseconds per request through ``application`` (p50, mean), response included.
+    """
+    _, method, path, query, body = probe
+    status = []
+
+    def start_response(s, headers, exc_info=None):
+        status.append(s)
+
+    samples = []
+    for _ in range(count):
+        environ = _environ(method, path, query, body)
+        started = time.perf_counter()
+        response = application(environ, start_response)
+        for _chunk in response:
+            pass
+        response.close()
+        samples.append((time.perf_counter() - started) * 1e6)
+    return {"p50_us": round(statistics.median(samples), 1), "mean_us": round(statistics.fmean(samples), 1),
+            "status": status[-1].split()[0]}
+
+
+class Command(BaseCommand):
+    help = (
+        "Reports what a worker pays before and per request: import time of the application and "
+        "URLconf by package, and the per-request cost of the full MIDDLEWARE stack versus the lean "
+        "API chain (LEAN_API_MIDDLEWARE) and no middleware at all."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--server-mode', choices=('wsgi', 'asgi'), default=settings.SERVER_MODE,
+                            help="Which application module to import (default: SERVER_MODE).")
+        parser.add_argument('--requests', type=int, default=2000, help="Requests per probe and middleware chain.")
+        parser.add_argument('--top', type=int, default=12, help="Packages / core modules to list.")
+        parser.add_argument('--skip-imports', action='store_true')
+        parser.add_argument('--skip-requests', action='store_true')
+        parser.add_argument('--json', action='store_true', help="Print the report as JSON.")
+
+    def handle(self, *args, **options):
+        report = {}
+        if not options['skip_imports']:
+            report["imports"] = self.imports(options['server_mode'], options['top'])
+        if not options['skip_requests']:
+            report["requests"] = self.requests(max(10, options['requests']))
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+        if "imports" in report:
+            imports = report["imports"]
+            self.stdout.write(f"Import time of {imports['module']} + URLconf: {imports['total_ms']} ms "
+                              f"({imports['modules']} modules)")
+            for name, ms in imports["packages"]:
+                self.stdout.write(f"  {name:<28} {ms:>8.1f} ms")
+            self.stdout.write("  slowest core modules (cumulative):")
+            for name, ms in imports["core"]:
+                self.stdout.write(f"    {name:<26} {ms:>8.1f} ms")
+        if "requests" in report:
+            self.stdout.write(f"Per-request time, p50 over {report['requests']['count']} requests "
+                              f"(full = MIDDLEWARE, lean = LEAN_API_MIDDLEWARE):")
+            self.stdout.write(f"  {'probe':<22} {'status':>6} {'full':>9} {'lean':>9} {'none':>9} {'saved':>9}")
+            for name, row in report["requests"]["probes"].items():
+                self.stdout.write(
+                    f"  {name:<22} {row['status']:>6} {row['full']['p50_us']:>7.0f}us {row['lean']['p50_us']:>7.0f}us "
+                    f"{row['none']['p50_us']:>7.0f}us {row['saved_us']:>7.0f}us ({row['saved_pct']}%)"
+                )
+            lean = ', '.join(settings.LEAN_API_PATHS) or "(disabled: LEAN_API_PATHS is empty)"
+            self.stdout.write(f"Lean paths: {lean}")
+
+    def imports(self, server_mode, top):
+        module = f"nexkasa_debug.{server_mode}"
+        rows = import_times(module, server_mode)
+        packages = defaultdict(int)
+        for name, self_us, _ in rows:
+            packages[name.split('.')[0]] += self_us
+        core = sorted(((name, cumulative) for name, _, cumulative in rows if name.startswith('core.')),
+                      key=lambda row: row[1], reverse=True)
+        return {
+            "module": module,
+            "total_ms": round(sum(self_us for _, self_us, _ in rows) / 1000, 1),
+            "modules": len(rows),
+            "packages": [(name, round(us / 1000, 1))
+                         for name, us in sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]],
+            "core": [(name, round(us / 1000, 1)) for name, us in core[:top]],
+        }
+
+    def requests(self, count):
+        chains = {"full": WSGIHandler(), "lean": LeanWSGIHandler(), "none": LeanWSGIHandler(middleware=[])}
+        probes = {}
+        # transaction-status answers 404 on purpose; keep "Not Found" warnings out of the timings
+        request_logger = logging.getLogger('django.request')
+        level = request_logger.level
+        request_logger.setLevel(logging.ERROR)
+        try:
+            for probe in PROBES:
+                probes[probe[0]] = self.probe(chains, probe, count)
+        finally:
+            request_logger.setLevel(level)
+        return {"count": count, "probes": probes}
+
+    def probe(self, chains, probe, count):
+        row = {}
+        for label, application in chains.items():
+            time_requests(application, probe, max(1, count // 10))  # warm up
+            row[label] = time_requests(application, probe, count)
+        row["status"] = row["full"]["status"]
+        row["saved_us"] = round(row["full"]["p50_us"] - row["lean"]["p50_us"], 1)
+        row["saved_pct"] = round(100 * row["saved_us"] / row["full"]["p50_us"], 1) if row["full"]["p50_us"] else 0
+        return row
@@ -0,0 +1,187 @@
+import itertools
+import json
+import os
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from core.benchmark import (
+    BENCH_PASSWORD, BENCH_USER, CallbackReceiver, LocalServer, compare, environment, login_cookie,
+)
+from core.loadtest import run_load_test
+
+SCENARIOS = ('webhook_listener', 'create_transaction', 'get_webhook_logs')
+
+
+def _order_id(seq):
+    # CallbackReceiver derives the request -> callback lag from the send time
+    return f"bench-{next(seq)}-{time.time_ns()}"
+
+
+def webhook_payload(seq):
+    return lambda: {"event": "transaction.success", "transaction_id": "TRX-1A2B3C000042", "order_id": _order_id(seq),
+                    "amount": 15000.0, "currency": "TRY", "status": "APPROVED", "timestamp": "2026-02-14T12:00:00Z"}
+
+
+def transaction_payload(seq, callback_url):
+    return lambda: {"amount": 150, "user_id": "bench_user", "full_name": "Bench User",
+                    "external_id": _order_id(seq), "callback_url": callback_url}
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmarks webhook_listener, create-transaction (with callback fan-out to a local receiver) "
+        "and get-webhook-logs against a local gunicorn on a scratch database. Saves results as a JSON "
+        "baseline and fails when a run regresses p99 or throughput against one."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scenario', action='append', choices=SCENARIOS,
+                            help="Run only this scenario (repeatable; default: all).")
+        parser.add_argument('--duration', type=float, default=10.0, help="Measured seconds per scenario.")
+        parser.add_argument('--warmup', type=float, default=2.0, help="Unmeasured seconds before each scenario.")
+        parser.add_argument('--concurrency', type=int, default=16, help="Concurrent clients per scenario.")
+        parser.add_argument('--server-mode', choices=('wsgi', 'asgi'), default='wsgi',
+                            help="gthread workers (wsgi) or uvicorn workers (asgi).")
+        parser.add_argument('--workers', type=int, default=2, help="gunicorn worker processes.")
+        parser.add_argument('--threads', type=int, default=8, help="Threads per gthread worker.")
+        parser.add_argument('--url', help="Benchmark an already running server instead (no DB insert rate; "
+                                          "callbacks need it on this host).")
+        parser.add_argument('--username', default=BENCH_USER, help="Dashboard user for get_webhook_logs with --url.")
+        parser.add_argument('--password', default=BENCH_PASSWORD)
+        parser.add_argument('--save', metavar='PATH', help="Write the results here as a JSON baseline.")
+        parser.add_argument('--compare', metavar='PATH', help="Compare against this baseline; exit 1 on regression.")
+        parser.add_argument('--max-p99-regression', type=float, default=20.0,
+                            help="Allowed p99 / callback lag increase in percent (default 20).")
+        parser.add_argument('--max-rps-regression', type=float, default=10.0,
+                            help="Allowed throughput / insert rate drop in percent (default 10).")
+        parser.add_argument('--json', action='store_true', help="Print the full results as JSON.")
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['compare']:
+            try:
+                with open(options['compare']) as f:
+                    baseline = json.load(f)
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Cannot read baseline {options['compare']}: {e}")
+
+        scenarios = options['scenario'] or list(SCENARIOS)
+        config = {
+            "scenarios": scenarios, "duration_s": options['duration'], "warmup_s": options['warmup'],
+            "concurrency": options['concurrency'], "server_mode": options['server_mode'],
+            "workers": options['workers'], "threads": options['threads'], "external_url": bool(options['url']),
+        }
+        try:
+            with tempfile.TemporaryDirectory(prefix='nexkasa-bench-') as workdir, CallbackReceiver() as receiver:
+                if options['url']:
+                    results = self.run_all(options['url'].rstrip('/'), None, receiver, scenarios, options)
+                else:
+                    server = LocalServer(workdir, server_mode=options['server_mode'], workers=options['workers'],
+                                         threads=options['threads'],
+                                         manage_py=os.path.join(settings.BASE_DIR, 'manage.py'))
+                    with server:
+                        results = self.run_all(server.url, server, receiver, scenarios, options)
+        except RuntimeError as e:
+            raise CommandError(str(e))
+
+        result = {"created_at": timezone.now().isoformat(), "config": config, "environment": environment(),
+                  "scenarios": results}
+        if options['json']:
+            self.stdout.write(json.dumps(result, indent=2))
+        if options['save']:
+            with open(options['save'], 'w') as f:
+                json.dump(result, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Saved baseline to {options['save']}"))
+        if baseline is not None:
+            self.report_comparison(baseline, result, options)
+
+    def run_all(self, base_url, server, receiver, scenarios, options):
+        cookie = None
+        if 'get_webhook_logs' in scenarios:
+            cookie = login_cookie(base_url, options['username'], options['password'])
+        seq = itertools.count()
+        results = {}
+        for name in scenarios:
+            load = {'concurrency': options['concurrency'], 'duration': options['duration'],
+                    'warmup': options['warmup'], 'timeout': 10.0}
+            db_rows = None
+            if name == 'webhook_listener':
+                sampler = _RowSampler(server, options['warmup'], options['duration']) if server else None
+                report = run_load_test(base_url + '/api/webhook-listener/', 'POST', payload=webhook_payload(seq), **load)
+                db_rows = sampler.rate() if sampler else None
+            elif name == 'create_transaction':
+                receiver.reset()
+                start = next(seq)
+                report = run_load_test(base_url + '/api/create-transaction/', 'POST',
+                                       payload=transaction_payload(seq, receiver.url), **load)
+                # Every request (warm-up included) that got a 200 queued one callback
+                expected = next(seq) - start - 1 - sum(
+                    n for code, n in report["status_codes"].items() if code != '200')
+                receiver.wait(expected, timeout=5)
+                report["callbacks"] = receiver.summary(expected)
+            else:
+                report = run_load_test(base_url + '/api/get-webhook-logs/?limit=50', 'GET',
+                                       headers={'Cookie': cookie}, **load)
+            scenario = {key: report[key] for key in ('requests', 'errors', 'error_rate', 'throughput_rps',
+                                                     'latency', 'status_codes')}
+            if db_rows is not None:
+                scenario["db_rows_per_sec"] = db_rows
+            if "callbacks" in report:
+                scenario["callbacks"] = report["callbacks"]
+            results[name] = scenario
+            self.print_scenario(name, scenario)
+        return results
+
+    def print_scenario(self, name, s):
+        lat = s["latency"]
+        line = (f"{name:<20} {s['throughput_rps']:>9} req/s  p50 {lat['p50_ms']} ms  p99 {lat['p99_ms']} ms  "
+                f"errors {s['errors']} ({s['error_rate'] * 100:.2f}%)")
+        if "db_rows_per_sec" in s:
+            line += f"  db {s['db_rows_per_sec']} rows/s"
+        self.stdout.write(line)
+        if "callbacks" in s:
+            cb = s["callbacks"]
+            self.stdout.write(f"{'  callbacks':<20} {cb['received']}/{cb['expected']} received  "
+                              f"{cb['callbacks_per_sec']} /s  lag p50 {cb['lag']['p50_ms']} ms  "
+                              f"p99 {cb['lag']['p99_ms']} ms")
+
+    def report_comparison(self, baseline, result, options):
+        rows, regressions, warnings = compare(baseline, result, options['max_p99_regression'],
+                                              options['max_rps_regression'])
+        self.stdout.write(f"\nCompared with baseline from {baseline.get('created_at')} "
+                          f"(commit {baseline.get('environment', {}).get('git_commit')}):")
+        for row in rows:
+            text = f"  {row['metric']:<42} {row['baseline']:>10} -> {row['current']:>10}  {row['change_pct']:+.1f}%"
+            self.stdout.write(self.style.ERROR(text) if row['regressed'] else text)
+        for warning in warnings:
+            self.stdout.write(self.style.WARNING(f"  warning: {warning}"))
+        if regressions:
+            raise CommandError("Performance regression:\n  " + "\n  ".join(regressions))
+        self.stdout.write(self.style.SUCCESS("No regression beyond the thresholds."))
+
+
+class _RowSampler:
+    """
+    Counts core_webhooklog rows at the start and end of the measured window.
+    """
+
+    def __init__(self, server, warmup, duration):
+        self.counts = []
+        self.duration = duration
+
+        def sample():
+            time.sleep(warmup)
+            self.counts.append(server.row_count())
+            time.sleep(duration)
+            self.counts.append(server.row_count())
+        self.thread = threading.Thread(target=sample, name='bench-rows', daemon=True)
+        self.thread.start()
+
+    def rate(self):
+        self.thread.join()
+        return round((self.counts[1] - self.counts[0]) / self.duration, 1)
@@ -0,0 +1,56 @@
+import json
+import timeit
+
+from django.core.management.base import BaseCommand
+from django.http import JsonResponse
+
+from core import fastjson
+
+TRANSACTION_CALLBACK = {"event": "transaction.success", "transaction_id": "TRX-1A2B3C000042", "order_id": "order_4821",
+                        "amount": 15000.0, "currency": "TRY", "status": "APPROVED", "timestamp": "2026-02-14T12:00:00Z"}
+WITHDRAWAL_CALLBACK = {"event": "withdrawal.status", "transaction_id": "W-1A2B3C000043", "external_id": "withdraw_77",
+                       "amount": 2500, "currency": "TRY", "status": "PAID", "timestamp": "2026-02-14T12:05:00Z"}
+
+# Typical payload sizes: a single callback, a PSP callback with metadata, a 50-item batch
+PAYLOADS = {
+    "callback": TRANSACTION_CALLBACK,
+    "callback+meta": {**WITHDRAWAL_CALLBACK, "customer": {"name": "AHMET MEHMET", "iban": "TR450015700000000125414973"},
+                      "metadata": {f"key_{i}": f"value_{i}" * 4 for i in range(20)}},
+    "batch-50": {"items": [dict(TRANSACTION_CALLBACK, order_id=f"order_{i}") for i in range(50)]},
+}
+
+
+class Command(BaseCommand):
+    help = "Micro-benchmarks JSON parsing/serialization of callback-sized payloads: stdlib vs the fast backend."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--number', type=int, default=20000, help="Iterations per measurement.")
+
+    def handle(self, *args, **options):
+        number = options['number']
+        self.stdout.write(f"fast backend: {fastjson.BACKEND}")
+        results = {}
+        for name, payload in PAYLOADS.items():
+            raw = json.dumps(payload).encode()
+            cases = {
+                # What the views used to do: decode to str, then parse
+                "parse stdlib (decode+loads)": lambda: json.loads(raw.decode('utf-8')),
+                "parse fast (bytes)": lambda: fastjson.loads(raw),
+                "dump stdlib": lambda: json.dumps(payload).encode(),
+                "dump fast": lambda: fastjson.dumps(payload),
+                "JsonResponse": lambda: JsonResponse(payload),
+                "FastJsonResponse": lambda: fastjson.FastJsonResponse(payload),
+            }
+            results[name] = {"bytes": len(raw)}
+            self.stdout.write(f"\n{name} ({len(raw)} bytes)")
+            for case, fn in cases.items():
+                seconds = min(timeit.repeat(fn, number=number, repeat=3))
+                us = seconds / number * 1e6
+                results[name][case] = round(us, 3)
+                self.stdout.write(f"  {case:<28} {us:>8.2f} us/op  {number / seconds:>10.0f} ops/s")
+            for label, slow, fast in (("parse", "parse stdlib (decode+loads)", "parse fast (bytes)"),
+                                      ("dump", "dump stdlib", "dump fast"),
+                                      ("response", "JsonResponse", "FastJsonResponse")):
+                self.stdout.write(self.style.SUCCESS(
+                    f"  {label}: {results[name][slow] / results[name][fast]:.1f}x faster"))
+        self.stdout.write(json.dumps(results))
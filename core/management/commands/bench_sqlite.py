@@ -0,0 +1,114 @@
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+# Same shape as the core_webhooklog table
+WEBHOOKLOG_DDL = """
+CREATE TABLE IF NOT EXISTS core_webhooklog (
+    id char(32) NOT NULL PRIMARY KEY,
+    timestamp datetime NOT NULL,
+    sender_ip varchar(50) NULL,
+    method varchar(10) NOT NULL,
+    headers text NOT NULL,
+    body text NULL,
+    raw_body text NULL
+)
+"""
+INSERT_SQL = "INSERT INTO core_webhooklog (id, timestamp, sender_ip, method, headers, body, raw_body) VALUES (?, ?, ?, ?, ?, ?, ?)"
+
+PROFILES = {
+    # Stock Django: rollback journal, FULL sync, 5s timeout, connection per request
+    'default': {'pragmas': {}, 'timeout': 5, 'persistent': False},
+    # DB_PROFILE=performance: tuned pragmas, persistent connections
+    'performance': {'pragmas': settings.SQLITE_PERFORMANCE_PRAGMAS, 'timeout': 20, 'persistent': True},
+}
+
+
+class Command(BaseCommand):
+    help = "Benchmarks concurrent WebhookLog-shaped inserts under the default and performance SQLite profiles."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8, help="Concurrent writers (like gunicorn workers/threads).")
+        parser.add_argument('--rows', type=int, default=500, help="Inserts per writer.")
+        parser.add_argument('--dir', default=None, help="Directory for the scratch databases (default: temp dir).")
+
+    def handle(self, *args, **options):
+        payload = {"event": "transaction.success", "transaction_id": "TRX-123456", "order_id": "ext_123",
+                   "amount": 150, "currency": "TRY", "status": "APPROVED", "timestamp": "2026-02-14T12:00:00Z"}
+        results = {}
+        with tempfile.TemporaryDirectory(dir=options['dir']) as tmp:
+            for name, profile in PROFILES.items():
+                path = os.path.join(tmp, f"bench_{name}.sqlite3")
+                results[name] = self.run_profile(path, profile, options['threads'], options['rows'], payload)
+                r = results[name]
+                self.stdout.write(
+                    f"{name:<12} {r['rows_per_sec']:>9.0f} rows/s  p50 {r['p50_ms']:.2f} ms  p99 {r['p99_ms']:.2f} ms  "
+                    f"errors {r['errors']}  ({r['inserted']} rows in {r['elapsed_s']:.2f}s)"
+                )
+        if results['default']['rows_per_sec']:
+            speedup = results['performance']['rows_per_sec'] / results['default']['rows_per_sec']
+            self.stdout.write(self.style.SUCCESS(f"performance profile: {speedup:.1f}x insert throughput"))
+        self.stdout.write(json.dumps(results))
+
+    def connect(self, path, pragmas, timeout):
+        conn = sqlite3.connect(path, timeout=timeout, isolation_level=None, check_same_thread=False)
+        for name, value in pragmas.items():
+            conn.execute(f"PRAGMA {name} = {value}")
+        return conn
+
+    def run_profile(self, path, profile, threads, rows, payload):
+        pragmas = profile['pragmas']
+        setup = self.connect(path, pragmas, profile['timeout'])
+        setup.execute(WEBHOOKLOG_DDL)
+        setup.close()
+
+        body = json.dumps(payload)
+        headers = json.dumps({"target": "N/A", "type": "transaction.callback"})
+        latencies, errors, lock = [], [0], threading.Lock()
+
+        def writer():
+            conn = self.connect(path, pragmas, profile['timeout']) if profile['persistent'] else None
+            local = []
+            for _ in range(rows):
+                started = time.perf_counter()
+                try:
+                    c = conn or self.connect(path, pragmas, profile['timeout'])
+                    c.execute(INSERT_SQL, (uuid.uuid4().hex, time.strftime('%Y-%m-%d %H:%M:%S'),
+                                           "127.0.0.1", "POST", headers, body, body))
+                    if conn is None:
+                        c.close()
+                    local.append((time.perf_counter() - started) * 1000)
+                except sqlite3.OperationalError:
+                    with lock:
+                        errors[0] += 1
+            if conn is not None:
+                conn.close()
+            with lock:
+                latencies.extend(local)
+
+        workers = [threading.Thread(target=writer) for _ in range(threads)]
+        started = time.perf_counter()
+        for t in workers:
+            t.start()
+        for t in workers:
+            t.join()
+        elapsed = time.perf_counter() - started
+
+        latencies.sort()
+        pct = lambda p: latencies[int(p * (len(latencies) - 1))] if latencies else 0
+        return {
+            "inserted": len(latencies),
+            "errors": errors[0],
+            "elapsed_s": round(elapsed, 3),
+            "rows_per_sec": round(len(latencies) / elapsed, 1) if elapsed else 0,
+            "p50_ms": round(pct(0.50), 3),
+            "p99_ms": round(pct(0.99), 3),
+            "pragmas": pragmas,
+        }
@@ -0,0 +1,89 @@
+import os
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+
+
+def process_age():
+    """
+    Seconds since this process started (interpreter + Django setup included), or None off Linux.
+    """
+    try:
+        with open('/proc/self/stat') as f:
+            start_ticks = int(f.read().rsplit(')', 1)[1].split()[19])
+        with open('/proc/uptime') as f:
+            uptime = float(f.read().split()[0])
+        return uptime - start_ticks / os.sysconf('SC_CLK_TCK')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        "Container boot steps in one process: applies pending migrations, ensures the "
+        "DJANGO_SUPERUSER_* account exists and collects static files, skipping whatever is "
+        "already done, and reports how long each phase took."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--collectstatic', choices=('auto', 'always', 'never'), default='auto',
+                            help="auto = only when the static manifest is missing (e.g. not built into the image).")
+        parser.add_argument('--skip-migrate', action='store_true', help="Leave migrations to a release job.")
+
+    def handle(self, *args, **options):
+        self.timings = []
+        startup = process_age()
+        if startup is not None:
+            self.timings.append(("python + django setup", startup, ""))
+
+        if options['skip_migrate']:
+            self.timings.append(("migrate", 0.0, "skipped (--skip-migrate)"))
+        else:
+            self.phase("migrate", self.migrate)
+        self.phase("superuser", self.superuser)
+        if options['collectstatic'] == 'never':
+            self.timings.append(("collectstatic", 0.0, "skipped (--collectstatic never)"))
+        else:
+            self.phase("collectstatic", lambda: self.collectstatic(options['collectstatic'] == 'always'))
+
+        for name, seconds, note in self.timings:
+            self.stdout.write(f"  {name:<22} {seconds * 1000:>8.0f} ms  {note}")
+        total = sum(seconds for _, seconds, _ in self.timings)
+        self.stdout.write(self.style.SUCCESS(f"Bootstrap finished in {total:.2f}s."))
+
+    def phase(self, name, step):
+        started = time.perf_counter()
+        note = step()
+        self.timings.append((name, time.perf_counter() - started, note))
+
+    def migrate(self):
+        executor = MigrationExecutor(connection)
+        plan = executor.migration_plan(executor.loader.graph.leaf_nodes())
+        if not plan:
+            return "up to date"
+        call_command('migrate', interactive=False, verbosity=0)
+        return f"applied {len(plan)} migration(s)"
+
+    def superuser(self):
+        username = os.environ.get('DJANGO_SUPERUSER_USERNAME', 'admin')
+        User = get_user_model()
+        if User.objects.filter(username=username).exists():
+            return f"{username!r} exists"
+        User.objects.create_superuser(
+            username=username,
+            email=os.environ.get('DJANGO_SUPERUSER_EMAIL', 'admin@nexkasa.com'),
+            password=os.environ.get('DJANGO_SUPERUSER_PASSWORD', 'admin123'),
+        )
+        return f"created {username!r}"
+
+    def collectstatic(self, force):
+        manifest = os.path.join(settings.STATIC_ROOT, 'staticfiles.json')
+        if not force and os.path.exists(manifest):
+            return "manifest present (collected at build time)"
+        call_command('collectstatic', interactive=False, verbosity=0)
+        return "collected"
@@ -0,0 +1,130 @@
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, close_old_connections
+from django.db.models import Q
+from django.utils import timezone
+
+from core.delivery import get_engine, retry_delay
+from core.models import OutboundCallback
+
+# Pauses before retrying a claim or record step that found the database locked
+# (another deliver_callbacks process or a gunicorn worker holding the write lock)
+LOCKED_RETRY_DELAYS = (0.1, 0.5, 2.0, 5.0)
+
+
+class Command(BaseCommand):
+    help = "Claims due OutboundCallback rows in batches and delivers them with exponential backoff."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100, help="Rows claimed per round.")
+        parser.add_argument('--concurrency', type=int, default=16, help="Parallel HTTP deliveries per batch.")
+        parser.add_argument('--poll-interval', type=float, default=1.0, help="Seconds to sleep when nothing is due.")
+        parser.add_argument('--lease', type=float, default=60.0, help="Seconds a claim is held before another worker may retake it.")
+        parser.add_argument('--once', action='store_true', help="Process one batch and exit.")
+
+    def handle(self, *args, **options):
+        worker_id = uuid.uuid4().hex
+        engine = get_engine()
+        self.stdout.write(f"Callback worker {worker_id[:8]} started (batch={options['batch_size']}, concurrency={options['concurrency']})")
+
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+            try:
+                while True:
+                    close_old_connections()
+                    rows = self.retry_locked(self.claim, worker_id, options['batch_size'], options['lease']) or []
+                    if rows:
+                        results = list(pool.map(lambda row: self.attempt(engine, row), rows))
+                        # Not recorded: the rows stay in flight and are retried once the lease expires
+                        self.retry_locked(self.record, rows, results)
+                    if options['once']:
+                        break
+                    if not rows:
+                        time.sleep(options['poll_interval'])
+            except KeyboardInterrupt:
+                self.stdout.write("Callback worker stopped.")
+
+    def retry_locked(self, step, *args):
+        """
+        Runs ``step``, backing off while SQLite reports the database as locked.
+        Returns None if it is still locked after the last retry, so one busy
+        moment never stops the worker.
+        """
+        for delay in LOCKED_RETRY_DELAYS + (None,):
+            try:
+                return step(*args)
+            except OperationalError as e:
+                if delay is None:
+                    self.stderr.write(f"{step.__name__} skipped, database still busy: {e}")
+                    return None
+                self.stderr.write(f"{step.__name__}: {e}; retrying in {delay}s")
+                close_old_connections()
+                time.sleep(delay)
+
+    def claim(self, worker_id, batch_size, lease):
+        """
+        Marks up to ``batch_size`` due rows as in flight for this worker. Expired
+        leases (a worker died mid-batch) are picked up again.
+
+        A single UPDATE ... WHERE id IN (SELECT ... LIMIT n) statement, so the
+        claim takes the write lock up front instead of upgrading a read
+        transaction (which SQLite in WAL mode refuses with "database is locked"
+        when another writer got there first). ``locked_until`` is unique per
+        claim and tells this round's rows apart from earlier ones.
+        """
+        now = timezone.now()
+        until = now + timedelta(seconds=lease)
+        due = (
+            Q(status=OutboundCallback.STATUS_PENDING, next_attempt_at__lte=now)
+            | Q(status=OutboundCallback.STATUS_IN_FLIGHT, locked_until__lt=now)
+        )
+        claimed = OutboundCallback.objects.filter(
+            id__in=OutboundCallback.objects.filter(due).order_by('next_attempt_at').values('id')[:batch_size]
+        ).update(
+            status=OutboundCallback.STATUS_IN_FLIGHT,
+            claimed_by=worker_id,
+            locked_until=until,
+        )
+        if not claimed:
+            return []
+        return list(OutboundCallback.objects.filter(
+            claimed_by=worker_id, locked_until=until, status=OutboundCallback.STATUS_IN_FLIGHT,
+        ))
+
+    def attempt(self, engine, row):
+        started = time.perf_counter()
+        try:
+            status_code, text, latency_ms = engine.post(row.target_url, row.payload)
+            return status_code, None, latency_ms
+        except Exception as e:
+            return None, str(e), (time.perf_counter() - started) * 1000
+
+    def record(self, rows, results):
+        now = timezone.now()
+        for row, (status_code, error, latency_ms) in zip(rows, results):
+            row.attempts += 1
+            row.last_status_code = status_code
+            row.last_latency_ms = latency_ms
+            row.total_latency_ms += latency_ms
+            row.claimed_by = None
+            row.locked_until = None
+            if status_code is not None and 200 <= status_code < 300:
+                row.status = OutboundCallback.STATUS_DELIVERED
+                row.delivered_at = now
+                row.last_error = None
+            else:
+                row.last_error = error or f"HTTP {status_code}"
+                if row.attempts >= row.max_attempts:
+                    row.status = OutboundCallback.STATUS_FAILED
+                else:
+                    row.status = OutboundCallback.STATUS_PENDING
+                    row.next_attempt_at = now + timedelta(seconds=retry_delay(row.attempts))
+        OutboundCallback.objects.bulk_update(rows, [
+            'attempts', 'status', 'next_attempt_at', 'claimed_by', 'locked_until',
+            'last_status_code', 'last_error', 'last_latency_ms', 'total_latency_ms', 'delivered_at',
+        ])
+        delivered = sum(1 for r in rows if r.status == OutboundCallback.STATUS_DELIVERED)
+        self.stdout.write(f"Batch: {len(rows)} attempted, {delivered} delivered, {len(rows) - delivered} pending/failed")
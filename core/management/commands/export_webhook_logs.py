@@ -0,0 +1,53 @@
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.export import FORMATS, export_filename, export_stream
+from core.queries import BODY_FILTERS
+
+
+class Command(BaseCommand):
+    help = (
+        "Exports WebhookLog rows as NDJSON, CSV, gzip column blocks or Parquet, "
+        "page by page in bounded memory."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=list(FORMATS), default='ndjson', dest='fmt')
+        parser.add_argument('--gzip', action='store_true', help="Compress ndjson / csv output.")
+        parser.add_argument('--output', '-o',
+                            help="File to write (default: generated name in the current directory, '-' for stdout).")
+        parser.add_argument('--since', help="Only rows at or after this time (ISO, or 15m / 2h / 7d ago).")
+        parser.add_argument('--until', help="Only rows before this time.")
+        parser.add_argument('--method', help="Only rows with this HTTP method.")
+        parser.add_argument('--sender-ip', help="Only rows from this sender IP.")
+        for param in BODY_FILTERS:
+            parser.add_argument(f"--{param.replace('_', '-')}", dest=param, help=f"Only rows whose body.{param} matches.")
+        parser.add_argument('--chunk-size', type=int, default=settings.EXPORT_CHUNK_SIZE, help="Rows per query.")
+
+    def handle(self, *args, **options):
+        params = {key: options[key] for key in ('since', 'until', 'method', 'sender_ip', *BODY_FILTERS)
+                  if options.get(key)}
+        try:
+            chunks = export_stream(params, fmt=options['fmt'], compress=options['gzip'],
+                                   chunk_size=options['chunk_size'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        path = options['output'] or export_filename(options['fmt'], options['gzip'])
+        out = sys.stdout.buffer if path == '-' else open(path, 'wb')
+        written = 0
+        started = time.monotonic()
+        try:
+            for chunk in chunks:
+                out.write(chunk)
+                written += len(chunk)
+        finally:
+            if out is not sys.stdout.buffer:
+                out.close()
+        if path != '-':
+            self.stdout.write(self.style.SUCCESS(
+                f"Wrote {written / 1024 / 1024:.1f} MB to {path} in {time.monotonic() - started:.1f}s."
+            ))
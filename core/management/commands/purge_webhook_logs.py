@@ -0,0 +1,131 @@
+import gzip
+import json
+import os
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.ingest import is_duplicate_raw_body
+from core.models import WebhookLog
+from core.queries import log_record
+
+
+class Command(BaseCommand):
+    help = (
+        "Deletes WebhookLog rows older than the retention age or beyond the row limit, "
+        "in small batches, optionally archiving them to gzip JSONL segments first."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=float, default=settings.WEBHOOK_LOG_RETENTION_DAYS,
+                            help="Delete rows older than this many days (0 = no age limit).")
+        parser.add_argument('--max-rows', type=int, default=settings.WEBHOOK_LOG_MAX_ROWS,
+                            help="Keep at most this many newest rows (0 = no row limit).")
+        parser.add_argument('--batch-size', type=int, default=500, help="Rows deleted per transaction.")
+        parser.add_argument('--sleep', type=float, default=0.05, help="Pause between batches so writers get the lock.")
+        parser.add_argument('--archive-dir', default=settings.WEBHOOK_LOG_ARCHIVE_DIR,
+                            help="Append expired rows to a .jsonl.gz segment here before deleting them.")
+        parser.add_argument('--compact-raw-body', action='store_true',
+                            help="Also clear raw_body on kept rows where it duplicates body.")
+        parser.add_argument('--dry-run', action='store_true', help="Only report how many rows would be purged.")
+
+    def handle(self, *args, **options):
+        expired = self.expired_queryset(options['days'], options['max_rows'])
+        if expired is None:
+            self.stdout.write("No retention limit configured (--days / --max-rows). Nothing to purge.")
+        elif options['dry_run']:
+            self.stdout.write(f"{expired.count()} rows would be purged.")
+        else:
+            self.purge(expired, options)
+
+        if options['compact_raw_body'] and not options['dry_run']:
+            self.compact_raw_body(options['batch_size'], options['sleep'])
+
+    def expired_queryset(self, days, max_rows):
+        """
+        Rows past either limit. The row limit is turned into a (timestamp, id)
+        boundary once, so every batch afterwards is an index range scan.
+        """
+        qs = None
+        if days:
+            qs = WebhookLog.objects.filter(timestamp__lt=timezone.now() - timedelta(days=days))
+        if max_rows:
+            boundary = (
+                WebhookLog.objects.order_by('-timestamp', '-id')
+                .values_list('timestamp', 'id')[max_rows - 1:max_rows]
+            )
+            boundary = list(boundary)
+            if boundary:
+                ts, log_id = boundary[0]
+                over_limit = WebhookLog.objects.filter(timestamp__lte=ts).exclude(timestamp=ts, id__gte=log_id)
+                qs = over_limit if qs is None else (qs | over_limit)
+            elif qs is None:
+                qs = WebhookLog.objects.none()
+        return qs
+
+    def purge(self, expired, options):
+        archive = None
+        if options['archive_dir']:
+            os.makedirs(options['archive_dir'], exist_ok=True)
+            name = f"webhooklog-{timezone.now().strftime('%Y%m%dT%H%M%SZ')}-{os.getpid()}.jsonl.gz"
+            path = os.path.join(options['archive_dir'], name)
+            # Append-only segment; each batch is its own gzip member, so a crash
+            # mid-run leaves a readable file.
+            archive = open(path, 'ab')
+            self.stdout.write(f"Archiving to {path}")
+
+        total = 0
+        started = time.monotonic()
+        try:
+            while True:
+                batch = expired.order_by('timestamp', 'id')[:options['batch_size']]
+                if archive is not None:
+                    logs = list(batch)
+                    ids = [log.id for log in logs]
+                    if logs:
+                        lines = "".join(json.dumps(log_record(log)) + "\n" for log in logs)
+                        archive.write(gzip.compress(lines.encode('utf-8')))
+                        archive.flush()
+                        os.fsync(archive.fileno())
+                else:
+                    ids = list(batch.values_list('id', flat=True))
+                if not ids:
+                    break
+                deleted, _ = WebhookLog.objects.filter(id__in=ids).delete()
+                total += deleted
+                if options['sleep']:
+                    time.sleep(options['sleep'])
+        finally:
+            if archive is not None:
+                archive.close()
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(f"Purged {total} webhook logs in {elapsed:.1f}s."))
+
+    def compact_raw_body(self, batch_size, pause):
+        """
+        Clears raw_body where it is exactly json.dumps(body); WebhookLog.raw_text
+        rebuilds it on read.
+        """
+        compacted = 0
+        last = None
+        while True:
+            qs = WebhookLog.objects.filter(raw_body__isnull=False).order_by('timestamp', 'id')
+            if last is not None:
+                qs = qs.filter(timestamp__gte=last[0]).exclude(timestamp=last[0], id__lte=last[1])
+            rows = list(qs.only('id', 'timestamp', 'body', 'raw_body')[:batch_size])
+            if not rows:
+                break
+            last = (rows[-1].timestamp, rows[-1].id)
+            duplicates = [row for row in rows if is_duplicate_raw_body(row.raw_body, row.body)]
+            for row in duplicates:
+                row.raw_body = None
+            if duplicates:
+                WebhookLog.objects.bulk_update(duplicates, ['raw_body'])
+                compacted += len(duplicates)
+            if pause:
+                time.sleep(pause)
+        self.stdout.write(self.style.SUCCESS(f"Cleared duplicate raw_body on {compacted} rows."))
@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuilds the FTS5 webhook search index from core_webhooklog. Needed after VACUUM, "
+        "which may renumber the rowids the index is keyed by."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=20000, help="Rows indexed per statement.")
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        try:
+            total = rebuild_index(batch_size=options['batch_size'],
+                                  progress=lambda n: self.stdout.write(f"  {n} rows indexed"))
+        except ValueError as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(
+            f"Indexed {total} webhook logs in {time.monotonic() - started:.1f}s."
+        ))
@@ -0,0 +1,56 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.queries import BODY_FILTERS
+from core.replay import MODES, format_report, replay_queryset, run_replay
+
+
+class Command(BaseCommand):
+    help = (
+        "Replays stored WebhookLog requests against a target URL with their original timing, "
+        "at a fixed rate or as fast as possible, and reports latency and response diffs."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('target_url', help="URL every captured request is sent to.")
+        parser.add_argument('--mode', choices=MODES, default='original',
+                            help="original = captured inter-arrival gaps, rps = fixed rate, max = no pacing.")
+        parser.add_argument('--rps', type=float, help="Requests per second for --mode rps.")
+        parser.add_argument('--speed', type=float, default=1.0,
+                            help="Time compression for --mode original (2 = twice as fast).")
+        parser.add_argument('--concurrency', type=int, default=10, help="Maximum requests in flight.")
+        parser.add_argument('--limit', type=int, default=0, help="Replay at most this many logs (0 = all).")
+        parser.add_argument('--since', help="Only logs captured at or after this time (ISO, or 15m / 2h / 7d ago).")
+        parser.add_argument('--until', help="Only logs captured before this time.")
+        parser.add_argument('--method', help="Only logs with this HTTP method.")
+        parser.add_argument('--sender-ip', help="Only logs from this sender IP.")
+        for param in BODY_FILTERS:
+            parser.add_argument(f"--{param.replace('_', '-')}", dest=param, help=f"Only logs whose body.{param} matches.")
+        parser.add_argument('--baseline', help="Also send every request here and diff the two responses.")
+        parser.add_argument('--ignore-key', action='append', default=[],
+                            help="JSON key left out of the response diff (repeatable), e.g. timestamp.")
+        parser.add_argument('--timeout', type=float, default=10.0, help="Per-request timeout in seconds.")
+        parser.add_argument('--json', action='store_true', help="Print the full report as JSON.")
+
+    def handle(self, *args, **options):
+        if options['mode'] == 'rps' and not options['rps']:
+            raise CommandError("--mode rps needs --rps")
+        if options['speed'] <= 0 or options['concurrency'] < 1:
+            raise CommandError("--speed must be > 0 and --concurrency >= 1")
+        params = {key: options[key] for key in ('since', 'until', 'method', 'sender_ip', *BODY_FILTERS)
+                  if options.get(key)}
+        try:
+            logs = replay_queryset(params, limit=options['limit'])
+            report = run_replay(
+                logs, options['target_url'], mode=options['mode'], rps=options['rps'], speed=options['speed'],
+                concurrency=options['concurrency'], baseline_url=options['baseline'],
+                ignore_keys=options['ignore_key'], timeout=options['timeout'],
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+        else:
+            self.stdout.write(format_report(report))
@@ -0,0 +1,429 @@
+"""
+Process-local metrics with a Prometheus text endpoint that adds up every
+gunicorn worker.
+
+Each process records into its own ``Registry`` (a lock and a few dicts, cheap
+enough for the request path) and a daemon thread snapshots it to
+``METRICS_DIR/<parent pid>-<pid>-<start>.json`` every METRICS_FLUSH_INTERVAL
+seconds. The ``/metrics`` view flushes its own process, then sums counters and
+histograms over the snapshots of its siblings (same parent: the gunicorn
+master). Exited workers keep contributing their final counts, so totals never
+go backwards on a worker restart: a scrape folds their snapshots into one
+``<parent pid>-retired.json`` and deletes them, so the directory stays at one
+file per live worker however often max_requests recycles them. Gauges only
+count live processes. Files left by a previous master are removed once it is
+gone. With METRICS_DIR empty
+the endpoint reports this process only.
+"""
+import atexit
+import bisect
+import fcntl
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from core.log import get_logger
+
+logger = get_logger(__name__)
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (100, 1000, 10000, 100000, 1000000, 10000000)
+
+# Any other request method is counted as "OTHER": the webhook listener accepts
+# every method, and each distinct one would be a new label series.
+HTTP_METHODS = frozenset(('GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS', 'TRACE', 'CONNECT'))
+
+# Files this module writes to METRICS_DIR: worker snapshots and retired totals
+SNAPSHOT_FILE = re.compile(r'^\d+-(\d+-\d+|retired)\.json$')
+
+HELP = {
+    "http_requests_total": ("counter", "HTTP requests by route, method and status."),
+    "http_request_duration_seconds": ("histogram", "Time spent in Django per request."),
+    "http_response_size_bytes": ("histogram", "Response body size (non-streaming responses)."),
+    "callback_deliveries_total": ("counter", "Outgoing callback attempts by transport and outcome."),
+    "callback_delivery_duration_seconds": ("histogram", "Outgoing callback request latency."),
+    "webhooklog_writes_total": ("counter", "WebhookLog write transactions by mode (batch or direct)."),
+    "webhooklog_rows_written_total": ("counter", "WebhookLog rows written by mode."),
+    "webhooklog_write_duration_seconds": ("histogram", "WebhookLog write transaction latency by mode."),
+    "callback_queue_depth": ("gauge", "Callbacks queued in the delivery engine."),
+    "webhooklog_pending_rows": ("gauge", "Rows waiting in the ingestion buffer."),
+}
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}      # (name, labels) -> value
+        self.histograms = {}    # (name, labels) -> [bucket counts..., +Inf count, sum]
+        self.buckets = {}       # name -> bucket bounds
+        self.gauges = {}        # (name, labels) -> callable returning the current value
+        self.version = 0
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+            self.version += 1
+
+    def observe(self, name, value, buckets=LATENCY_BUCKETS, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            series = self.histograms.get(key)
+            if series is None:
+                self.buckets[name] = buckets
+                series = self.histograms[key] = [0] * (len(buckets) + 1) + [0.0]
+            series[bisect.bisect_left(buckets, value)] += 1
+            series[-1] += value
+            self.version += 1
+
+    def gauge(self, name, fn, **labels):
+        """
+        Registers a callable sampled at snapshot time.
+        """
+        with self._lock:
+            self.gauges[(name, tuple(sorted(labels.items())))] = fn
+
+    def snapshot(self):
+        with self._lock:
+            data = {
+                "counters": [[name, list(labels), value] for (name, labels), value in self.counters.items()],
+                "histograms": [[name, list(labels), list(series)] for (name, labels), series in self.histograms.items()],
+                "buckets": {name: list(bounds) for name, bounds in self.buckets.items()},
+            }
+            gauges = list(self.gauges.items())
+        data["gauges"] = []
+        for (name, labels), fn in gauges:
+            try:
+                data["gauges"].append([name, list(labels), fn()])
+            except Exception:
+                pass
+        return data
+
+
+class SnapshotWriter:
+    """
+    Writes this process's snapshot atomically (tmp file + rename) when it changed.
+    """
+
+    def __init__(self, registry, directory, interval):
+        self.registry = registry
+        self.directory = directory
+        self.interval = interval
+        self.group = f"{os.getppid()}-"
+        self.path = os.path.join(directory, f"{self.group}{os.getpid()}-{int(time.time() * 1000)}.json")
+        self._written_version = None
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def start(self):
+        threading.Thread(target=self._run, name="metrics-writer", daemon=True).start()
+        atexit.register(self.write)
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.write()
+            except Exception:
+                logger.exception("metrics.snapshot_failed", path=self.path)
+
+    def write(self, force=False):
+        with self._lock:
+            version = self.registry.version
+            if version == self._written_version and not force and not self.registry.gauges:
+                return
+            data = self.registry.snapshot()
+            data["pid"] = os.getpid()
+            fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(fd, "w") as f:
+                json.dump(data, f)
+            os.replace(tmp, self.path)
+            self._written_version = version
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+        return True
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+
+
+def _remove_stale(path):
+    """
+    Deletes a snapshot whose master process no longer exists.
+    """
+    try:
+        master = int(os.path.basename(path).split("-", 1)[0])
+    except ValueError:
+        return
+    if not _alive(master):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def _load(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _retire_dead(directory, group):
+    """
+    Folds the final snapshots of this master's exited workers into one
+    ``<master>-retired.json`` and deletes them, so workers recycled by
+    max_requests do not leave files behind for every scrape to re-read.
+    The names folded last are kept in the file: a crash between writing it
+    and deleting them cannot count a worker twice.
+    """
+    retired_name = f"{group}retired.json"
+    dead = []
+    for name in os.listdir(directory):
+        if not name.startswith(group) or not SNAPSHOT_FILE.match(name) or name == retired_name:
+            continue
+        try:
+            pid = int(name[len(group):].split("-", 1)[0])
+        except ValueError:
+            continue
+        if not _alive(pid):
+            dead.append(name)
+    if not dead:
+        return
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)  # sibling workers may be scraped at the same time
+        retired_path = os.path.join(directory, retired_name)
+        retired = _load(retired_path) or {}
+        folded_before = set(retired.get("folded", []))
+        batch, snapshots = [], [retired]
+        for name in dead:
+            if name in folded_before:
+                continue
+            snap = _load(os.path.join(directory, name))
+            if snap is not None:
+                batch.append(name)
+                snapshots.append(snap)
+        counters, histograms, _, buckets = _sum(snapshots)
+        data = {
+            "counters": [[name, list(labels), value] for (name, labels), value in counters.items()],
+            "histograms": [[name, list(labels), series] for (name, labels), series in histograms.items()],
+            "buckets": buckets,
+            "folded": batch,
+        }
+        tmp_fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(tmp_fd, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp, retired_path)
+        for name in dead:
+            try:
+                os.remove(os.path.join(directory, name))
+            except OSError:
+                pass
+    finally:
+        os.close(fd)
+
+
+def _sum(snapshots):
+    counters, histograms, gauges, buckets = {}, {}, {}, {}
+    for snap in snapshots:
+        buckets.update(snap.get("buckets", {}))
+        for name, labels, value in snap.get("counters", []):
+            key = (name, tuple(map(tuple, labels)))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, series in snap.get("histograms", []):
+            key = (name, tuple(map(tuple, labels)))
+            merged = histograms.setdefault(key, [0] * len(series))
+            for i, v in enumerate(series):
+                merged[i] += v
+        if "pid" not in snap or _alive(snap["pid"]):
+            for name, labels, value in snap.get("gauges", []):
+                key = (name, tuple(map(tuple, labels)))
+                gauges[key] = gauges.get(key, 0) + value
+    return counters, histograms, gauges, buckets
+
+
+def collect():
+    """
+    Sums the snapshots of every process (or just this one without METRICS_DIR).
+    """
+    registry = get_registry()
+    if _writer is None:
+        snapshots = [registry.snapshot()]
+    else:
+        _writer.write(force=True)
+        try:
+            _retire_dead(_writer.directory, _writer.group)
+        except OSError:
+            logger.exception("metrics.retire_failed", directory=_writer.directory)
+        snapshots = []
+        fd = os.open(_writer.directory, os.O_RDONLY)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_SH)  # not halfway through a sibling's _retire_dead()
+            for name in os.listdir(_writer.directory):
+                if not SNAPSHOT_FILE.match(name):
+                    continue
+                if not name.startswith(_writer.group):
+                    _remove_stale(os.path.join(_writer.directory, name))
+                    continue
+                snap = _load(os.path.join(_writer.directory, name))
+                if snap is not None:  # None: deleted or being replaced right now
+                    snapshots.append(snap)
+        finally:
+            os.close(fd)
+    return _sum(snapshots)
+
+
+def _labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+def render():
+    """
+    Prometheus text exposition format (0.0.4).
+    """
+    counters, histograms, gauges, buckets = collect()
+    by_name = {}
+    for (name, labels), value in sorted(counters.items()):
+        by_name.setdefault(name, []).append(f"{name}{_labels(labels)} {value}")
+    for (name, labels), value in sorted(gauges.items()):
+        by_name.setdefault(name, []).append(f"{name}{_labels(labels)} {value}")
+    for (name, labels), series in sorted(histograms.items()):
+        lines = by_name.setdefault(name, [])
+        cumulative = 0
+        for bound, count in zip(list(buckets.get(name, [])) + ["+Inf"], series[:-1]):
+            cumulative += count
+            lines.append(f"{name}_bucket{_labels(labels, [('le', bound)])} {cumulative}")
+        lines.append(f"{name}_sum{_labels(labels)} {series[-1]}")
+        lines.append(f"{name}_count{_labels(labels)} {cumulative}")
+    out = []
+    for name in sorted(by_name):
+        kind, text = HELP.get(name, ("untyped", name))
+        out.append(f"# HELP {name} {text}")
+        out.append(f"# TYPE {name} {kind}")
+        out.extend(by_name[name])
+    return "\n".join(out) + "\n"
+
+
+_registry = None
+_registry_pid = None
+_writer = None
+_registry_lock = threading.Lock()
+
+
+def get_registry():
+    """
+    Per-process registry; a forked worker starts empty with its own snapshot file.
+    """
+    global _registry, _registry_pid, _writer
+    pid = os.getpid()
+    if _registry is None or _registry_pid != pid:
+        with _registry_lock:
+            if _registry is None or _registry_pid != pid:
+                _registry = Registry()
+                _writer = None
+                if settings.METRICS_DIR:
+                    _writer = SnapshotWriter(_registry, settings.METRICS_DIR, settings.METRICS_FLUSH_INTERVAL)
+                    _writer.start()
+                _registry_pid = pid
+    return _registry
+
+
+def shutdown():
+    """
+    Writes a final snapshot for this process (gunicorn worker_exit).
+    """
+    if _writer is not None and _registry_pid == os.getpid():
+        _writer.write(force=True)
+
+
+def inc(name, value=1, **labels):
+    if settings.METRICS_ENABLED:
+        get_registry().inc(name, value, **labels)
+
+
+def observe(name, value, buckets=LATENCY_BUCKETS, **labels):
+    if settings.METRICS_ENABLED:
+        get_registry().observe(name, value, buckets, **labels)
+
+
+def gauge(name, fn, **labels):
+    if settings.METRICS_ENABLED:
+        get_registry().gauge(name, fn, **labels)
+
+
+def record_delivery(transport, status_code, seconds):
+    """
+    One outgoing callback attempt; ``status_code`` None means a network error.
+    """
+    outcome = "error" if status_code is None else f"{status_code // 100}xx"
+    inc("callback_deliveries_total", transport=transport, outcome=outcome)
+    observe("callback_delivery_duration_seconds", seconds, transport=transport)
+
+
+def record_write(mode, rows, seconds):
+    """
+    One WebhookLog write transaction (``batch`` from the buffer or ``direct``).
+    """
+    inc("webhooklog_writes_total", mode=mode)
+    inc("webhooklog_rows_written_total", rows, mode=mode)
+    observe("webhooklog_write_duration_seconds", seconds, mode=mode)
+
+
+class MetricsMiddleware:
+    """
+    Records count, latency and response size per route. The route is the URL
+    pattern (``api/create-transaction/``), never the raw path, so label
+    cardinality stays bounded; unresolved paths share ``unmatched`` and
+    non-standard methods ``OTHER``.
+    Goes first in MIDDLEWARE to time the whole stack.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = settings.METRICS_ENABLED
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        started = time.perf_counter()
+        response = self.get_response(request)
+        self.record(request, response, time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        response = await self.get_response(request)
+        self.record(request, response, time.perf_counter() - started)
+        return response
+
+    def record(self, request, response, seconds):
+        if not self.enabled:
+            return
+        match = getattr(request, 'resolver_match', None)
+        route = match.route if match is not None else 'unmatched'
+        method = request.method if request.method in HTTP_METHODS else 'OTHER'
+        registry = get_registry()
+        registry.inc("http_requests_total", route=route, method=method, status=str(response.status_code))
+        registry.observe("http_request_duration_seconds", seconds, route=route, method=method)
+        if not response.streaming:
+            registry.observe("http_response_size_bytes", len(response.content), SIZE_BUCKETS, route=route)
@@ -0,0 +1,38 @@
+# Generated by Django 5.0.7 on 2026-10-18 18:14
+
+import core.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_webhooklog_timestamp_default'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='webhooklog',
+            index=models.Index(fields=['timestamp', 'id'], name='webhooklog_ts_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='webhooklog',
+            index=models.Index(fields=['method', 'timestamp', 'id'], name='webhooklog_method_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='webhooklog',
+            index=models.Index(fields=['sender_ip', 'timestamp', 'id'], name='webhooklog_sender_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='webhooklog',
+            index=models.Index(core.models.JSONKeyText('body', 'event'), models.F('timestamp'), models.F('id'), name='webhooklog_event_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='webhooklog',
+            index=models.Index(core.models.JSONKeyText('body', 'order_id'), models.F('timestamp'), models.F('id'), name='webhooklog_order_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='webhooklog',
+            index=models.Index(core.models.JSONKeyText('body', 'external_id'), models.F('timestamp'), models.F('id'), name='webhooklog_extid_ts_idx'),
+        ),
+    ]
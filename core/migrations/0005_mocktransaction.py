@@ -0,0 +1,38 @@
+# Generated by Django 5.0.7 on 2026-10-18 18:26
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_webhooklog_query_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MockTransaction',
+            fields=[
+                ('id', models.CharField(max_length=40, primary_key=True, serialize=False)),
+                ('kind', models.CharField(max_length=12)),
+                ('external_id', models.CharField(blank=True, max_length=128, null=True)),
+                ('token_id', models.CharField(blank=True, max_length=40, null=True)),
+                ('amount', models.CharField(blank=True, max_length=32, null=True)),
+                ('user_id', models.CharField(blank=True, max_length=128, null=True)),
+                ('status', models.CharField(max_length=16)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['created_at'], name='mocktx_created_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='mocktransaction',
+            constraint=models.UniqueConstraint(condition=models.Q(('external_id__isnull', False)), fields=('kind', 'external_id'), name='mocktx_kind_external_id_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='mocktransaction',
+            constraint=models.UniqueConstraint(condition=models.Q(('token_id__isnull', False)), fields=('token_id',), name='mocktx_token_id_uniq'),
+        ),
+    ]
@@ -0,0 +1,76 @@
+# Generated by Django 5.0.7 on 2026-10-18 21:02
+
+import core.models
+from django.db import migrations, models
+
+# Contentless FTS5 index over WebhookLog, keyed by the table's implicit rowid
+# and kept in sync by triggers (see core/search.py). SQLite only; the
+# indexed values must match core.search.INDEXED_SQL.
+
+def _indexed(row):
+    # JSON bodies are indexed as their decoded keys and values (json_tree undoes
+    # \uXXXX escapes), anything else as the raw text; headers as their values.
+    payload = f"COALESCE({row}.raw_body, {row}.body)"
+    return (
+        f"CASE WHEN json_valid({payload}) THEN (SELECT group_concat(CASE WHEN typeof(key) = 'text' "
+        f"THEN key || ' ' ELSE '' END || COALESCE(atom, ''), ' ') FROM json_tree({payload})) "
+        f"ELSE COALESCE({row}.raw_body, '') END, "
+        f"CASE WHEN json_valid({row}.headers) THEN "
+        f"(SELECT group_concat(value, ' ') FROM json_each({row}.headers)) END"
+    )
+
+
+FTS_SQL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS core_webhooklog_fts USING fts5("
+    "payload, header_values, content='', tokenize='unicode61 remove_diacritics 2')",
+    f"""CREATE TRIGGER IF NOT EXISTS core_webhooklog_fts_ai AFTER INSERT ON core_webhooklog BEGIN
+        INSERT INTO core_webhooklog_fts(rowid, payload, header_values) VALUES (new.rowid, {_indexed('new')});
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS core_webhooklog_fts_ad AFTER DELETE ON core_webhooklog BEGIN
+        INSERT INTO core_webhooklog_fts(core_webhooklog_fts, rowid, payload, header_values)
+        VALUES ('delete', old.rowid, {_indexed('old')});
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS core_webhooklog_fts_au AFTER UPDATE OF raw_body, body, headers
+        ON core_webhooklog BEGIN
+        INSERT INTO core_webhooklog_fts(core_webhooklog_fts, rowid, payload, header_values)
+        VALUES ('delete', old.rowid, {_indexed('old')});
+        INSERT INTO core_webhooklog_fts(rowid, payload, header_values) VALUES (new.rowid, {_indexed('new')});
+    END""",
+    "INSERT INTO core_webhooklog_fts(rowid, payload, header_values) "
+    f"SELECT rowid, {_indexed('core_webhooklog')} FROM core_webhooklog",
+]
+
+DROP_SQL = [
+    "DROP TRIGGER IF EXISTS core_webhooklog_fts_ai",
+    "DROP TRIGGER IF EXISTS core_webhooklog_fts_ad",
+    "DROP TRIGGER IF EXISTS core_webhooklog_fts_au",
+    "DROP TABLE IF EXISTS core_webhooklog_fts",
+]
+
+
+def _run(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+            if not cursor.fetchone()[0]:
+                return
+            for sql in statements:
+                cursor.execute(sql)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_idempotencyrecord'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='webhooklog',
+            index=models.Index(core.models.JSONKeyText('body', 'status'), models.F('timestamp'), models.F('id'), name='webhooklog_status_ts_idx'),
+        ),
+        migrations.RunPython(_run(FTS_SQL), _run(DROP_SQL)),
+    ]
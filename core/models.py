@@ -1,9 +1,42 @@
-from django.db import models
+import json
+import re
 import uuid
 
+from django.db import models
+from django.db.models import F, Func
+from django.utils import timezone
+
+
+class JSONKeyText(Func):
+    """
+    ``CAST(JSON_EXTRACT(field, '$.key') AS TEXT)`` with the path inlined as a
+    literal. SQLite only matches expression indexes against identical SQL, and
+    Django's own KeyTextTransform binds the path as a parameter, which never matches.
+    Nested keys are written ``a.b.c``.
+    """
+    output_field = models.CharField()
+
+    def __init__(self, field, key, **extra):
+        if not re.fullmatch(r'[A-Za-z0-9_]+(\.[A-Za-z0-9_]+)*', key):
+            raise ValueError(f"Unsupported JSON key: {key!r}")
+        self.key = key
+        super().__init__(F(field), **extra)
+
+    def as_sql(self, compiler, connection, **extra_context):
+        template = f"CAST(JSON_EXTRACT(%(expressions)s, '$.{self.key}') AS TEXT)"
+        return super().as_sql(compiler, connection, template=template, **extra_context)
+
+
+def body_key(key):
+    """
+    Text value of ``body[key]``. Filters must use this exact expression to hit
+    the expression indexes declared on WebhookLog.
+    """
+    return JSONKeyText('body', key)
+
 class WebhookLog(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    timestamp = models.DateTimeField(default=timezone.now)
     sender_ip = models.CharField(max_length=50, blank=True, null=True)
     method = models.CharField(max_length=10)
     headers = models.JSONField(default=dict)
@@ -13,5 +46,129 @@ class WebhookLog(models.Model):
     def __str__(self):
         return f"{self.timestamp} - {self.method} - {self.id}"
 
+    @property
+    def raw_text(self):
+        """
+        Original request body. ``raw_body`` is left NULL when it was exactly
+        ``json.dumps(body)`` (see WEBHOOK_LOG_DROP_DUPLICATE_RAW_BODY), so rebuild it.
+        """
+        if self.raw_body is not None:
+            return self.raw_body
+        return json.dumps(self.body) if self.body is not None else ""
+
     class Meta:
         ordering = ['-timestamp']
+        # Every index ends in (timestamp, id) so filtered pages are a keyset
+        # range scan, see core/queries.py. JSON keys are expression indexes and
+        # only match queries built with body_key().
+        indexes = [
+            models.Index(fields=['timestamp', 'id'], name='webhooklog_ts_id_idx'),
+            models.Index(fields=['method', 'timestamp', 'id'], name='webhooklog_method_ts_idx'),
+            models.Index(fields=['sender_ip', 'timestamp', 'id'], name='webhooklog_sender_ts_idx'),
+            models.Index(body_key('event'), F('timestamp'), F('id'), name='webhooklog_event_ts_idx'),
+            models.Index(body_key('order_id'), F('timestamp'), F('id'), name='webhooklog_order_ts_idx'),
+            models.Index(body_key('external_id'), F('timestamp'), F('id'), name='webhooklog_extid_ts_idx'),
+            models.Index(body_key('status'), F('timestamp'), F('id'), name='webhooklog_status_ts_idx'),
+        ]
+
+
+class OutboundCallback(models.Model):
+    """
+    Durable outbox row for a mock PSP callback. Rows are claimed and retried
+    by the ``deliver_callbacks`` management command.
+    """
+    STATUS_PENDING = 'pending'
+    STATUS_IN_FLIGHT = 'in_flight'
+    STATUS_DELIVERED = 'delivered'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_IN_FLIGHT, 'In flight'),
+        (STATUS_DELIVERED, 'Delivered'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    target_url = models.CharField(max_length=500)
+    event = models.CharField(max_length=50, blank=True, default='')
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=12, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=8)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    claimed_by = models.CharField(max_length=64, blank=True, null=True)
+    locked_until = models.DateTimeField(blank=True, null=True)
+    last_status_code = models.IntegerField(blank=True, null=True)
+    last_error = models.TextField(blank=True, null=True)
+    last_latency_ms = models.FloatField(blank=True, null=True)
+    total_latency_ms = models.FloatField(default=0)
+    delivered_at = models.DateTimeField(blank=True, null=True)
+
+    def __str__(self):
+        return f"{self.event or 'callback'} -> {self.target_url} ({self.status}, {self.attempts} attempts)"
+
+    class Meta:
+        ordering = ['next_attempt_at']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='outbox_due_idx'),
+        ]
+
+
+class MockTransaction(models.Model):
+    """
+    Persistent tier of the mock PSP ledger (core/ledger.py), enabled with
+    MOCK_LEDGER_PERSIST. The unique constraints make token single-use and
+    external_id idempotency hold across gunicorn workers.
+    """
+    KIND_DEPOSIT = 'deposit'
+    KIND_WITHDRAWAL = 'withdrawal'
+
+    id = models.CharField(max_length=40, primary_key=True)
+    kind = models.CharField(max_length=12)
+    external_id = models.CharField(max_length=128, blank=True, null=True)
+    token_id = models.CharField(max_length=40, blank=True, null=True)
+    amount = models.CharField(max_length=32, blank=True, null=True)
+    user_id = models.CharField(max_length=128, blank=True, null=True)
+    status = models.CharField(max_length=16)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.id} ({self.kind}, {self.status})"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['kind', 'external_id'], condition=models.Q(external_id__isnull=False),
+                name='mocktx_kind_external_id_uniq',
+            ),
+            models.UniqueConstraint(
+                fields=['token_id'], condition=models.Q(token_id__isnull=False),
+                name='mocktx_token_id_uniq',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['created_at'], name='mocktx_created_idx'),
+        ]
+
+
+class IdempotencyRecord(models.Model):
+    """
+    Shared tier of the idempotency cache (core/idempotency.py), enabled with
+    IDEMPOTENCY_DB_TIER. A row with a NULL status_code marks a request that
+    is still being processed by some worker.
+    """
+    key = models.CharField(max_length=255, primary_key=True)
+    fingerprint = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(blank=True, null=True)
+    content_type = models.CharField(max_length=100, blank=True, default='')
+    body = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.key} ({self.status_code or 'in progress'})"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at'], name='idempotency_created_idx'),
+        ]
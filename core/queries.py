@@ -0,0 +1,140 @@
+"""
+Filtering and keyset pagination for WebhookLog.
+
+Pages are ordered by (timestamp, id) descending and continue from an opaque
+cursor instead of an OFFSET, so page N costs the same as page 1. Every filter
+below has a matching (filter, timestamp, id) index on WebhookLog.
+"""
+import base64
+import binascii
+import re
+import uuid
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from core.models import WebhookLog, body_key
+
+MAX_PAGE_SIZE = 200
+
+# Query parameter -> key inside WebhookLog.body (backed by expression indexes)
+BODY_FILTERS = {
+    'event': 'event',
+    'order_id': 'order_id',
+    'external_id': 'external_id',
+    'status': 'status',
+}
+
+
+RELATIVE_TIME = re.compile(r'^(\d+(?:\.\d+)?)([smhd])$')
+RELATIVE_UNITS = {'s': 'seconds', 'm': 'minutes', 'h': 'hours', 'd': 'days'}
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(log):
+    raw = f"{log.timestamp.isoformat()}|{log.id.hex}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        ts, log_id = raw.split('|', 1)
+        return datetime.fromisoformat(ts), uuid.UUID(log_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError) as e:
+        raise InvalidCursor(f"Invalid cursor: {cursor}") from e
+
+
+def parse_time(value):
+    """
+    ISO datetime or date (naive means UTC), or a relative age such as
+    ``15m``, ``2h``, ``7d`` meaning that long ago. Raises ValueError.
+    """
+    if isinstance(value, datetime):
+        return value
+    value = str(value).strip()
+    match = RELATIVE_TIME.match(value)
+    if match:
+        return timezone.now() - timedelta(**{RELATIVE_UNITS[match[2]]: float(match[1])})
+    parsed = parse_datetime(value)
+    if parsed is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f"Invalid time: {value}")
+        parsed = datetime(day.year, day.month, day.day)
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed, dt_timezone.utc)
+    return parsed
+
+
+def filter_webhook_logs(params, queryset=None):
+    """
+    Applies the method / sender_ip / event / order_id / external_id / status filters
+    and the since / until time range (see parse_time) from a QueryDict (or
+    plain dict). JSON keys are compared through body_key() so SQLite can use
+    the expression indexes.
+    """
+    qs = WebhookLog.objects.all() if queryset is None else queryset
+    if params.get('since'):
+        qs = qs.filter(timestamp__gte=parse_time(params['since']))
+    if params.get('until'):
+        qs = qs.filter(timestamp__lt=parse_time(params['until']))
+    if params.get('method'):
+        qs = qs.filter(method=params['method'].upper())
+    if params.get('sender_ip'):
+        qs = qs.filter(sender_ip=params['sender_ip'])
+    for param, key in BODY_FILTERS.items():
+        value = params.get(param)
+        if value:
+            alias = f"body_{key}"
+            qs = qs.alias(**{alias: body_key(key)}).filter(**{alias: value})
+    return qs
+
+
+def page_webhook_logs(params, limit=20, cursor=None, queryset=None):
+    """
+    Returns (logs, next_cursor) for one page, newest first. ``next_cursor`` is
+    None on the last page.
+    """
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+    qs = filter_webhook_logs(params, queryset)
+    if cursor:
+        ts, log_id = decode_cursor(cursor)
+        # timestamp <= ts is an index range seek; the exclude only resolves ties
+        qs = qs.filter(timestamp__lte=ts).exclude(timestamp=ts, id__gte=log_id)
+    logs = list(qs.order_by('-timestamp', '-id')[:limit + 1])
+    next_cursor = encode_cursor(logs[limit - 1]) if len(logs) > limit else None
+    return logs[:limit], next_cursor
+
+
+def serialize_log(log):
+    """
+    Dashboard representation of a WebhookLog row.
+    """
+    return {
+        "id": str(log.id),
+        "timestamp": log.timestamp.strftime("%H:%M:%S"),
+        "method": log.method,
+        "body": log.body,
+        "headers": log.headers
+    }
+
+
+def log_record(log):
+    """
+    Full-fidelity representation of a WebhookLog row (archives and exports);
+    raw_body is the original request text even where the row only stores body.
+    """
+    return {
+        "id": str(log.id),
+        "timestamp": log.timestamp.isoformat(),
+        "sender_ip": log.sender_ip,
+        "method": log.method,
+        "headers": log.headers,
+        "body": log.body,
+        "raw_body": log.raw_text,
+    }
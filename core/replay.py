@@ -0,0 +1,283 @@
+"""
+Replays captured WebhookLog traffic against a target URL.
+
+Stored logs are streamed oldest first with ``.iterator()`` (memory stays flat
+however many rows match) and handed to a fixed pool of sender threads through
+a small bounded queue. Send times follow one of three modes:
+
+* ``original``: the captured inter-arrival gaps, divided by ``speed``;
+* ``rps``: a fixed rate (open loop);
+* ``max``: as fast as ``concurrency`` senders allow (closed loop).
+
+Latency is measured from the scheduled send time, as in core/loadtest.py, so
+a target that falls behind shows up in the percentiles. With ``baseline_url``
+every request is also sent there and the two responses are compared (status
+and JSON body, minus ``ignore_keys``).
+"""
+import json
+import queue
+import threading
+import time
+from collections import Counter
+
+import requests
+from requests.adapters import HTTPAdapter
+from django.utils import timezone
+
+from core.loadtest import LatencyHistogram
+from core.queries import filter_webhook_logs
+
+MODES = ('original', 'rps', 'max')
+
+# Stored META keys that describe the original hop, not the webhook itself
+SKIP_HEADERS = {
+    'HTTP_HOST', 'HTTP_CONNECTION', 'HTTP_KEEP_ALIVE', 'HTTP_TRANSFER_ENCODING', 'HTTP_CONTENT_LENGTH',
+    'CONTENT_LENGTH', 'HTTP_ACCEPT_ENCODING', 'HTTP_X_FORWARDED_FOR', 'HTTP_X_FORWARDED_PROTO',
+    'HTTP_X_FORWARDED_HOST', 'HTTP_X_REAL_IP', 'HTTP_CF_CONNECTING_IP', 'HTTP_CF_RAY', 'HTTP_CF_VISITOR',
+    'HTTP_CF_IPCOUNTRY', 'HTTP_CDN_LOOP', 'HTTP_COOKIE', 'HTTP_X_CSRFTOKEN',
+}
+MAX_DIFF_SAMPLES = 20
+MAX_DIFF_PATHS = 10
+_DONE = object()
+
+
+def replay_headers(stored):
+    """
+    Rebuilds outgoing headers from the request.META subset the listener stored.
+    """
+    headers = {}
+    for key, value in (stored or {}).items():
+        if key in SKIP_HEADERS:
+            continue
+        if key.startswith('HTTP_'):
+            name = key[5:]
+        elif key == 'CONTENT_TYPE':
+            name = key
+        else:
+            continue
+        headers[name.replace('_', '-').title()] = value
+    return headers
+
+
+def replay_queryset(params, limit=None):
+    """
+    Logs matching the core.queries filters (including since / until), in
+    capture order, without materializing the queryset. ``until`` defaults to
+    now, so replaying into our own listener does not feed the replay.
+    """
+    params = dict(params.items())  # QueryDict -> last value per key
+    params['until'] = params.get('until') or timezone.now()
+    qs = (
+        filter_webhook_logs(params).order_by('timestamp', 'id')
+        .only('id', 'timestamp', 'method', 'headers', 'body', 'raw_body')
+    )
+    if limit:
+        qs = qs[:limit]
+    return qs.iterator(chunk_size=500)
+
+
+def _parse(text):
+    try:
+        return json.loads(text)
+    except ValueError:
+        return text
+
+
+def diff_json(a, b, ignore=(), path='', out=None):
+    """
+    Paths (``$.data.status``) where two decoded JSON values differ.
+    """
+    out = [] if out is None else out
+    if len(out) >= MAX_DIFF_PATHS:
+        return out
+    if isinstance(a, dict) and isinstance(b, dict):
+        for key in sorted(set(a) | set(b), key=str):
+            if key in ignore:
+                continue
+            if key not in a or key not in b:
+                out.append(f"{path or '$'}.{key}")
+            else:
+                diff_json(a[key], b[key], ignore, f"{path or '$'}.{key}", out)
+    elif isinstance(a, list) and isinstance(b, list) and len(a) == len(b):
+        for i, (x, y) in enumerate(zip(a, b)):
+            diff_json(x, y, ignore, f"{path or '$'}[{i}]", out)
+    elif a != b:
+        out.append(path or '$')
+    return out[:MAX_DIFF_PATHS]
+
+
+class _SenderStats:
+    def __init__(self):
+        self.histogram = LatencyHistogram()
+        self.baseline = LatencyHistogram()
+        self.outcomes = Counter()
+        self.diffs = Counter()      # identical / status_mismatch / body_mismatch / baseline_error
+        self.samples = []
+
+
+def _send(session, url, log, headers, timeout, verify):
+    """
+    Returns (outcome, status, text). ``status`` is None on transport errors.
+    """
+    try:
+        resp = session.request(log.method or 'POST', url, data=log.raw_text.encode('utf-8'), headers=headers,
+                               timeout=timeout, verify=verify)
+        return str(resp.status_code), resp.status_code, resp.text
+    except requests.RequestException as e:
+        return type(e).__name__, None, None
+
+
+def _session():
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=2, pool_maxsize=2, max_retries=0)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def run_replay(logs, target_url, mode='max', rps=None, speed=1.0, concurrency=10, baseline_url=None,
+               ignore_keys=(), timeout=10.0, verify=False, max_duration=None):
+    """
+    Sends every log from the ``logs`` iterator and returns a report dict shaped
+    like core.loadtest.run_load_test()'s. Stops scheduling after
+    ``max_duration`` seconds if given.
+    """
+    if mode not in MODES:
+        raise ValueError(f"mode must be one of {', '.join(MODES)}")
+    if mode == 'rps' and not rps:
+        raise ValueError("mode 'rps' needs rps > 0")
+    ignore = set(ignore_keys)
+    jobs = queue.Queue(maxsize=concurrency * 2)
+    stats = [_SenderStats() for _ in range(concurrency)]
+
+    def sender(ss):
+        session = _session()
+        try:
+            while True:
+                job = jobs.get()
+                if job is _DONE:
+                    return
+                scheduled, log = job
+                headers = replay_headers(log.headers)
+                headers['X-Replayed-From'] = str(log.id)
+                outcome, status, text = _send(session, target_url, log, headers, timeout, verify)
+                ss.histogram.record((time.perf_counter() - scheduled) * 1000)
+                ss.outcomes[outcome] += 1
+                if baseline_url:
+                    started = time.perf_counter()
+                    _, base_status, base_text = _send(session, baseline_url, log, headers, timeout, verify)
+                    ss.baseline.record((time.perf_counter() - started) * 1000)
+                    _compare(ss, log, status, text, base_status, base_text, ignore)
+        finally:
+            session.close()
+
+    threads = [threading.Thread(target=sender, args=(ss,), name=f"replay-{i}", daemon=True)
+               for i, ss in enumerate(stats)]
+    for t in threads:
+        t.start()
+
+    started = time.perf_counter()
+    first_ts = None
+    sent = 0
+    truncated = False
+    try:
+        for log in logs:
+            if mode == 'original':
+                first_ts = first_ts or log.timestamp
+                scheduled = started + (log.timestamp - first_ts).total_seconds() / speed
+            elif mode == 'rps':
+                scheduled = started + sent / rps
+            else:
+                scheduled = time.perf_counter()
+            if max_duration is not None and scheduled - started > max_duration:
+                truncated = True
+                break
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            jobs.put((scheduled, log))
+            sent += 1
+    finally:
+        for _ in threads:
+            jobs.put(_DONE)
+        for t in threads:
+            t.join()
+    elapsed = time.perf_counter() - started
+
+    histogram, baseline = LatencyHistogram(), LatencyHistogram()
+    outcomes, diffs, samples = Counter(), Counter(), []
+    for ss in stats:
+        histogram.merge(ss.histogram)
+        baseline.merge(ss.baseline)
+        outcomes.update(ss.outcomes)
+        diffs.update(ss.diffs)
+        samples.extend(ss.samples)
+
+    errors = sum(n for outcome, n in outcomes.items() if not outcome.isdigit() or int(outcome) >= 400)
+    report = {
+        "config": {
+            "target_url": target_url, "mode": mode, "rps": rps, "speed": speed if mode == 'original' else None,
+            "concurrency": concurrency, "baseline_url": baseline_url,
+        },
+        "requests": histogram.count,
+        "truncated": truncated,
+        "errors": errors,
+        "error_rate": round(errors / histogram.count, 4) if histogram.count else 0,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(histogram.count / elapsed, 2) if elapsed else None,
+        "latency": histogram.summary(),
+        "status_codes": dict(sorted(outcomes.items())),
+    }
+    if baseline_url:
+        report["baseline_latency"] = baseline.summary()
+        report["diffs"] = {
+            "identical": diffs["identical"],
+            "status_mismatch": diffs["status_mismatch"],
+            "body_mismatch": diffs["body_mismatch"],
+            "baseline_error": diffs["baseline_error"],
+            "samples": samples[:MAX_DIFF_SAMPLES],
+        }
+    return report
+
+
+def _compare(ss, log, status, text, base_status, base_text, ignore):
+    if base_status is None:
+        ss.diffs["baseline_error"] += 1
+        return
+    if status != base_status:
+        kind, paths = "status_mismatch", []
+    else:
+        paths = diff_json(_parse(text or ''), _parse(base_text or ''), ignore)
+        kind = "body_mismatch" if paths else "identical"
+    ss.diffs[kind] += 1
+    if kind != "identical" and len(ss.samples) < MAX_DIFF_SAMPLES:
+        ss.samples.append({"log_id": str(log.id), "kind": kind, "status": status,
+                           "baseline_status": base_status, "paths": paths})
+
+
+def format_report(report):
+    """
+    Human-readable summary for the replay_webhooks command.
+    """
+    lat = report["latency"]
+    cfg = report["config"]
+    lines = [
+        f"Replay to {cfg['target_url']}  mode={cfg['mode']}  concurrency={cfg['concurrency']}"
+        + (f"  rps={cfg['rps']}" if cfg['rps'] else "") + (f"  speed={cfg['speed']}x" if cfg['speed'] else ""),
+        f"Requests: {report['requests']}{' (truncated)' if report['truncated'] else ''}  "
+        f"errors: {report['errors']} ({report['error_rate'] * 100:.2f}%)  "
+        f"throughput: {report['throughput_rps']} req/s over {report['elapsed_s']}s",
+        f"Latency ms: p50={lat['p50_ms']}  p90={lat['p90_ms']}  p99={lat['p99_ms']}  "
+        f"p99.9={lat['p99_9_ms']}  max={lat['max_ms']}",
+        "Status codes: " + ", ".join(f"{k}={v}" for k, v in report["status_codes"].items()),
+    ]
+    if "diffs" in report:
+        d = report["diffs"]
+        base = report["baseline_latency"]
+        lines.append(f"Baseline {cfg['baseline_url']}: p50={base['p50_ms']}  p99={base['p99_ms']}")
+        lines.append(f"Diffs: identical={d['identical']}  status_mismatch={d['status_mismatch']}  "
+                     f"body_mismatch={d['body_mismatch']}  baseline_error={d['baseline_error']}")
+        for sample in d["samples"]:
+            lines.append(f"  {sample['log_id']} {sample['kind']} {sample['status']} vs "
+                         f"{sample['baseline_status']} {' '.join(sample['paths'])}")
+    return "\n".join(lines)
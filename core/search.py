@@ -0,0 +1,199 @@
+"""
+Full-text and JSON-path search over WebhookLog.
+
+On SQLite, migration 0007 adds ``core_webhooklog_fts``, a contentless FTS5
+index over the request body (decoded JSON keys and values, or the raw text)
+and the header values, kept in sync by insert / update / delete triggers and
+keyed by WebhookLog's rowid. A query such as
+
+    ORD-1042 body.status="APPROVED" body.customer.id=7
+
+becomes an FTS5 MATCH for the free text plus JSON predicates compared through
+body_key() (expression-indexed for event, order_id, external_id and status).
+String and number predicates are also added to the MATCH, so even unindexed
+keys are resolved through the FTS index first instead of a table scan.
+
+Other databases (or SQLite without FTS5) fall back to ``icontains`` on the
+body. VACUUM may renumber rowids: run ``manage.py rebuild_webhook_search``
+after one.
+"""
+import json
+import re
+import time
+
+from django.db import connection
+from django.db.models import Q
+
+from core.models import JSONKeyText, WebhookLog
+from core.queries import page_webhook_logs
+
+FTS_TABLE = 'core_webhooklog_fts'
+
+# field.path op value, value either "quoted" or a bare token
+PREDICATE = re.compile(
+    r'\b(body|headers)\.([A-Za-z0-9_]+(?:\.[A-Za-z0-9_]+)*)\s*(!=|=)\s*("(?:[^"\\]|\\.)*"|\S+)'
+)
+TERM = re.compile(r'"([^"]*)"(\*?)|(\S+)')
+
+# Values the triggers index for one row; must stay identical to migration 0007
+INDEXED_SQL = (
+    "CASE WHEN json_valid(COALESCE(raw_body, body)) THEN (SELECT group_concat(CASE WHEN typeof(key) = 'text' "
+    "THEN key || ' ' ELSE '' END || COALESCE(atom, ''), ' ') FROM json_tree(COALESCE(raw_body, body))) "
+    "ELSE COALESCE(raw_body, '') END, "
+    "CASE WHEN json_valid(headers) THEN (SELECT group_concat(value, ' ') FROM json_each(headers)) END"
+)
+
+_available = None
+
+
+def fts_available():
+    """
+    True when the FTS5 table exists (checked once per process).
+    """
+    global _available
+    if _available is None:
+        if connection.vendor != 'sqlite':
+            _available = False
+        else:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE])
+                _available = cursor.fetchone() is not None
+    return _available
+
+
+def _phrase(text):
+    return '"' + text.replace('"', '""') + '"'
+
+
+def _value(raw):
+    """
+    Predicate value: "quoted" is a string, a bare token is JSON if it parses.
+    """
+    if raw.startswith('"'):
+        return json.loads(raw)
+    try:
+        return json.loads(raw)
+    except ValueError:
+        return raw
+
+
+def parse_query(q):
+    """
+    Splits a search string into (fts_query, predicates, terms). ``fts_query``
+    is a safe FTS5 expression (every term quoted, ``term*`` prefix matches
+    kept); predicates are (field, path, op, value) tuples.
+    """
+    predicates = []
+
+    def take(match):
+        predicates.append((match[1], match[2], match[3], _value(match[4])))
+        return ' '
+    text = PREDICATE.sub(take, q or '')
+
+    terms, parts = [], []
+    for match in TERM.finditer(text):
+        if match[1] is not None:
+            term, prefix = match[1], match[2]
+        else:
+            term, prefix = match[3].rstrip('*'), '*' if match[3].endswith('*') else ''
+        if term.strip():
+            terms.append(term)
+            parts.append(_phrase(term) + prefix)
+    for field, path, op, value in predicates:
+        # Narrow through the FTS index first: the decoded JSON values are indexed,
+        # so an equal value always contains the phrase (for numbers, the integer part)
+        if field != 'body' or op != '=' or isinstance(value, bool):
+            continue
+        if isinstance(value, str) and any(ch.isalnum() for ch in value):
+            parts.append(f"payload : {_phrase(value)}")
+        elif isinstance(value, (int, float)) and abs(value) < 1e15:
+            parts.append(f"payload : {_phrase(str(abs(int(value))))}")
+    return ' AND '.join(parts), predicates, terms
+
+
+def _predicate_q(alias, value):
+    if value is None:
+        return Q(**{f"{alias}__isnull": True})
+    if isinstance(value, bool):
+        return Q(**{alias: '1' if value else '0'})
+    if isinstance(value, (int, float)):
+        # JSON 100 and 100.0 are the same number but not the same text
+        forms = {str(value), repr(float(value))}
+        if float(value).is_integer():
+            forms.add(str(int(value)))
+        return Q(**{f"{alias}__in": sorted(forms)})
+    if isinstance(value, (dict, list)):
+        return Q(**{alias: json.dumps(value, separators=(',', ':'))})
+    return Q(**{alias: str(value)})
+
+
+def search_queryset(q):
+    """
+    WebhookLog queryset for a search string, plus the backend used.
+    """
+    fts_query, predicates, terms = parse_query(q)
+    qs = WebhookLog.objects.all()
+    for i, (field, path, op, value) in enumerate(predicates):
+        alias = f"search_{i}"
+        qs = qs.alias(**{alias: JSONKeyText(field, path)})
+        condition = _predicate_q(alias, value)
+        qs = qs.filter(condition) if op == '=' else qs.exclude(condition)
+
+    if fts_available():
+        if fts_query:
+            table = WebhookLog._meta.db_table
+            qs = qs.extra(
+                where=[f"{table}.rowid IN (SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s)"],
+                params=[fts_query],
+            )
+        return qs, 'fts5'
+    for term in terms:
+        qs = qs.filter(Q(raw_body__icontains=term) | Q(raw_body__isnull=True, body__icontains=term))
+    return qs, 'like'
+
+
+def search_webhook_logs(params, q, limit=20, cursor=None):
+    """
+    One page of search results, newest first, with the usual filters and
+    keyset cursor of core.queries. Raises ValueError on an invalid query.
+    """
+    started = time.perf_counter()
+    qs, backend = search_queryset(q)
+    try:
+        logs, next_cursor = page_webhook_logs(params, limit=limit, cursor=cursor, queryset=qs)
+    except Exception as e:
+        if backend == 'fts5' and 'fts5' in str(e).lower():
+            raise ValueError(f"Invalid search query: {e}") from e
+        raise
+    took_ms = round((time.perf_counter() - started) * 1000, 2)
+    return logs, next_cursor, backend, took_ms
+
+
+def rebuild_index(batch_size=20000, progress=None):
+    """
+    Refills the FTS index from core_webhooklog in rowid batches. Returns rows indexed.
+    """
+    if not fts_available():
+        raise ValueError("FTS5 search index is not installed (SQLite with FTS5 and migration 0007 required)")
+    table = WebhookLog._meta.db_table
+    total = 0
+    with connection.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('delete-all')")
+        last = 0
+        while True:
+            cursor.execute(f"SELECT max(rowid) FROM (SELECT rowid FROM {table} WHERE rowid > %s "
+                           f"ORDER BY rowid LIMIT %s)", [last, batch_size])
+            upper = cursor.fetchone()[0]
+            if upper is None:
+                break
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE}(rowid, payload, header_values) "
+                f"SELECT rowid, {INDEXED_SQL} FROM {table} WHERE rowid > %s AND rowid <= %s",
+                [last, upper],
+            )
+            total += cursor.rowcount
+            last = upper
+            if progress:
+                progress(total)
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')")
+    return total
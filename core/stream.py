@@ -0,0 +1,240 @@
+"""
+In-process fan-out hub for the live webhook stream (Server-Sent Events).
+
+One poller thread per worker process reads newly stored WebhookLog rows and
+pushes each serialized event to every connected dashboard, so N open
+dashboards cost one DB read per new event instead of N polls per interval.
+
+Under gthread workers every open stream holds one worker thread for up to
+WEBHOOK_STREAM_MAX_DURATION seconds; gunicorn.conf.py adds
+WEBHOOK_STREAM_MAX_SUBSCRIBERS threads per worker for them, and the view
+refuses streams beyond that (503; the dashboard then polls). Under uvicorn
+workers ``aevent_stream`` waits on the event loop instead.
+"""
+import asyncio
+import os
+import queue
+import threading
+import time
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+from core.fastjson import dumps_str
+from core.log import get_logger
+from core.models import WebhookLog
+from core.queries import decode_cursor, encode_cursor, serialize_log
+
+logger = get_logger(__name__)
+
+
+class Subscription:
+    def __init__(self, maxsize):
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.lagging = False
+
+
+class WebhookHub:
+    """
+    Polls only while someone is subscribed. Rows can be committed out of
+    timestamp order (batched ingestion, several workers), so each poll
+    re-reads a short ``lookback`` window through the (timestamp, id) index and
+    skips ids it has already emitted instead of trusting a single high-water mark.
+    """
+
+    def __init__(self, poll_interval=0.5, lookback=5.0, queue_size=1000, batch_size=500):
+        self.poll_interval = poll_interval
+        self.lookback = timedelta(seconds=lookback)
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._high_ts = None
+        self._recent = {}  # id -> timestamp of events already emitted inside the lookback window
+
+    def subscribe(self):
+        sub = Subscription(self.queue_size)
+        with self._lock:
+            self._subscribers.add(sub)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="webhook-stream-hub", daemon=True)
+                self._thread.start()
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            self._subscribers.discard(sub)
+
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+    def notify(self):
+        """
+        Wakes the poller early, e.g. right after this process flushed new rows.
+        """
+        self._wakeup.set()
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if not self._subscribers:
+                    self._thread = None
+                    self._high_ts = None
+                    self._recent = {}
+                    return
+            try:
+                close_old_connections()
+                self._poll()
+            except Exception:
+                logger.exception("webhook_stream.poll_failed")
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+
+    def _poll(self):
+        first_poll = self._high_ts is None
+        if first_poll:
+            # Start from "now": only rows stored after the first subscriber arrived
+            self._high_ts = timezone.now()
+
+        since = self._high_ts - self.lookback
+        keys = list(
+            WebhookLog.objects.filter(timestamp__gt=since)
+            .order_by('timestamp', 'id')
+            .values_list('id', 'timestamp')
+        )
+        if first_poll:
+            self._recent = {log_id: ts for log_id, ts in keys if ts <= self._high_ts}
+            return
+        new_ids = [log_id for log_id, _ in keys if log_id not in self._recent][:self.batch_size]
+        if not new_ids:
+            return
+
+        logs = list(WebhookLog.objects.filter(id__in=new_ids).order_by('timestamp', 'id'))
+        events = []
+        for log in logs:
+            self._recent[log.id] = log.timestamp
+            if log.timestamp > self._high_ts:
+                self._high_ts = log.timestamp
+            events.append(format_event(log))
+
+        cutoff = self._high_ts - self.lookback
+        self._recent = {k: ts for k, ts in self._recent.items() if ts > cutoff}
+
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for sub in subscribers:
+            for event in events:
+                try:
+                    sub.queue.put_nowait(event)
+                except queue.Full:
+                    # Slow client: drop it; the browser reconnects with Last-Event-ID
+                    sub.lagging = True
+                    break
+
+
+def format_event(log):
+    """
+    Returns (event_id, SSE frame). The event id is the log's pagination cursor
+    so a reconnecting client can resume with Last-Event-ID.
+    """
+    event_id = encode_cursor(log)
+    return event_id, f"id: {event_id}\nevent: webhook\ndata: {dumps_str(serialize_log(log))}\n\n"
+
+
+def backlog_events(last_event_id, limit=200):
+    """
+    Rows stored after ``last_event_id`` (a cursor), oldest first, for resuming.
+    """
+    ts, log_id = decode_cursor(last_event_id)
+    qs = (
+        WebhookLog.objects.filter(timestamp__gte=ts)
+        .exclude(timestamp=ts, id__lte=log_id)
+        .order_by('timestamp', 'id')[:limit]
+    )
+    return [format_event(log) for log in qs]
+
+
+def event_stream(hub, last_event_id=None, keepalive=15.0, max_duration=300.0):
+    """
+    Generator behind the StreamingHttpResponse. Connections end after
+    ``max_duration`` so sync workers are recycled; EventSource reconnects
+    automatically and resumes from the last id it saw.
+    """
+    sub = hub.subscribe()
+    try:
+        yield "retry: 3000\n\n"
+        # Subscribed before reading the backlog, so live events that overlap it are skipped
+        replayed = set()
+        if last_event_id:
+            for event_id, frame in backlog_events(last_event_id):
+                replayed.add(event_id)
+                yield frame
+        deadline = time.monotonic() + max_duration
+        while time.monotonic() < deadline and not sub.lagging:
+            try:
+                event_id, frame = sub.queue.get(timeout=keepalive)
+            except queue.Empty:
+                yield ": keepalive\n\n"
+                continue
+            if event_id not in replayed:
+                yield frame
+    finally:
+        hub.unsubscribe(sub)
+
+
+async def aevent_stream(hub, last_event_id=None, keepalive=15.0, max_duration=300.0, poll=0.1):
+    """
+    event_stream() for ASGI workers. Django buffers a sync iterator completely
+    before sending it there, and waiting on the queue would hold a thread, so
+    this polls the subscription from the event loop instead.
+    """
+    sub = hub.subscribe()
+    try:
+        yield "retry: 3000\n\n"
+        replayed = set()
+        if last_event_id:
+            for event_id, frame in await sync_to_async(backlog_events)(last_event_id):
+                replayed.add(event_id)
+                yield frame
+        now = time.monotonic()
+        deadline, next_keepalive = now + max_duration, now + keepalive
+        while time.monotonic() < deadline and not sub.lagging:
+            try:
+                event_id, frame = sub.queue.get_nowait()
+            except queue.Empty:
+                if time.monotonic() >= next_keepalive:
+                    next_keepalive = time.monotonic() + keepalive
+                    yield ": keepalive\n\n"
+                await asyncio.sleep(poll)
+                continue
+            next_keepalive = time.monotonic() + keepalive
+            if event_id not in replayed:
+                yield frame
+    finally:
+        hub.unsubscribe(sub)
+
+
+_hub = None
+_hub_pid = None
+_hub_lock = threading.Lock()
+
+
+def get_hub():
+    global _hub, _hub_pid
+    pid = os.getpid()
+    if _hub is None or _hub_pid != pid:
+        with _hub_lock:
+            if _hub is None or _hub_pid != pid:
+                _hub = WebhookHub(
+                    poll_interval=settings.WEBHOOK_STREAM_POLL_INTERVAL,
+                    lookback=settings.WEBHOOK_STREAM_LOOKBACK,
+                )
+                _hub_pid = pid
+    return _hub
@@ -1,3 +1,442 @@
-from django.test import TestCase
+import json
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+from unittest import mock
 
-# Create your tests here.
+from django.db import IntegrityError, OperationalError
+from django.db.models import Q
+from django.test import RequestFactory, SimpleTestCase, TestCase
+from django.utils import timezone
+
+from core.fastjson import FastJsonResponse
+from core.faults import ProfileStore, validate_profile
+from core.idempotency import CLAIM_ATTEMPTS, MAX_KEY_LENGTH, IdempotencyCache, idempotent
+from core.ingest import LogBuffer
+from core.ledger import Ledger, LedgerError
+from core.models import IdempotencyRecord, MockTransaction, WebhookLog
+from core.queries import InvalidCursor, decode_cursor, encode_cursor, page_webhook_logs, parse_time
+from core.search import _predicate_q, parse_query, search_webhook_logs
+
+
+class CursorTests(TestCase):
+    def test_round_trip(self):
+        log = WebhookLog.objects.create(method='POST', body={})
+        ts, log_id = decode_cursor(encode_cursor(log))
+        self.assertEqual((ts, log_id), (log.timestamp, log.id))
+
+    def test_invalid_cursor(self):
+        for cursor in ('', 'not base64!', 'bm8tc2VwYXJhdG9y', 'MjAyNi0wMS0wMXxub3QtYS11dWlk'):
+            with self.subTest(cursor=cursor), self.assertRaises(InvalidCursor):
+                decode_cursor(cursor)
+
+    def test_pages_split_timestamp_ties(self):
+        ts = timezone.now()
+        logs = WebhookLog.objects.bulk_create(
+            [WebhookLog(method='POST', body={"i": i}, timestamp=ts) for i in range(5)]
+            + [WebhookLog(method='POST', body={"i": 5}, timestamp=ts - timedelta(seconds=1))]
+        )
+        seen, cursor = [], None
+        while True:
+            page, cursor = page_webhook_logs({}, limit=2, cursor=cursor)
+            seen.extend(log.id for log in page)
+            if cursor is None:
+                break
+        expected = [log.id for log in sorted(logs, key=lambda log: (log.timestamp, log.id), reverse=True)]
+        self.assertEqual(seen, expected)
+
+
+class ParseTimeTests(SimpleTestCase):
+    def test_relative(self):
+        before = timezone.now()
+        parsed = parse_time('15m')
+        self.assertAlmostEqual((before - parsed).total_seconds(), 900, delta=5)
+        self.assertAlmostEqual((timezone.now() - parse_time('1.5h')).total_seconds(), 5400, delta=5)
+
+    def test_naive_values_are_utc(self):
+        self.assertEqual(parse_time('2026-01-02'), datetime(2026, 1, 2, tzinfo=dt_timezone.utc))
+        self.assertEqual(parse_time(' 2026-01-02T03:04:05 '), datetime(2026, 1, 2, 3, 4, 5, tzinfo=dt_timezone.utc))
+
+    def test_offset_is_kept(self):
+        parsed = parse_time('2026-01-02T03:04:05+03:00')
+        self.assertEqual(parsed, datetime(2026, 1, 2, 0, 4, 5, tzinfo=dt_timezone.utc))
+
+    def test_invalid(self):
+        for value in ('yesterday', '15x', '2026-13-01', ''):
+            with self.subTest(value=value), self.assertRaises(ValueError):
+                parse_time(value)
+
+
+class SearchQueryTests(TestCase):
+    def test_parse_query(self):
+        fts, predicates, terms = parse_query('ORD-1042 body.status="APPROVED" body.amount=100 pay*')
+        self.assertEqual(predicates, [('body', 'status', '=', 'APPROVED'), ('body', 'amount', '=', 100)])
+        self.assertEqual(terms, ['ORD-1042', 'pay'])
+        self.assertEqual(fts, '"ORD-1042" AND "pay"* AND payload : "APPROVED" AND payload : "100"')
+
+    def test_quotes_are_escaped(self):
+        fts, _, terms = parse_query('"a b" c"d')
+        self.assertEqual(terms, ['a b', 'c"d'])
+        self.assertEqual(fts, '"a b" AND "c""d"')
+
+    def test_predicates_without_fts_narrowing(self):
+        fts, predicates, _ = parse_query('body.ok=true body.code!=5 headers.HTTP_X=1 body.note="--"')
+        self.assertEqual([p[3] for p in predicates], [True, 5, 1, '--'])
+        self.assertEqual(fts, '')
+
+    def test_predicate_q_forms(self):
+        self.assertEqual(_predicate_q('a', 100), Q(a__in=['100', '100.0']))
+        self.assertEqual(_predicate_q('a', 1.5), Q(a__in=['1.5']))
+        self.assertEqual(_predicate_q('a', True), Q(a='1'))
+        self.assertEqual(_predicate_q('a', None), Q(a__isnull=True))
+        self.assertEqual(_predicate_q('a', {"k": [1, 2]}), Q(a='{"k":[1,2]}'))
+        self.assertEqual(_predicate_q('a', 'x'), Q(a='x'))
+
+    def test_number_matches_int_and_float_json(self):
+        WebhookLog.objects.create(method='POST', body={"amount": 100}, raw_body='{"amount": 100}')
+        WebhookLog.objects.create(method='POST', body={"amount": 100.0}, raw_body='{"amount": 100.0}')
+        WebhookLog.objects.create(method='POST', body={"amount": 1000}, raw_body='{"amount": 1000}')
+        logs, _, _, _ = search_webhook_logs({}, 'body.amount=100')
+        self.assertEqual(sorted(log.raw_body for log in logs), ['{"amount": 100.0}', '{"amount": 100}'])
+
+    def test_bool_predicate(self):
+        WebhookLog.objects.create(method='POST', body={"ok": True})
+        WebhookLog.objects.create(method='POST', body={"ok": False})
+        logs, _, _, _ = search_webhook_logs({}, 'body.ok=true')
+        self.assertEqual([log.body for log in logs], [{"ok": True}])
+
+
+class FaultProfileTests(SimpleTestCase):
+    VALID = {
+        "latency": {"type": "lognormal", "median_ms": 150, "sigma": 1.0, "max_ms": 20000},
+        "faults": {"error": 0.05, "timeout": 0.01, "reset": 0.01, "drip": 0.02},
+        "error_status": 503,
+        "timeout_s": 35,
+        "drip": {"chunk_bytes": 8, "interval_ms": 250},
+        "endpoints": {"create_transaction": {"faults": {"error": 0.2}}},
+    }
+
+    def test_valid_profile(self):
+        validate_profile(self.VALID)
+        validate_profile({})
+
+    def test_invalid_profiles(self):
+        cases = {
+            "latency type": {"latency": {"type": "gamma"}},
+            "latency.ms": {"latency": {"type": "fixed", "ms": -1}},
+            "latency.alpha": {"latency": {"type": "pareto", "scale_ms": 1, "alpha": 0}},
+            "faults keys": {"faults": {"explode": 0.1}},
+            "faults.error": {"faults": {"error": True}},
+            "more than 1": {"faults": {"error": 0.7, "drip": 0.5}},
+            "error_status": {"error_status": 200.5},
+            "timeout_s": {"timeout_s": "30"},
+            "drip.chunk_bytes": {"drip": {"chunk_bytes": 0}},
+            "endpoints must": {"endpoints": {"create_transaction": 1}},
+        }
+        for message, profile in cases.items():
+            with self.subTest(message), self.assertRaisesRegex(ValueError, message):
+                validate_profile(profile)
+
+    def test_endpoint_override_is_checked_merged(self):
+        profile = {"faults": {"error": 0.6}, "endpoints": {"withdraw_request": {"faults": {"error": 0.6, "reset": 0.6}}}}
+        with self.assertRaisesRegex(ValueError, r"^endpoints\.withdraw_request: "):
+            validate_profile(profile)
+
+    @mock.patch('core.faults.logger')
+    def test_store_keeps_last_good_profile(self, logger):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'profiles.json')
+            store = ProfileStore(path, check_interval=0)
+
+            def write(profiles, mtime):
+                with open(path, 'w') as f:
+                    json.dump(profiles, f)
+                os.utime(path, (mtime, mtime))
+
+            write({"slow": {"latency": {"type": "fixed", "ms": 10}}, "ok": {}}, 1000)
+            self.assertEqual(store.resolve('slow', 'x'), {"latency": {"type": "fixed", "ms": 10}})
+
+            write({"slow": {"latency": {"type": "fixed", "ms": -5}}, "ok": {}, "new": {"faults": {"x": 1}}}, 2000)
+            self.assertEqual(store.resolve('slow', 'x'), {"latency": {"type": "fixed", "ms": 10}})
+            self.assertIsNone(store.resolve('new', 'x'))
+            rejected = [c.kwargs['profile'] for c in logger.error.call_args_list]
+            self.assertEqual(rejected, ['slow', 'new'])
+
+            with open(path, 'w') as f:
+                f.write('{broken')
+            os.utime(path, (3000, 3000))
+            self.assertEqual(set(store.profiles()), {'slow', 'ok'})
+
+
+@mock.patch('core.ingest.logger', mock.Mock())
+@mock.patch.object(LogBuffer, 'start')  # flush from the test thread, no flusher thread
+class LogBufferTests(TestCase):
+    def add(self, buffer, count):
+        return [buffer.add(method='POST', body={"i": i}) for i in range(count)]
+
+    def test_flush_writes_in_batches(self, _start):
+        buffer = LogBuffer(batch_size=2, max_pending=10)
+        logs = self.add(buffer, 5)
+        self.assertEqual(WebhookLog.objects.count(), 0)
+        self.assertEqual(buffer.flush(), 5)
+        self.assertEqual(set(WebhookLog.objects.values_list('id', flat=True)), {log.id for log in logs})
+        stats = buffer.stats()
+        self.assertEqual((stats["flushes"], stats["pending"], stats["failed"]), (3, 0, 0))
+
+    def test_full_buffer_writes_directly(self, _start):
+        buffer = LogBuffer(batch_size=10, max_pending=2)
+        self.add(buffer, 3)
+        self.assertEqual(WebhookLog.objects.count(), 1)
+        self.assertEqual(buffer.stats()["direct_writes"], 1)
+
+    def test_unavailable_database_requeues_batch(self, _start):
+        buffer = LogBuffer(batch_size=2, max_pending=10)
+        self.add(buffer, 3)
+        with mock.patch.object(WebhookLog.objects, 'bulk_create', side_effect=OperationalError('disk I/O error')):
+            self.assertEqual(buffer.flush(), 0)
+        self.assertEqual([log.body["i"] for log in buffer._pending], [0, 1, 2])
+        self.assertGreater(buffer._retry_at, 0)
+        self.assertEqual(buffer.flush(), 3)
+        self.assertEqual(buffer.stats()["failed"], 0)
+
+    def test_locked_database_is_retried_before_requeueing(self, _start):
+        buffer = LogBuffer(batch_size=5)
+        self.add(buffer, 2)
+        real = WebhookLog.objects.bulk_create
+        with mock.patch('core.ingest.time.sleep'), mock.patch.object(
+            WebhookLog.objects, 'bulk_create', side_effect=[OperationalError('database is locked'), real]
+        ):
+            self.assertEqual(buffer.flush(), 2)
+
+    def test_requeue_is_bounded_by_max_pending(self, _start):
+        buffer = LogBuffer(batch_size=3, max_pending=4)
+        self.add(buffer, 3)
+
+        def fail_while_more_arrive(batch):
+            self.add(buffer, 3)
+            raise OperationalError('disk I/O error')
+
+        with mock.patch.object(buffer, '_write', side_effect=fail_while_more_arrive):
+            buffer.flush()
+        self.assertEqual(len(buffer._pending), 4)
+        self.assertEqual(buffer.stats()["failed"], 2)
+
+    def test_rejected_row_only_drops_itself(self, _start):
+        buffer = LogBuffer(batch_size=5)
+        logs = self.add(buffer, 3)
+        save = WebhookLog.save
+
+        def reject_second(log, *args, **kwargs):
+            if log.body["i"] == 1:
+                raise IntegrityError('rejected')
+            return save(log, *args, **kwargs)
+
+        with mock.patch.object(WebhookLog.objects, 'bulk_create', side_effect=IntegrityError('rejected')), \
+                mock.patch.object(WebhookLog, 'save', reject_second):
+            self.assertEqual(buffer.flush(), 2)
+        self.assertEqual(set(WebhookLog.objects.values_list('id', flat=True)), {logs[0].id, logs[2].id})
+        self.assertEqual(buffer.stats()["failed"], 1)
+
+    def test_shutdown_counts_rows_it_cannot_write(self, _start):
+        buffer = LogBuffer(batch_size=5)
+        self.add(buffer, 2)
+        with mock.patch.object(WebhookLog.objects, 'bulk_create', side_effect=OperationalError('disk I/O error')):
+            buffer.shutdown()
+        stats = buffer.stats()
+        self.assertEqual((stats["pending"], stats["failed"]), (0, 2))
+
+
+class IdempotencyTests(TestCase):
+    """
+    Decorator and DB tier of core.idempotency; every test uses two caches
+    sharing the database, like two gunicorn workers.
+    """
+
+    def setUp(self):
+        self.worker_a = IdempotencyCache(db_tier=True, lock_timeout=30)
+        self.worker_b = IdempotencyCache(db_tier=True, lock_timeout=30)
+        self.calls = []
+        self.status = 200
+
+    def view(self, request):
+        self.calls.append(request.body)
+        return FastJsonResponse({"call": len(self.calls)}, status=self.status)
+
+    async def aview(self, request):
+        return self.view(request)
+
+    def post(self, cache, body, key=None, view=None):
+        headers = {'HTTP_IDEMPOTENCY_KEY': key} if key else {}
+        request = RequestFactory().post('/api/create-transaction/', data=json.dumps(body),
+                                        content_type='application/json', **headers)
+        with mock.patch('core.idempotency.get_cache', return_value=cache):
+            return idempotent('create_transaction')(view or self.view)(request)
+
+    def test_retry_on_another_worker_is_replayed(self):
+        first = self.post(self.worker_a, {"amount": 5}, key='k1')
+        retry = self.post(self.worker_b, {"amount": 5}, key='k1')
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual(retry.content, first.content)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+
+    def test_in_flight_key_is_busy(self):
+        IdempotencyRecord.objects.create(key='create_transaction:k1', fingerprint='f')
+        response = self.post(self.worker_a, {"amount": 5}, key='k1')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertEqual(self.calls, [])
+        self.assertEqual(self.worker_a.stats()["in_flight"], 0)
+
+    def test_reused_key_with_other_body_is_422(self):
+        self.post(self.worker_a, {"amount": 5}, key='k1')
+        for cache in (self.worker_a, self.worker_b):
+            with self.subTest(memory=cache is self.worker_a):
+                response = self.post(cache, {"amount": 6}, key='k1')
+                self.assertEqual(response.status_code, 422)
+        self.assertEqual(len(self.calls), 1)
+
+    def test_external_id_replays_despite_other_body(self):
+        self.post(self.worker_a, {"amount": 5, "external_id": "E1"})
+        response = self.post(self.worker_b, {"amount": 6, "external_id": "E1"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Idempotent-Replayed'], 'true')
+
+    def test_5xx_is_not_stored(self):
+        self.status = 503
+        self.post(self.worker_a, {"amount": 5}, key='k1')
+        self.assertFalse(IdempotencyRecord.objects.exists())
+        self.status = 200
+        self.assertEqual(self.post(self.worker_b, {"amount": 5}, key='k1').status_code, 200)
+        self.assertEqual(len(self.calls), 2)
+
+    def test_4xx_is_stored_only_for_an_explicit_key(self):
+        self.status = 400
+        self.post(self.worker_a, {"external_id": "E1"})
+        self.post(self.worker_b, {"external_id": "E1"})
+        self.assertEqual(len(self.calls), 2)
+
+        self.post(self.worker_a, {"amount": 5}, key='k1')
+        replay = self.post(self.worker_b, {"amount": 5}, key='k1')
+        self.assertEqual((replay.status_code, len(self.calls)), (400, 3))
+        self.assertEqual(replay['Idempotent-Replayed'], 'true')
+
+    def test_view_exception_releases_the_key(self):
+        def broken(request):
+            raise RuntimeError('boom')
+        with self.assertRaises(RuntimeError):
+            self.post(self.worker_a, {"amount": 5}, key='k1', view=broken)
+        self.assertFalse(IdempotencyRecord.objects.exists())
+        self.assertEqual(self.post(self.worker_a, {"amount": 5}, key='k1').status_code, 200)
+
+    def test_stale_claim_is_taken_over(self):
+        IdempotencyRecord.objects.create(key='create_transaction:k1', fingerprint='f',
+                                         created_at=timezone.now() - timedelta(seconds=31))
+        self.assertEqual(self.post(self.worker_a, {"amount": 5}, key='k1').status_code, 200)
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual(IdempotencyRecord.objects.get().status_code, 200)
+
+    def test_expired_result_is_taken_over(self):
+        cache = IdempotencyCache(db_tier=True, ttl=60)
+        IdempotencyRecord.objects.create(key='create_transaction:k1', fingerprint='f', status_code=200,
+                                         content_type='application/json', body='{"old": true}',
+                                         created_at=timezone.now() - timedelta(seconds=61))
+        self.assertEqual(json.loads(self.post(cache, {"amount": 5}, key='k1').content), {"call": 1})
+
+    def test_claim_gives_up_when_the_row_keeps_vanishing(self):
+        with mock.patch.object(IdempotencyRecord.objects, 'create', side_effect=IntegrityError), \
+                mock.patch.object(IdempotencyRecord.objects, 'filter') as filter_:
+            filter_.return_value.first.return_value = None
+            self.assertEqual(self.worker_a.begin('k', 'f'), 'busy')
+        self.assertEqual(filter_.call_count, CLAIM_ATTEMPTS)
+
+    def test_long_keys_are_hashed_not_truncated(self):
+        prefix = 'x' * MAX_KEY_LENGTH
+        self.post(self.worker_a, {"amount": 5}, key=prefix + 'a')
+        self.post(self.worker_a, {"amount": 5}, key=prefix + 'b')
+        self.assertEqual(len(self.calls), 2)
+        self.assertTrue(all(len(key) <= MAX_KEY_LENGTH
+                            for key in IdempotencyRecord.objects.values_list('key', flat=True)))
+
+    async def test_async_wrapper(self):
+        first = await self.post(self.worker_a, {"amount": 5}, key='k1', view=self.aview)
+        retry = await self.post(self.worker_b, {"amount": 5}, key='k1', view=self.aview)
+        other = await self.post(self.worker_b, {"amount": 6}, key='k1', view=self.aview)
+        self.assertEqual((first.status_code, retry.status_code, other.status_code), (200, 200, 422))
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(len(self.calls), 1)
+
+
+class LedgerTests(TestCase):
+    DEPOSIT = MockTransaction.KIND_DEPOSIT
+
+    def test_token_round_trip(self):
+        ledger = Ledger()
+        token = ledger.issue_token()
+        self.assertEqual(ledger.verify_token(token), token.rsplit('-', 1)[0])
+        self.assertEqual(Ledger().verify_token(token), token.rsplit('-', 1)[0])  # any worker
+
+    def test_forged_tokens(self):
+        ledger = Ledger()
+        token_id, _, signature = ledger.issue_token().rpartition('-')
+        other_id = token_id.replace(token_id[0], 'F' if token_id[0] != 'F' else 'E', 1)
+        for forged in (f"{other_id}-{signature}", f"{token_id}-{'0' * len(signature)}", signature, '', '-'):
+            with self.subTest(token=forged), self.assertRaises(LedgerError) as cm:
+                ledger.verify_token(forged)
+            self.assertEqual(cm.exception.error_code, 'INVALID_TOKEN')
+
+    def test_expired_token(self):
+        ledger = Ledger(token_ttl=900)
+        token = ledger.issue_token()
+        with mock.patch('core.ledger.time.time', return_value=time.time() + 901), \
+                self.assertRaises(LedgerError) as cm:
+            ledger.verify_token(token)
+        self.assertEqual(cm.exception.error_code, 'TOKEN_EXPIRED')
+        with self.assertRaises(LedgerError):
+            with mock.patch('core.ledger.time.time', return_value=time.time() + 901):
+                ledger.create(self.DEPOSIT, external_id='E1', token=token)
+
+    def test_repeated_external_id_replays(self):
+        ledger = Ledger()
+        entry, created = ledger.create(self.DEPOSIT, external_id='E1', amount=10)
+        again, created_again = ledger.create(self.DEPOSIT, external_id='E1', amount=99)
+        self.assertEqual((created, created_again), (True, False))
+        self.assertIs(again, entry)
+        other, created_other = ledger.create(MockTransaction.KIND_WITHDRAWAL, external_id='E1')
+        self.assertTrue(created_other)
+        self.assertNotEqual(other.id, entry.id)
+
+    def test_token_backs_one_transaction(self):
+        ledger = Ledger()
+        token = ledger.issue_token()
+        entry, _ = ledger.create(self.DEPOSIT, external_id='E1', token=token)
+        self.assertEqual(ledger.create(self.DEPOSIT, external_id='E1', token=token), (entry, False))
+        for external_id in ('E2', None):
+            with self.subTest(external_id=external_id), self.assertRaises(LedgerError) as cm:
+                ledger.create(self.DEPOSIT, external_id=external_id, token=token)
+            self.assertEqual((cm.exception.error_code, cm.exception.status), ('TOKEN_ALREADY_USED', 409))
+        self.assertEqual(ledger.stats()["rejected"], 2)
+
+    def test_persisted_race_defers_to_the_first_worker(self):
+        worker_a, worker_b = Ledger(persist=True), Ledger(persist=True)
+        token = worker_a.issue_token()
+        entry, _ = worker_a.create(self.DEPOSIT, external_id='E1', token=token, amount=10)
+
+        # worker_b has never seen E1: its insert hits the unique constraint
+        replay, created = worker_b.create(self.DEPOSIT, external_id='E1', amount=10)
+        self.assertEqual((replay.id, created), (entry.id, False))
+        self.assertEqual(MockTransaction.objects.count(), 1)
+
+        with self.assertRaises(LedgerError) as cm:
+            worker_b.create(self.DEPOSIT, external_id='E2', token=token)
+        self.assertEqual(cm.exception.status, 409)
+        self.assertEqual(worker_b.lookup(transaction_id=entry.id).id, entry.id)
+        self.assertEqual(worker_b.lookup(external_id='E1', kind=self.DEPOSIT).id, entry.id)
+        self.assertEqual(worker_b.stats()["entries"], 1)  # the failed insert was unindexed
+
+    def test_persisted_conflict_without_a_matching_row_is_raised(self):
+        ledger = Ledger(persist=True)
+        with mock.patch.object(MockTransaction.objects, 'create', side_effect=IntegrityError('other')), \
+                self.assertRaises(IntegrityError):
+            ledger.create(self.DEPOSIT, external_id='E1')
+        self.assertEqual(ledger.stats()["entries"], 0)
@@ -0,0 +1,192 @@
+"""
+Per-phase request timing (DNS, TCP connect, TLS, time to first byte, transfer)
+for the diagnostic probes.
+
+``TimingAdapter`` mounts urllib3 connection classes that report their phases
+to a thread-local recorder opened with ``record_phases()``. Every hop of a
+redirect chain gets its own entry, and a hop that reused a pooled keep-alive
+connection shows no DNS/connect/TLS phases at all.
+"""
+import socket
+import threading
+import time
+from contextlib import contextmanager
+
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+_local = threading.local()
+
+
+class PhaseRecorder:
+    def __init__(self):
+        self.hops = []
+
+    def begin(self, url):
+        if self.hops:
+            # requests drains a redirect's body before following it
+            self.hops[-1].setdefault("body_done", time.perf_counter())
+        hop = {
+            "url": url,
+            "start": time.perf_counter(),
+            "new_connection": False,
+        }
+        self.hops.append(hop)
+        return hop
+
+    @property
+    def current(self):
+        return self.hops[-1] if self.hops else None
+
+    def finish_body(self):
+        """
+        Marks the end of the body transfer of the current hop (stream=True).
+        """
+        if self.current is not None:
+            self.current["body_done"] = time.perf_counter()
+
+    def summary(self):
+        """
+        Phase durations (ms) of the final hop, plus one entry per redirect hop
+        when there was more than one.
+        """
+        if not self.hops:
+            return {}
+        hops = [_hop_phases(hop) for hop in self.hops]
+        data = dict(hops[-1])
+        data.pop("url", None)
+        end = self.hops[-1].get("body_done") or self.hops[-1].get("headers_at")
+        if end is not None:
+            data["total_ms"] = _ms(end - self.hops[0]["start"])
+        if len(hops) > 1:
+            data["redirect_chain"] = hops
+        return data
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 3)
+
+
+def _hop_phases(hop):
+    phases = {
+        "url": hop["url"],
+        "connection_reused": not hop["new_connection"],
+    }
+    if "status_code" in hop:
+        phases["status_code"] = hop["status_code"]
+    if hop["new_connection"]:
+        phases["remote_ip"] = hop.get("remote_ip")
+        phases["dns_ms"] = _ms(hop["dns_end"] - hop["dns_start"]) if "dns_end" in hop else None
+        phases["connect_ms"] = _ms(hop["tcp_end"] - hop["tcp_start"]) if "tcp_end" in hop else None
+        phases["tls_ms"] = _ms(hop["tls_end"] - hop["tcp_end"]) if "tls_end" in hop and "tcp_end" in hop else None
+    if "sent_at" in hop and "headers_at" in hop:
+        phases["ttfb_ms"] = _ms(hop["headers_at"] - hop["sent_at"])
+    if "headers_at" in hop and "body_done" in hop:
+        phases["transfer_ms"] = _ms(hop["body_done"] - hop["headers_at"])
+    end = hop.get("body_done") or hop.get("headers_at")
+    if end is not None:
+        phases["hop_total_ms"] = _ms(end - hop["start"])
+    return phases
+
+
+def _hop():
+    recorder = getattr(_local, "recorder", None)
+    return recorder.current if recorder is not None else None
+
+
+@contextmanager
+def record_phases():
+    """
+    Collects phase timings for requests made by this thread inside the block.
+    """
+    previous = getattr(_local, "recorder", None)
+    recorder = _local.recorder = PhaseRecorder()
+    try:
+        yield recorder
+    finally:
+        _local.recorder = previous
+
+
+class _TimedConnectionMixin:
+    def _new_conn(self):
+        hop = _hop()
+        if hop is None or self.proxy:
+            return super()._new_conn()
+        hop["new_connection"] = True
+        hop["dns_start"] = time.perf_counter()
+        try:
+            infos = socket.getaddrinfo(self._dns_host, self.port, type=socket.SOCK_STREAM)
+        except OSError:
+            # Let urllib3 resolve again and raise its usual NameResolutionError
+            return super()._new_conn()
+        hop["dns_end"] = hop["tcp_start"] = time.perf_counter()
+        hop["remote_ip"] = infos[0][4][0]
+        # Connect to the address we just resolved so DNS is not timed twice.
+        # SNI and certificate checks still use self.host.
+        dns_host, self._dns_host = self._dns_host, hop["remote_ip"]
+        try:
+            sock = super()._new_conn()
+        finally:
+            self._dns_host = dns_host
+        hop["tcp_end"] = time.perf_counter()
+        return sock
+
+    def request(self, *args, **kwargs):
+        result = super().request(*args, **kwargs)
+        hop = _hop()
+        if hop is not None:
+            hop["sent_at"] = time.perf_counter()
+        return result
+
+    def getresponse(self, *args, **kwargs):
+        response = super().getresponse(*args, **kwargs)
+        hop = _hop()
+        if hop is not None:
+            hop["headers_at"] = time.perf_counter()
+        return response
+
+
+class TimedHTTPConnection(_TimedConnectionMixin, HTTPConnection):
+    pass
+
+
+class TimedHTTPSConnection(_TimedConnectionMixin, HTTPSConnection):
+    def connect(self):
+        super().connect()
+        hop = _hop()
+        if hop is not None and "tcp_end" in hop:
+            hop["tls_end"] = time.perf_counter()
+
+
+class TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+
+class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+
+class TimingAdapter(HTTPAdapter):
+    """
+    HTTPAdapter whose pools use the timed connection classes and which opens
+    a new hop in the active recorder for every request it sends.
+    """
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": TimedHTTPConnectionPool,
+            "https": TimedHTTPSConnectionPool,
+        }
+
+    def send(self, request, *args, **kwargs):
+        recorder = getattr(_local, "recorder", None)
+        hop = recorder.begin(request.url) if recorder is not None else None
+        response = super().send(request, *args, **kwargs)
+        if hop is not None:
+            hop["status_code"] = response.status_code
+            if not kwargs.get("stream", False):
+                # Body already read by the adapter
+                hop.setdefault("body_done", time.perf_counter())
+        return response
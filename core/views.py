@@ -1,11 +1,21 @@
-import requests
 import json
-import random
+import time
 from django.conf import settings
 from django.shortcuts import render
-from django.http import JsonResponse
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.crypto import constant_time_compare
 from django.views.decorators.csrf import csrf_exempt
 
+from core import metrics
+from core.fastjson import FastJsonResponse, dumps, loads, parse_body
+from core.faults import inject_faults
+from core.idempotency import get_cache, idempotent
+from core.ledger import LedgerError, get_ledger
+from core.log import get_logger, stats as log_stats
+from core.models import MockTransaction
+
+logger = get_logger(__name__)
+
 @csrf_exempt
 def debug_connection(request):
     """
@@ -22,216 +32,266 @@ def debug_connection(request):
         "headers": {k: v for k, v in request.META.items() if k.startswith('HTTP_')},
         "body_received": len(request.body) if request.body else 0
     }
-    return JsonResponse(data)
+    return FastJsonResponse(data)
+
+# --- MOCK PSP SCENARIOS (shared by the sync views and core/async_views.py) ---
+
+def _account_result(body):
+    """
+    Builds the get-eligible-account response for a parsed request body.
+    """
+    amount = body.get('amount') # Should be string or number
+    return {
+        "status": "success",
+        "process_token": get_ledger().issue_token(),
+        "banka_bilgileri": {
+            "banka_adi": "ZİRAAT",
+            "alici_adi": "AHMET MEHMET",
+            "iban": "TR450015700000000125414973"
+        }
+    }
+
+def _transaction_result(body):
+    """
+    Applies the create-transaction scenarios to a parsed request body.
+    Returns (status, response_data, callback_payload); callback_payload is
+    None when the request is rejected and no callback should be sent.
+    """
+    # --- SCENARIO MATCHING FOR TESTING ---
+    # 1. Blocked User Simulation
+    if body.get('user_id') == 'BLOCKED_USER':
+        return 403, {
+            "status": "failed",
+            "error_code": "USER_BANNED",
+            "message": "This user is restricted from making transactions."
+        }, None
+
+    # 2. Maintenance Mode Simulation (Specific Amount)
+    if str(body.get('amount')) == '503':
+        return 503, {
+            "status": "error",
+            "message": "Payment system is currently under maintenance."
+        }, None
+
+    # 3. Invalid Amount Logic
+    try:
+        amt = float(body.get('amount', 0))
+        if amt <= 0:
+            return 400, {
+                "status": "failed", 
+                "error_code": "INVALID_AMOUNT", 
+                "message": "Amount must be greater than zero."
+            }, None
+    except:
+        pass # Let it fail later or handle as string
+
+    # Support both Token-based and Direct modes
+    if body.get('process_token'):
+        # Token Mode
+        pass
+    elif body.get('amount') and body.get('user_id'):
+        # Direct Mode
+        pass
+    else:
+        return 400, {'error': 'Missing required fields (process_token OR amount+user_id)'}, None
+
+    # Token -> transaction linkage and external_id idempotency (core/ledger.py)
+    try:
+        entry, created = get_ledger().create(
+            MockTransaction.KIND_DEPOSIT,
+            external_id=body.get('external_id'),
+            token=body.get('process_token'),
+            amount=body.get('amount'),
+            user_id=body.get('user_id'),
+        )
+    except LedgerError as e:
+        status, data = e.response()
+        return status, data, None
+
+    # Mock Logic for both
+    result_data = {
+        "status": "success",
+        "process_type": "direct" if not body.get('process_token') else "token_based",
+        "transaction_id": entry.id,
+        "customer_iban": "TR18231289327218937913",
+        "customer_name": body.get('full_name', 'TEST USER').upper(),
+        "amount": body.get('amount', 15000.00),
+        "external_id": body.get('external_id', 'ext_123'),
+        "message": "Transaction created successfully. Redirect user to payment page.",
+        "payment_page_url": "https://eastpay.site/pay/" + entry.id
+    }
+    if not created:
+        # Repeated external_id: same transaction, no second callback
+        result_data["idempotent_replay"] = True
+        return 200, result_data, None
+
+    # Prepare a realistic callback payload
+    callback_payload = {
+        "event": "transaction.success",
+        "transaction_id": entry.id,
+        "order_id": body.get('external_id'),
+        "amount": body.get('amount'),
+        "currency": "TRY",
+        "status": "APPROVED",
+        "timestamp": "2026-02-14T12:00:00Z"
+    }
+    return 200, result_data, callback_payload
+
+def _withdraw_result(body):
+    """
+    Applies the withdraw-request scenarios to a parsed request body.
+    Returns (status, response_data, callback_payload) like _transaction_result.
+    """
+    if not body.get('customer_iban') or not body.get('amount'):
+        return 400, {'error': 'Missing required fields'}, None
+
+    try:
+        entry, created = get_ledger().create(
+            MockTransaction.KIND_WITHDRAWAL,
+            external_id=body.get('external_id'),
+            amount=body.get('amount'),
+            user_id=body.get('user_id'),
+        )
+    except LedgerError as e:
+        status, data = e.response()
+        return status, data, None
+
+    # Mock Logic
+    result_data = {
+        "status": "success",
+        "message": "Withdraw request received",
+        "transaction_id": entry.id
+    }
+    if not created:
+        result_data["idempotent_replay"] = True
+        return 200, result_data, None
+
+    # Prepare a realistic withdrawal callback payload
+    callback_payload = {
+        "event": "withdrawal.status",
+        "transaction_id": result_data["transaction_id"],
+        "external_id": body.get('external_id'),
+        "amount": body.get('amount'),
+        "currency": "TRY",
+        "status": "PAID",
+        "timestamp": "2026-02-14T12:05:00Z"
+    }
+    return 200, result_data, callback_payload
+
+# Inbox labels and delivery delay per callback kind
+TRANSACTION_CALLBACK = {"sender_ip": "SYSTEM (Callback Simulation)", "type": "transaction.callback", "delay": 0}
+WITHDRAWAL_CALLBACK = {"sender_ip": "SYSTEM (Withdrawal Callback)", "type": "withdrawal.callback", "delay": 2}
+
+def _callback_log_fields(kind, callback_url, callback_payload):
+    """
+    WebhookLog fields for a simulated callback stored in the local inbox.
+    """
+    return {
+        "sender_ip": kind["sender_ip"],
+        "method": "POST",
+        "headers": {"target": callback_url or "N/A", "type": kind["type"]},
+        "body": callback_payload,
+        "raw_body": json.dumps(callback_payload),
+    }
+
+def _emit_callback(kind, callback_url, callback_payload):
+    """
+    Stores the simulated callback in the Webhook Inbox and, if a callback URL
+    was given, hands it to the delivery engine.
+    """
+    logger.debug("callback.processing", type=kind['type'], callback_url=callback_url)
+
+    # ALWAYS save callback to our local DB (Webhook Inbox)
+    try:
+        store_webhook_log(**_callback_log_fields(kind, callback_url, callback_payload))
+        logger.debug("callback.stored", type=kind['type'])
+    except Exception:
+        logger.exception("callback.store_failed", type=kind['type'])
+
+    # ALSO send to external callback URL if provided
+    if callback_url:
+        try:
+            from core.delivery import dispatch_callback
+            if not dispatch_callback(callback_url, callback_payload, delay=kind["delay"]):
+                logger.warning("callback.rejected", url=callback_url, reason="queue full")
+            else:
+                logger.debug("callback.queued", url=callback_url, delay=kind["delay"])
+        except Exception:
+            logger.exception("callback.dispatch_failed", url=callback_url)
 
 @csrf_exempt
+@inject_faults('get_account')
 def mock_get_account(request):
     """
     Simulates: api/get-eligible-account/
     """
     if request.method != 'POST':
-        return JsonResponse({'error': 'Method not allowed'}, status=405)
+        return FastJsonResponse({'error': 'Method not allowed'}, status=405)
     
     try:
-        body = json.loads(request.body)
-        amount = body.get('amount') # Should be string or number
-
-        # Mock Response
-        return JsonResponse({
-            "status": "success",
-            "process_token": f"{random.randint(1000,9999)}-{random.randint(1000,9999)}-{random.randint(1000,9999)}",
-            "banka_bilgileri": {
-                "banka_adi": "ZİRAAT",
-                "alici_adi": "AHMET MEHMET",
-                "iban": "TR450015700000000125414973"
-            }
-        })
+        body = parse_body(request)
+        return FastJsonResponse(_account_result(body))
     except Exception as e:
-        return JsonResponse({'error': str(e)}, status=400)
+        return FastJsonResponse({'error': str(e)}, status=400)
 
 @csrf_exempt
+@inject_faults('create_transaction')
+@idempotent('create_transaction')
 def mock_create_transaction(request):
     """
     Simulates: api/create-transaction/
     """
     if request.method != 'POST':
-        return JsonResponse({'error': 'Method not allowed'}, status=405)
+        return FastJsonResponse({'error': 'Method not allowed'}, status=405)
     
     try:
-        body = json.loads(request.body)
-        
-        # --- SCENARIO MATCHING FOR TESTING ---
-        # 1. Blocked User Simulation
-        if body.get('user_id') == 'BLOCKED_USER':
-            return JsonResponse({
-                "status": "failed",
-                "error_code": "USER_BANNED",
-                "message": "This user is restricted from making transactions."
-            }, status=403)
-
-        # 2. Maintenance Mode Simulation (Specific Amount)
-        if str(body.get('amount')) == '503':
-            return JsonResponse({
-                "status": "error",
-                "message": "Payment system is currently under maintenance."
-            }, status=503)
-
-        # 3. Invalid Amount Logic
-        try:
-            amt = float(body.get('amount', 0))
-            if amt <= 0:
-                return JsonResponse({
-                    "status": "failed", 
-                    "error_code": "INVALID_AMOUNT", 
-                    "message": "Amount must be greater than zero."
-                }, status=400)
-        except:
-            pass # Let it fail later or handle as string
-
-        # Support both Token-based and Direct modes
-        if body.get('process_token'):
-            # Token Mode
-            pass
-        elif body.get('amount') and body.get('user_id'):
-            # Direct Mode
-            pass
-        else:
-             return JsonResponse({'error': 'Missing required fields (process_token OR amount+user_id)'}, status=400)
-
-        # Mock Logic for both
-        result_data = {
-            "status": "success",
-            "process_type": "direct" if not body.get('process_token') else "token_based",
-            "customer_iban": "TR18231289327218937913",
-            "customer_name": body.get('full_name', 'TEST USER').upper(),
-            "amount": body.get('amount', 15000.00),
-            "external_id": body.get('external_id', 'ext_123'),
-            "message": "Transaction created successfully. Redirect user to payment page.",
-            "payment_page_url": "https://eastpay.site/pay/TRX-" + str(random.randint(100000,999999))
-        }
-        
-        # --- TRIGGER LIVE CALLBACK SIMULATION ---
-        callback_url = body.get('callback_url')
-        print(f"DEBUG: Processing Transaction. Callback URL: {callback_url}")
-        
-        # Prepare a realistic callback payload
-        callback_payload = {
-            "event": "transaction.success",
-            "transaction_id": "TRX-" + str(random.randint(100000, 999999)),
-            "order_id": body.get('external_id'),
-            "amount": body.get('amount'),
-            "currency": "TRY",
-            "status": "APPROVED",
-            "timestamp": "2026-02-14T12:00:00Z"
-        }
-
-        # ALWAYS save callback to our local DB (Webhook Inbox)
-        try:
-            from core.models import WebhookLog
-            WebhookLog.objects.create(
-                sender_ip="SYSTEM (Callback Simulation)",
-                method="POST",
-                headers={"target": callback_url or "N/A", "type": "transaction.callback"},
-                body=callback_payload,
-                raw_body=json.dumps(callback_payload)
-            )
-            print("DEBUG: Callback saved to WebhookLog")
-        except Exception as e:
-            print(f"DEBUG: Failed to save callback to DB: {e}")
-
-        # ALSO send to external callback URL if provided
-        if callback_url:
-            try:
-                import threading
-                def send_webhook():
-                    try:
-                        import requests
-                        print(f"DEBUG: Sending Async Webhook to {callback_url}")
-                        resp = requests.post(callback_url, json=callback_payload, timeout=5)
-                        print(f"DEBUG: Webhook Result: {resp.status_code} - {resp.text[:50]}")
-                    except Exception as e:
-                        print(f"DEBUG: Webhook Failed: {e}")
-
-                threading.Thread(target=send_webhook).start()
-                
-            except Exception as e:
-                print(f"DEBUG: Main Thread Webhook Error: {e}")
-
-        return JsonResponse(result_data)
+        body = parse_body(request)
+        status, result_data, callback_payload = _transaction_result(body)
+        if callback_payload is not None:
+            # --- TRIGGER LIVE CALLBACK SIMULATION ---
+            _emit_callback(TRANSACTION_CALLBACK, body.get('callback_url'), callback_payload)
+        return FastJsonResponse(result_data, status=status)
     except Exception as e:
-        print(f"DEBUG: Transaction Error: {e}")
-        return JsonResponse({'error': str(e)}, status=400)
+        logger.warning("transaction.error", error=str(e))
+        return FastJsonResponse({'error': str(e)}, status=400)
 
 @csrf_exempt
+@inject_faults('withdraw_request')
+@idempotent('withdraw_request')
 def mock_withdraw_request(request):
     """
     Simulates: api/public/withdraw-request/
     """
     if request.method != 'POST':
-        return JsonResponse({'error': 'Method not allowed'}, status=405)
+        return FastJsonResponse({'error': 'Method not allowed'}, status=405)
     
     try:
-        body = json.loads(request.body)
-        if not body.get('customer_iban') or not body.get('amount'):
-             return JsonResponse({'error': 'Missing required fields'}, status=400)
-
-        # Mock Logic
-        result_data = {
-            "status": "success",
-            "message": "Withdraw request received",
-            "transaction_id": f"W-{random.randint(10000,99999)}"
-        }
-
-        # --- TRIGGER LIVE CALLBACK SIMULATION (WITHDRAWAL) ---
-        callback_url = body.get('callback_url')
-        print(f"DEBUG: Processing Withdrawal. Callback URL: {callback_url}")
-
-        # Prepare a realistic withdrawal callback payload
-        callback_payload = {
-            "event": "withdrawal.status",
-            "transaction_id": result_data["transaction_id"],
-            "external_id": body.get('external_id'),
-            "amount": body.get('amount'),
-            "currency": "TRY",
-            "status": "PAID",
-            "timestamp": "2026-02-14T12:05:00Z"
-        }
-
-        # ALWAYS save callback to our local DB (Webhook Inbox)
-        try:
-            from core.models import WebhookLog
-            WebhookLog.objects.create(
-                sender_ip="SYSTEM (Withdrawal Callback)",
-                method="POST",
-                headers={"target": callback_url or "N/A", "type": "withdrawal.callback"},
-                body=callback_payload,
-                raw_body=json.dumps(callback_payload)
-            )
-            print("DEBUG: Withdrawal callback saved to WebhookLog")
-        except Exception as e:
-            print(f"DEBUG: Failed to save withdrawal callback to DB: {e}")
-
-        # ALSO send to external callback URL if provided
-        if callback_url:
-            try:
-                import threading
-                def send_webhook():
-                    try:
-                        import requests
-                        import time
-                        time.sleep(2)
-                        print(f"DEBUG: Sending Withdrawal Webhook to {callback_url}")
-                        requests.post(callback_url, json=callback_payload, timeout=5)
-                    except Exception as e:
-                        print(f"DEBUG: Withdrawal Webhook Failed: {e}")
-                threading.Thread(target=send_webhook).start()
-                
-            except Exception as e:
-                print(f"DEBUG: Withdrawal Callback Error: {e}")
-
-        return JsonResponse(result_data)
+        body = parse_body(request)
+        status, result_data, callback_payload = _withdraw_result(body)
+        if callback_payload is not None:
+            # --- TRIGGER LIVE CALLBACK SIMULATION (WITHDRAWAL) ---
+            _emit_callback(WITHDRAWAL_CALLBACK, body.get('callback_url'), callback_payload)
+        return FastJsonResponse(result_data, status=status)
     except Exception as e:
-        return JsonResponse({'error': str(e)}, status=400)
+        return FastJsonResponse({'error': str(e)}, status=400)
+
+def mock_transaction_status(request):
+    """
+    Simulates: api/transaction-status/?transaction_id=... or ?external_id=...&type=deposit|withdrawal
+    """
+    transaction_id = request.GET.get('transaction_id')
+    external_id = request.GET.get('external_id')
+    if not transaction_id and not external_id:
+        return FastJsonResponse({'error': 'transaction_id or external_id is required'}, status=400)
+
+    entry = get_ledger().lookup(transaction_id=transaction_id, external_id=external_id, kind=request.GET.get('type'))
+    if entry is None:
+        return FastJsonResponse({
+            "status": "failed",
+            "error_code": "TRANSACTION_NOT_FOUND",
+            "message": "No such transaction (or it has expired)."
+        }, status=404)
+    return FastJsonResponse(entry.as_dict())
 
 from django.contrib.auth.views import LoginView
 from django.contrib.auth.decorators import login_required
@@ -259,184 +319,332 @@ def run_diagnostic_test(request):
     """
     Backend logic for running diagnostic tests via Python requests.
     """
-    # ... (rest of the function remains same)
     if request.method != 'POST':
-        return JsonResponse({'error': 'Method not allowed'}, status=405)
+        return FastJsonResponse({'error': 'Method not allowed'}, status=405)
 
     try:
-        data = json.loads(request.body)
+        data = parse_body(request)
         target_url = data.get('target_url')
-        test_type = data.get('test_type')
-        http_method = data.get('http_method', 'GET').upper()
-        payload = data.get('payload', {})
         
         if not target_url:
-             return JsonResponse({'error': 'Target URL required'}, status=400)
-
-        response_data = {}
-        headers = {}
-        verify_ssl = False # For local dev environments
-
-        if test_type == 'browser':
-            headers["User-Agent"] = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-            try:
-                resp = requests.request(http_method, target_url, headers=headers, json=payload, verify=verify_ssl, timeout=10)
-                response_data = {
-                    'status_code': resp.status_code,
-                    'method_used': resp.request.method,
-                    'json': resp.json() if resp.status_code == 200 else resp.text[:500]
-                }
-            except Exception as e:
-                response_data = {'error': str(e)}
-
-        elif test_type == 'bot':
-            headers["User-Agent"] = "" # Empty UA
-            try:
-                resp = requests.request(http_method, target_url, headers=headers, json=payload, verify=verify_ssl, timeout=10)
-                response_data = {
-                    'status_code': resp.status_code,
-                    'method_used': resp.request.method,
-                    'json': resp.json() if resp.status_code == 200 else resp.text[:500]
-                }
-            except Exception as e:
-                 response_data = {'error': str(e)}
-
-        elif test_type == 'http':
-             # Force HTTP scheme
-             if target_url.startswith('https://'):
-                 target_url = target_url.replace('https://', 'http://')
-             try:
-                resp = requests.request(http_method, target_url, json=payload, verify=verify_ssl, timeout=10)
-                if resp.history:
-                    # Check for redirects
-                    response_data = {
-                        'status_code': resp.status_code,
-                        'method_used': resp.request.method,
-                         'redirect_history': [r.url for r in resp.history],
-                        'final_url': resp.url,
-                         'json': resp.json() if resp.status_code == 200 else resp.text[:500]
-                    }
-                else:
-                    response_data = {
-                        'status_code': resp.status_code,
-                        'method_used': resp.request.method,
-                        'json': resp.json() if resp.status_code == 200 else resp.text[:500]
-                    }
-             except Exception as e:
-                response_data = {'error': str(e)}
-        
-        elif test_type == 'custom':
-            # Fully custom request with Headers support (Postman-style)
-            request_headers = {"User-Agent": "NexKasa-Diagnostic-Tool/1.0"}
-            
-            # Merge custom headers from frontend
-            custom_headers = data.get('custom_headers', {})
-            if custom_headers:
-                # Remove empty keys
-                clean_headers = {k: v for k, v in custom_headers.items() if k.strip()}
-                request_headers.update(clean_headers)
-
-            try:
-                resp = requests.request(
-                    http_method, 
-                    target_url, 
-                    headers=request_headers, 
-                    json=payload, 
-                    verify=verify_ssl, 
-                    timeout=10
-                )
-                
-                response_data = {
-                    'status_code': resp.status_code,
-                    'method_used': resp.request.method,
-                    'headers_sent': dict(resp.request.headers),
-                    'elapsed': resp.elapsed.total_seconds() * 1000, # ms
-                    'response_headers': dict(resp.headers),
-                    # Try to parse JSON, if fails return text
-                    'json': None
-                }
-                
-                try:
-                    response_data['json'] = resp.json()
-                except:
-                    # Return full text (up to 100KB) for HTML debugging
-                    response_data['json'] = resp.text[:100000] 
-
-            except Exception as e:
-                response_data = {'error': str(e)}
-
-        return JsonResponse(response_data)
+             return FastJsonResponse({'error': 'Target URL required'}, status=400)
+
+        if data.get('test_type') == 'load':
+            # Load test mode (bounded so one click cannot pin a worker for long);
+            # logged-in users only, it would otherwise be an open traffic generator
+            if not request.user.is_authenticated:
+                return FastJsonResponse({'error': 'Login required for load tests'}, status=403)
+            from core.loadtest import run_load_test
+            rps = float(data['rps']) if data.get('rps') else None
+            if rps is not None and not 0 < rps <= settings.DIAGNOSTIC_LOAD_MAX_RPS:
+                return FastJsonResponse({'error': f"rps must be between 0 and {settings.DIAGNOSTIC_LOAD_MAX_RPS}"}, status=400)
+            request_headers = {k: v for k, v in (data.get('custom_headers') or {}).items() if k.strip()}
+            return FastJsonResponse(run_load_test(
+                target_url,
+                method=data.get('http_method', 'GET'),
+                headers=request_headers or None,
+                payload=data.get('payload') or None,
+                concurrency=max(1, min(int(data.get('concurrency', 10)), settings.DIAGNOSTIC_LOAD_MAX_CONCURRENCY)),
+                rps=rps,
+                duration=max(1.0, min(float(data.get('duration', 10)), settings.DIAGNOSTIC_LOAD_MAX_DURATION)),
+                warmup=max(0.0, min(float(data.get('warmup', 2)), 10.0)),
+            ))
+
+        from core.diagnostics import run_probe
+        response_data = run_probe(
+            _probe_session(),
+            target_url,
+            data.get('test_type'),
+            http_method=data.get('http_method', 'GET').upper(),
+            payload=data.get('payload', {}),
+            custom_headers=data.get('custom_headers', {}),
+            preview_bytes=settings.DIAGNOSTIC_PREVIEW_BYTES,
+            max_body_bytes=settings.DIAGNOSTIC_MAX_BODY_BYTES,
+        )
+        return FastJsonResponse(response_data)
 
     except Exception as e:
-        return JsonResponse({'error': f"Internal Server Error: {str(e)}"}, status=500)
+        return FastJsonResponse({'error': f"Internal Server Error: {str(e)}"}, status=500)
+
+@login_required
+def run_diagnostic_batch(request):
+    """
+    Runs every target x test_type combination concurrently and streams one
+    NDJSON line per result as soon as it completes, then a summary line.
+    URL: /api/run-diagnostic-batch/
+
+    Body: {"targets": [url | {"target_url", "http_method", "payload", "custom_headers"}],
+           "test_types": ["browser", "bot", "http", "custom"], "concurrency": 8,
+           "http_method": "GET", "payload": {}, "custom_headers": {}}
+    """
+    if request.method != 'POST':
+        return FastJsonResponse({'error': 'Method not allowed'}, status=405)
+
+    from core.diagnostics import TEST_TYPES, expand_jobs, run_batch
+    try:
+        data = parse_body(request)
+        defaults = {k: data[k] for k in ('http_method', 'payload', 'custom_headers') if k in data}
+        jobs = expand_jobs(data.get('targets') or [], data.get('test_types') or list(TEST_TYPES), defaults)
+    except Exception as e:
+        return FastJsonResponse({'error': str(e)}, status=400)
+
+    if not jobs:
+        return FastJsonResponse({'error': 'At least one target required'}, status=400)
+    if len(jobs) > settings.DIAGNOSTIC_BATCH_MAX_JOBS:
+        return FastJsonResponse({'error': f"Too many probes ({len(jobs)} > {settings.DIAGNOSTIC_BATCH_MAX_JOBS})"}, status=400)
+    concurrency = max(1, min(int(data.get('concurrency', 8)), settings.DIAGNOSTIC_BATCH_MAX_CONCURRENCY))
+
+    def stream():
+        started = time.perf_counter()
+        done = 0
+        for item in run_batch(jobs, concurrency=concurrency,
+                              preview_bytes=settings.DIAGNOSTIC_PREVIEW_BYTES,
+                              max_body_bytes=settings.DIAGNOSTIC_MAX_BODY_BYTES):
+            done += 1
+            yield dumps(item) + b"\n"
+        yield dumps({
+            "done": True,
+            "total": done,
+            "concurrency": concurrency,
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 2),
+        }) + b"\n"
+
+    response = StreamingHttpResponse(stream(), content_type='application/x-ndjson')
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+_session = None
+
+def _probe_session():
+    """
+    Shared keep-alive session for single dashboard probes.
+    """
+    global _session
+    if _session is None:
+        from core.diagnostics import make_session
+        _session = make_session(pool_size=settings.DIAGNOSTIC_BATCH_MAX_CONCURRENCY)
+    return _session
 
 # --- WEBHOOK SYSTEM ---
 from core.models import WebhookLog
+from core.ingest import get_buffer, store_webhook_log
+from core.queries import InvalidCursor, decode_cursor, page_webhook_logs, serialize_log
+from core.stream import aevent_stream, event_stream, get_hub
+from django.core.handlers.asgi import ASGIRequest
 from django.utils import timezone
 
+def _listener_log_fields(request):
+    """
+    Captures sender, headers and body of an incoming webhook as WebhookLog fields.
+    """
+    client_ip = request.META.get('HTTP_CF_CONNECTING_IP') or request.META.get('REMOTE_ADDR')
+    # Simple header capture
+    headers = {}
+    for k, v in request.META.items():
+        if k.startswith('HTTP_') or k in ['CONTENT_TYPE', 'CONTENT_LENGTH']:
+            headers[k] = str(v)
+    
+    # Parse Body (straight from bytes; the decoded text is only kept as raw_body)
+    body_data = {}
+    raw_body = ""
+    if request.body:
+        try:
+            body_data = loads(request.body)
+        except (ValueError, RecursionError):
+            pass # Keep empty if not JSON (or nested too deeply for the stdlib parser)
+        raw_body = request.body.decode('utf-8', errors='ignore')
+
+    return {
+        "sender_ip": client_ip,
+        "method": request.method,
+        "headers": headers,
+        "body": body_data,
+        "raw_body": raw_body,
+    }
+
 @csrf_exempt
+@inject_faults('webhook_listener')
 def webhook_listener(request):
     """
     Endpoint that accepts ANY webhook and stores it for inspection.
     URL: /api/webhook-listener/
     """
     try:
-        print(f"DEBUG: Listener hit by {request.method}")
-        # Capture Data
-        client_ip = request.META.get('HTTP_CF_CONNECTING_IP') or request.META.get('REMOTE_ADDR')
-        # Simple header capture
-        headers = {}
-        for k, v in request.META.items():
-            if k.startswith('HTTP_') or k in ['CONTENT_TYPE', 'CONTENT_LENGTH']:
-                headers[k] = str(v)
-        
-        # Parse Body
-        body_data = {}
-        raw_body = ""
-        try:
-            raw_body = request.body.decode('utf-8', errors='ignore')
-            if raw_body:
-                body_data = json.loads(raw_body)
-        except:
-            pass # Keep empty if not JSON
-
-        print(f"DEBUG: Webhook Body: {body_data}")
-
-        # Save to DB
-        log = WebhookLog.objects.create(
-            sender_ip=client_ip,
-            method=request.method,
-            headers=headers,
-            body=body_data,
-            raw_body=raw_body
-        )
-        print(f"DEBUG: Webhook Saved ID: {log.id}")
+        # Capture Data & Save to DB
+        fields = _listener_log_fields(request)
+        log = store_webhook_log(**fields)
+        logger.info("webhook.received", method=request.method, log_id=str(log.id),
+                    sender_ip=fields["sender_ip"], body=fields["body"])
         
-        return JsonResponse({"status": "received", "log_id": str(log.id)}, status=200)
+        return FastJsonResponse({"status": "received", "log_id": str(log.id)}, status=200)
 
     except Exception as e:
-        print(f"DEBUG: Listener Error: {e}")
-        return JsonResponse({"error": str(e)}, status=500)
+        logger.exception("webhook.store_failed", method=request.method)
+        return FastJsonResponse({"error": str(e)}, status=500)
 
 @login_required
 def get_webhook_logs(request):
     """
-    Returns the last 20 received webhooks for the dashboard UI.
+    Returns received webhooks for the dashboard UI, newest first.
     URL: /api/get-webhook-logs/
+
+    Query params: limit (default 20, max 200), cursor (from next_cursor),
+    method, sender_ip, event, order_id, external_id, status, since, until.
     """
     try:
-        logs = WebhookLog.objects.all().order_by('-timestamp')[:20]
-        data = []
-        for log in logs:
-            data.append({
-                "id": str(log.id),
-                "timestamp": log.timestamp.strftime("%H:%M:%S"),
-                "method": log.method,
-                "body": log.body,
-                "headers": log.headers
-            })
-        print(f"DEBUG: Returning {len(data)} webhook logs")
-        return JsonResponse({"logs": data})
+        logs, next_cursor = page_webhook_logs(
+            request.GET, limit=request.GET.get('limit', 20), cursor=request.GET.get('cursor')
+        )
+        data = [serialize_log(log) for log in logs]
+        return FastJsonResponse({"logs": data, "next_cursor": next_cursor})
+    except ValueError as e:  # InvalidCursor, bad since / until / limit
+        return FastJsonResponse({"error": str(e)}, status=400)
     except Exception as e:
-        print(f"DEBUG: Get Webhook Logs Error: {e}")
-        return JsonResponse({"error": str(e)}, status=500)
+        logger.exception("webhook_logs.query_failed")
+        return FastJsonResponse({"error": str(e)}, status=500)
+
+@login_required
+def search_webhook_logs(request):
+    """
+    Full-text and JSON-path search over received webhooks, newest first.
+    URL: /api/search-webhook-logs/?q=ORD-1042 body.status="APPROVED"
+
+    Accepts the get-webhook-logs filters and cursor as well; see core/search.py
+    for the query syntax.
+    """
+    from core import search
+
+    q = request.GET.get('q', '').strip()
+    if not q:
+        return FastJsonResponse({"error": "q is required"}, status=400)
+    try:
+        logs, next_cursor, backend, took_ms = search.search_webhook_logs(
+            request.GET, q, limit=request.GET.get('limit', 20), cursor=request.GET.get('cursor')
+        )
+        data = [serialize_log(log) for log in logs]
+        return FastJsonResponse({"logs": data, "next_cursor": next_cursor, "backend": backend, "took_ms": took_ms})
+    except ValueError as e:  # bad query syntax, cursor or filters
+        return FastJsonResponse({"error": str(e)}, status=400)
+    except Exception as e:
+        logger.exception("webhook_logs.search_failed", q=q)
+        return FastJsonResponse({"error": str(e)}, status=500)
+
+@login_required
+def stream_webhook_logs(request):
+    """
+    Pushes newly stored webhooks to the dashboard as Server-Sent Events.
+    URL: /api/stream-webhook-logs/
+
+    Resumes after the Last-Event-ID header (or ?last_event_id=) when given.
+    Answers 503 once WEBHOOK_STREAM_MAX_SUBSCRIBERS streams are open in this
+    worker: each one holds a gthread thread while it lasts (gunicorn.conf.py
+    reserves that many on top of GUNICORN_THREADS).
+    """
+    last_event_id = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+    if last_event_id:
+        try:
+            decode_cursor(last_event_id)
+        except InvalidCursor as e:
+            return FastJsonResponse({"error": str(e)}, status=400)
+    hub = get_hub()
+    if hub.subscriber_count() >= settings.WEBHOOK_STREAM_MAX_SUBSCRIBERS:
+        response = FastJsonResponse({"error": "Too many live streams on this worker, poll instead"}, status=503)
+        response['Retry-After'] = '30'
+        return response
+    stream = aevent_stream if isinstance(request, ASGIRequest) else event_stream
+    response = StreamingHttpResponse(
+        stream(hub, last_event_id, max_duration=settings.WEBHOOK_STREAM_MAX_DURATION),
+        content_type='text/event-stream',
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+@login_required
+def get_webhook_ingest_stats(request):
+    """
+    Reports batching statistics of this worker's WebhookLog ingestion buffer
+    and its log queue (records dropped because stdout fell behind).
+    URL: /api/webhook-ingest-stats/
+    """
+    return FastJsonResponse({"buffered": settings.WEBHOOK_LOG_BUFFERED, **get_buffer().stats(), "logging": log_stats()})
+
+@login_required
+def get_ledger_stats(request):
+    """
+    Per-worker ledger counters (tokens issued, created, replayed, rejected,
+    evicted) and idempotency cache counters.
+    URL: /api/ledger-stats/
+    """
+    return FastJsonResponse({**get_ledger().stats(), "idempotency": get_cache().stats()})
+
+
+def metrics_endpoint(request):
+    """
+    Prometheus scrape target, summed over all worker processes (see core/metrics.py).
+    Set METRICS_TOKEN to require "Authorization: Bearer <token>".
+    URL: /metrics
+    """
+    if settings.METRICS_TOKEN:
+        auth = request.META.get('HTTP_AUTHORIZATION', '')
+        if not constant_time_compare(auth, f"Bearer {settings.METRICS_TOKEN}"):
+            return HttpResponse("Unauthorized\n", status=401, content_type='text/plain')
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+@login_required
+def run_webhook_replay(request):
+    """
+    Dashboard action for `manage.py replay_webhooks`: replays stored webhooks
+    against target_url and returns the latency / diff report.
+    URL: /api/replay-webhooks/
+
+    Body: {"target_url", "mode": "original|rps|max", "rps", "speed", "concurrency",
+           "limit", "baseline_url", "ignore_keys": [], "filters": {"since", "until",
+           "method", "sender_ip", "event", "order_id", "external_id"}}
+    Limited to REPLAY_MAX_LOGS logs and REPLAY_MAX_DURATION seconds per call.
+    """
+    from core.replay import replay_queryset, run_replay
+    if request.method != 'POST':
+        return FastJsonResponse({'error': 'Method not allowed'}, status=405)
+
+    try:
+        data = parse_body(request)
+        target_url = data.get('target_url')
+        if not target_url:
+            return FastJsonResponse({'error': 'target_url required'}, status=400)
+        limit = int(data.get('limit') or settings.REPLAY_MAX_LOGS)
+        limit = max(1, min(limit, settings.REPLAY_MAX_LOGS))
+        concurrency = max(1, min(int(data.get('concurrency', 10)), settings.REPLAY_MAX_CONCURRENCY))
+        logs = replay_queryset(data.get('filters') or {}, limit=limit)
+        report = run_replay(
+            logs, target_url, mode=data.get('mode', 'max'), rps=float(data.get('rps') or 0) or None,
+            speed=float(data.get('speed') or 1.0), concurrency=concurrency,
+            baseline_url=data.get('baseline_url') or None, ignore_keys=data.get('ignore_keys') or (),
+            max_duration=settings.REPLAY_MAX_DURATION,
+        )
+    except (ValueError, TypeError) as e:
+        return FastJsonResponse({'error': str(e)}, status=400)
+    return FastJsonResponse(report)
+
+@login_required
+def export_webhook_logs(request):
+    """
+    Streams the whole (filtered) WebhookLog table as a download, in bounded memory.
+    URL: /api/export-webhook-logs/?format=ndjson|csv|columnar|parquet&gzip=1
+
+    Filters: since, until (ISO or 15m / 2h / 7d), method, sender_ip, event,
+    order_id, external_id. gzip applies to ndjson and csv. Very large exports
+    are better run with `manage.py export_webhook_logs`, which no worker
+    timeout applies to.
+    """
+    from core.export import FORMATS, export_filename, export_stream
+    fmt = request.GET.get('format', 'ndjson')
+    compress = request.GET.get('gzip') in ('1', 'true')
+    try:
+        chunks = export_stream(request.GET, fmt=fmt, compress=compress)
+    except ValueError as e:
+        return FastJsonResponse({"error": str(e)}, status=400)
+    response = StreamingHttpResponse(chunks, content_type=FORMATS[fmt][0])
+    response['Content-Disposition'] = f'attachment; filename="{export_filename(fmt, compress)}"'
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -55,5 +55,48 @@ def run_diagnostics():
         print(f"--> FAILED: {str(e)}")
     print("-" * 50)
 
+def parse_header(value):
+    """
+    argparse type for --header: 'Name: value' -> (name, value), both stripped.
+    """
+    import argparse
+    name, sep, header_value = value.partition(":")
+    if not sep or not name.strip():
+        raise argparse.ArgumentTypeError(f"expected 'Name: value', got {value!r}")
+    return name.strip(), header_value.strip()
+
+def run_load(args):
+    from core.loadtest import format_report, run_load_test
+
+    payload = json.loads(args.payload) if args.payload else None
+    headers = dict(args.header) if args.header else None
+    print(f"Load test: {args.method} {args.load} for {args.duration}s (+{args.warmup}s warm-up)\n")
+    report = run_load_test(
+        args.load, method=args.method, headers=headers, payload=payload,
+        concurrency=args.concurrency, rps=args.rps, duration=args.duration,
+        warmup=args.warmup, timeout=args.timeout,
+    )
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(format_report(report))
+
 if __name__ == "__main__":
-    run_diagnostics()
+    import argparse
+    parser = argparse.ArgumentParser(description="NexKasa connection diagnostics and load testing.")
+    parser.add_argument("--load", metavar="URL", help="Run a load test against URL instead of the diagnostics.")
+    parser.add_argument("--method", default="GET")
+    parser.add_argument("--payload", help="JSON body to send with every request.")
+    parser.add_argument("--header", action="append", type=parse_header, help="Extra header 'Name: value' (repeatable).")
+    parser.add_argument("--concurrency", type=int, default=10, help="Worker connections (default 10).")
+    parser.add_argument("--rps", type=float, help="Target requests/second (open loop). Omit for closed loop.")
+    parser.add_argument("--duration", type=float, default=10, help="Measured seconds (default 10).")
+    parser.add_argument("--warmup", type=float, default=2, help="Unmeasured warm-up seconds (default 2).")
+    parser.add_argument("--timeout", type=float, default=10)
+    parser.add_argument("--json", action="store_true", help="Print the full JSON report.")
+    args = parser.parse_args()
+
+    if args.load:
+        run_load(args)
+    else:
+        run_diagnostics()
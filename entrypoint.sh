@@ -1,26 +1,20 @@
 #!/bin/bash
 set -e
 
-echo "=== Running Migrations ==="
-python manage.py migrate --noinput
+# BOOT_MODE=fast (default): one `manage.py bootstrap` process applies pending
+#   migrations, ensures the superuser and only runs collectstatic when the
+#   image was built without it, printing the time of each phase.
+# BOOT_MODE=none: start serving right away (migrations run by a release job).
+boot_started=$(date +%s%N)
 
-echo "=== Creating Superuser (if not exists) ==="
-python manage.py shell -c "
-from django.contrib.auth import get_user_model
-User = get_user_model()
-if not User.objects.filter(username='${DJANGO_SUPERUSER_USERNAME:-admin}').exists():
-    User.objects.create_superuser(
-        username='${DJANGO_SUPERUSER_USERNAME:-admin}',
-        email='${DJANGO_SUPERUSER_EMAIL:-admin@nexkasa.com}',
-        password='${DJANGO_SUPERUSER_PASSWORD:-admin123}'
-    )
-    print('Superuser created.')
-else:
-    print('Superuser already exists. Skipping.')
-"
+if [ "${BOOT_MODE:-fast}" != "none" ]; then
+    echo "=== Bootstrap (migrate, superuser, collectstatic) ==="
+    python manage.py bootstrap
+fi
 
-echo "=== Collecting Static Files ==="
-python manage.py collectstatic --noinput
+echo "=== Boot steps took $(( ($(date +%s%N) - boot_started) / 1000000 )) ms ==="
 
-echo "=== Starting Gunicorn ==="
-exec gunicorn --bind 0.0.0.0:${PORT:-8000} nexkasa_debug.wsgi:application
+# Workers, threads, keep-alive, recycling and preload: see gunicorn.conf.py
+# (SERVER_MODE=asgi switches to uvicorn workers)
+echo "=== Starting Gunicorn (${SERVER_MODE:-wsgi}) ==="
+exec gunicorn -c gunicorn.conf.py
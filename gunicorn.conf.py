@@ -0,0 +1,183 @@
+"""
+Production gunicorn profile, configured from the environment.
+
+    gunicorn -c gunicorn.conf.py
+
+SERVER_MODE=wsgi runs gthread workers (threads share a process, so the
+callback delivery engine and the WebhookLog buffer serve all of them);
+SERVER_MODE=asgi runs uvicorn workers with the async views. Worker counts
+follow the CPUs actually available to the container (cgroup quota and CPU
+affinity, not the host's core count) unless set explicitly.
+
+GUNICORN_BIND            bind address (default 0.0.0.0:$PORT)
+WEB_CONCURRENCY          worker processes (default: CPUs for gthread, 2 x CPUs + 1 for uvicorn, max 16);
+                         the resolved count is exported back to the app (see settings.py)
+GUNICORN_THREADS         request threads per gthread worker (default 8)
+WEBHOOK_STREAM_MAX_SUBSCRIBERS  live dashboard streams per worker (default 32 for gthread);
+                         gthread workers get this many threads on top of GUNICORN_THREADS
+GUNICORN_WORKER_CLASS    override the worker class
+GUNICORN_KEEPALIVE       keep-alive seconds (default 5, above typical proxy idle pools)
+GUNICORN_BACKLOG         listen backlog (default 2048)
+GUNICORN_TIMEOUT         worker timeout seconds (default 30)
+GUNICORN_GRACEFUL_TIMEOUT  seconds to finish requests and flush buffers on restart (default 30)
+GUNICORN_MAX_REQUESTS    recycle a worker after this many requests, 0 disables (default 5000)
+GUNICORN_MAX_REQUESTS_JITTER  random extra requests so workers do not recycle together (default 10%)
+GUNICORN_PRELOAD         import the app once in the master and fork (default 1)
+GUNICORN_ACCESS_LOG      access log target, e.g. '-' (default off; core.log covers requests)
+"""
+import gc
+import glob
+import math
+import os
+import time
+
+_loaded_at = time.monotonic()
+
+MAX_AUTO_WORKERS = 16
+
+
+def _env_int(name, default):
+    value = os.environ.get(name)
+    return int(value) if value not in (None, '') else default
+
+
+def available_cpus():
+    """
+    CPUs this process may use: affinity mask, capped by a cgroup CPU quota.
+    """
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    quota = None
+    try:
+        with open('/sys/fs/cgroup/cpu.max') as f:  # cgroup v2: "<quota> <period>" or "max <period>"
+            limit, period = f.read().split()
+            if limit != 'max':
+                quota = int(limit) / int(period)
+    except (OSError, ValueError):
+        try:
+            with open('/sys/fs/cgroup/cpu/cpu.cfs_quota_us') as f:  # cgroup v1, -1 = unlimited
+                limit = int(f.read())
+            with open('/sys/fs/cgroup/cpu/cpu.cfs_period_us') as f:
+                period = int(f.read())
+            if limit > 0:
+                quota = limit / period
+        except (OSError, ValueError):
+            pass
+    if quota:
+        cpus = min(cpus, max(1, math.ceil(quota)))
+    return cpus
+
+
+server_mode = os.environ.get('SERVER_MODE', 'wsgi')
+cpus = available_cpus()
+
+bind = os.environ.get('GUNICORN_BIND', f"0.0.0.0:{os.environ.get('PORT', '8000')}")
+backlog = _env_int('GUNICORN_BACKLOG', 2048)
+
+if server_mode == 'asgi':
+    wsgi_app = 'nexkasa_debug.asgi:application'
+    worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'uvicorn.workers.UvicornWorker')
+    workers = _env_int('WEB_CONCURRENCY', min(2 * cpus + 1, MAX_AUTO_WORKERS))
+else:
+    wsgi_app = 'nexkasa_debug.wsgi:application'
+    worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+    workers = _env_int('WEB_CONCURRENCY', min(max(2, cpus), MAX_AUTO_WORKERS))
+threads = _env_int('GUNICORN_THREADS', 8)
+if worker_class == 'gthread':
+    # Every open SSE stream holds a gthread thread; give streams their own
+    # threads so a room full of dashboards cannot starve API requests.
+    stream_threads = _env_int('WEBHOOK_STREAM_MAX_SUBSCRIBERS', 32)
+    os.environ['WEBHOOK_STREAM_MAX_SUBSCRIBERS'] = str(stream_threads)
+    threads += stream_threads
+
+# settings.WEB_CONCURRENCY: with several workers the mock ledger and the
+# idempotency cache default to their shared database tiers
+os.environ['WEB_CONCURRENCY'] = str(workers)
+
+keepalive = _env_int('GUNICORN_KEEPALIVE', 5)
+timeout = _env_int('GUNICORN_TIMEOUT', 30)
+graceful_timeout = _env_int('GUNICORN_GRACEFUL_TIMEOUT', 30)
+max_requests = _env_int('GUNICORN_MAX_REQUESTS', 5000)
+max_requests_jitter = _env_int('GUNICORN_MAX_REQUESTS_JITTER', max_requests // 10)
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') == '1'
+
+# Heartbeat files on tmpfs: a slow container disk must not look like a hung worker
+if os.path.isdir('/dev/shm'):
+    worker_tmp_dir = '/dev/shm'
+
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG') or None
+errorlog = '-'
+loglevel = os.environ.get('GUNICORN_LOG_LEVEL', 'info')
+
+
+# --- Hooks ---
+
+def on_starting(server):
+    # Snapshots left by an earlier master with the same pid (pid 1 in a
+    # restarted container) would be summed into this one's counters.
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'nexkasa_debug.settings')
+    from django.conf import settings
+    if settings.METRICS_DIR:
+        from core.metrics import SNAPSHOT_FILE
+        # Only files core.metrics writes, in case METRICS_DIR points somewhere shared
+        for path in glob.glob(os.path.join(settings.METRICS_DIR, '*.json')):
+            if SNAPSHOT_FILE.match(os.path.basename(path)):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+    server.log.info("Server profile: %s, %d workers x %d threads, %d CPUs available, preload=%s",
+                    worker_class, workers, threads if worker_class == 'gthread' else 1, cpus, preload_app)
+    if worker_class == 'gthread':
+        server.log.info("Live webhook streams: up to %d per worker on their own threads; "
+                        "SERVER_MODE=asgi holds hundreds without threads", stream_threads)
+
+
+def when_ready(server):
+    server.log.info("Ready to serve %.2fs after loading the config%s", time.monotonic() - _loaded_at,
+                    " (app preloaded)" if preload_app else "")
+    if preload_app:
+        # Move everything the preloaded app allocated to a permanent generation
+        # so the collector never touches (and copies) those pages in workers.
+        gc.collect()
+        gc.freeze()
+
+
+def pre_fork(server, worker):
+    if preload_app:
+        # A SQLite connection opened during preload must not be shared by workers
+        from django.db import connections
+        connections.close_all()
+
+
+def post_worker_init(worker):
+    if 'Uvicorn' in worker_class:
+        # uvicorn re-raises SIGTERM / SIGINT after its graceful shutdown; with
+        # the default handler that kills the worker before worker_exit (and
+        # atexit) can run, so turn it into a normal exit.
+        import signal
+        import sys
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(sig, lambda signum, frame: sys.exit(0))
+
+
+def worker_exit(server, worker):
+    """
+    Runs in the worker after it stopped serving (graceful restart, max_requests
+    recycling, SIGTERM): writes out what in-process buffers still hold.
+    Only modules the worker actually imported are touched.
+    """
+    import sys
+    ingest, delivery = sys.modules.get('core.ingest'), sys.modules.get('core.delivery')
+    metrics, log = sys.modules.get('core.metrics'), sys.modules.get('core.log')
+    for name, flush in (('webhooklog buffer', ingest and ingest.shutdown),
+                        ('callback delivery', delivery and (lambda: delivery.shutdown(timeout=graceful_timeout / 3))),
+                        ('metrics snapshot', metrics and metrics.shutdown),
+                        ('log queue', log and log.shutdown)):
+        if flush:
+            try:
+                flush()
+            except Exception:
+                server.log.exception("worker_exit: flushing %s failed", name)
@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'nexkasa_debug.settings')
 
 application = get_asgi_application()
+
+# Public API endpoints take a shorter middleware chain (LEAN_API_PATHS)
+from core.lean import wrap_asgi  # noqa: E402 (needs the apps loaded above)
+
+application = wrap_asgi(application)
@@ -25,6 +25,7 @@ SECRET_KEY = 'django-insecure-#4fpe5z!gwv_5f*7he-#qr6c_w-pa8#-&d*9m6dc_m074h7)0x
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = True
 import os
+import tempfile
 
 ALLOWED_HOSTS = os.environ.get("ALLOWED_HOSTS", "*").split(",")
 CSRF_TRUSTED_ORIGINS = os.environ.get("CSRF_TRUSTED_ORIGINS", "https://*.nexkasa.com,https://api.nexkasa.com").split(",")
@@ -41,6 +42,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -51,6 +53,24 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Lean request path (core/lean.py): these public, session-less endpoints skip
+# sessions, CSRF, auth, messages, clickjacking and whitenoise. Path prefixes,
+# comma-separated; LEAN_API_PATHS="" sends everything through MIDDLEWARE.
+LEAN_API_PATHS = [p for p in os.environ.get('LEAN_API_PATHS', ','.join([
+    '/api/webhook-listener/',
+    '/api/get-eligible-account',
+    '/api/create-transaction',
+    '/api/public/withdraw-request',
+    '/api/transaction-status',
+    '/api/test-connection/',
+    '/metrics',
+])).split(',') if p]
+LEAN_API_MIDDLEWARE = [
+    'core.metrics.MetricsMiddleware',
+    'django.middleware.security.SecurityMiddleware',
+    'django.middleware.common.CommonMiddleware',
+]
+
 ROOT_URLCONF = 'nexkasa_debug.urls'
 
 TEMPLATES = [
@@ -81,6 +101,30 @@ DATABASES = {
     }
 }
 
+# DB_PROFILE=performance (default) keeps connections open across requests and
+# tunes SQLite for concurrent writers: WAL journal, busy timeout instead of
+# immediate "database is locked", NORMAL fsync, mmap and a larger page cache.
+# Pragmas are applied on connect by core.db.apply_sqlite_pragmas.
+# DB_PROFILE=default restores Django's stock behaviour.
+DB_PROFILE = os.environ.get('DB_PROFILE', 'performance')
+SQLITE_PERFORMANCE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 20000)),
+    'synchronous': 'NORMAL',
+    'mmap_size': int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),
+    'cache_size': int(os.environ.get('SQLITE_CACHE_SIZE_KB', 64 * 1024)) * -1,
+    'temp_store': 'MEMORY',
+}
+SQLITE_PRAGMAS = {}
+
+if DB_PROFILE == 'performance':
+    DATABASES['default'].update({
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 600)),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {'timeout': 20},
+    })
+    SQLITE_PRAGMAS = SQLITE_PERFORMANCE_PRAGMAS
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -124,3 +168,118 @@ STATICFILES_STORAGE = "whitenoise.storage.CompressedManifestStaticFilesStorage"
 LOGIN_URL = 'login'
 LOGIN_REDIRECT_URL = 'dashboard'
 LOGOUT_REDIRECT_URL = 'login'
+
+# Webhook delivery engine (core/delivery.py)
+WEBHOOK_DELIVERY_WORKERS = int(os.environ.get('WEBHOOK_DELIVERY_WORKERS', 16))
+WEBHOOK_DELIVERY_QUEUE_SIZE = int(os.environ.get('WEBHOOK_DELIVERY_QUEUE_SIZE', 5000))
+WEBHOOK_DELIVERY_TIMEOUT = float(os.environ.get('WEBHOOK_DELIVERY_TIMEOUT', 5))
+WEBHOOK_DELIVERY_ENQUEUE_TIMEOUT = float(os.environ.get('WEBHOOK_DELIVERY_ENQUEUE_TIMEOUT', 0.5))
+
+# Durable callback outbox (core.models.OutboundCallback, `manage.py deliver_callbacks`)
+WEBHOOK_OUTBOX_ENABLED = os.environ.get('WEBHOOK_OUTBOX_ENABLED', '0') == '1'
+WEBHOOK_OUTBOX_MAX_ATTEMPTS = int(os.environ.get('WEBHOOK_OUTBOX_MAX_ATTEMPTS', 8))
+WEBHOOK_OUTBOX_BACKOFF_BASE = float(os.environ.get('WEBHOOK_OUTBOX_BACKOFF_BASE', 2))
+WEBHOOK_OUTBOX_BACKOFF_CAP = float(os.environ.get('WEBHOOK_OUTBOX_BACKOFF_CAP', 600))
+
+# Server mode: 'wsgi' (sync gunicorn workers) or 'asgi' (uvicorn workers).
+# In ASGI mode the mock endpoints and webhook listener use core/async_views.py.
+SERVER_MODE = os.environ.get('SERVER_MODE', 'wsgi')
+ASYNC_API_VIEWS = os.environ.get('ASYNC_API_VIEWS', '1' if SERVER_MODE == 'asgi' else '0') == '1'
+
+# Batched WebhookLog ingestion (core/ingest.py). Opt-in: buffered hits are
+# answered with a log_id before the row is written.
+WEBHOOK_LOG_BUFFERED = os.environ.get('WEBHOOK_LOG_BUFFERED', '0') == '1'
+WEBHOOK_LOG_BATCH_SIZE = int(os.environ.get('WEBHOOK_LOG_BATCH_SIZE', 200))
+WEBHOOK_LOG_FLUSH_INTERVAL = float(os.environ.get('WEBHOOK_LOG_FLUSH_INTERVAL', 0.25))
+WEBHOOK_LOG_MAX_PENDING = int(os.environ.get('WEBHOOK_LOG_MAX_PENDING', 20000))
+
+# Live webhook stream (core/stream.py, /api/stream-webhook-logs/)
+WEBHOOK_STREAM_POLL_INTERVAL = float(os.environ.get('WEBHOOK_STREAM_POLL_INTERVAL', 0.5))
+WEBHOOK_STREAM_LOOKBACK = float(os.environ.get('WEBHOOK_STREAM_LOOKBACK', 5))
+WEBHOOK_STREAM_MAX_DURATION = float(os.environ.get('WEBHOOK_STREAM_MAX_DURATION', 300))
+# Open streams per worker process; beyond it the endpoint answers 503 and the
+# dashboard polls. Under gthread each stream holds a thread for up to
+# MAX_DURATION seconds, so gunicorn.conf.py adds this many threads on top of
+# GUNICORN_THREADS; under uvicorn a stream is only a task on the event loop.
+WEBHOOK_STREAM_MAX_SUBSCRIBERS = int(os.environ.get(
+    'WEBHOOK_STREAM_MAX_SUBSCRIBERS', 500 if SERVER_MODE == 'asgi' else 32,
+))
+
+# WebhookLog retention (`manage.py purge_webhook_logs`, run it from cron)
+# 0 disables the respective limit.
+WEBHOOK_LOG_RETENTION_DAYS = float(os.environ.get('WEBHOOK_LOG_RETENTION_DAYS', 0))
+WEBHOOK_LOG_MAX_ROWS = int(os.environ.get('WEBHOOK_LOG_MAX_ROWS', 0))
+WEBHOOK_LOG_ARCHIVE_DIR = os.environ.get('WEBHOOK_LOG_ARCHIVE_DIR', '')
+# Set to 1 to store raw_body as NULL when it is exactly json.dumps(body) (rebuilt on read)
+WEBHOOK_LOG_DROP_DUPLICATE_RAW_BODY = os.environ.get('WEBHOOK_LOG_DROP_DUPLICATE_RAW_BODY', '0') == '1'
+
+# Bulk export (/api/export-webhook-logs/, `manage.py export_webhook_logs`): rows per query
+EXPORT_CHUNK_SIZE = int(os.environ.get('EXPORT_CHUNK_SIZE', 2000))
+
+# Batch diagnostics (/api/run-diagnostic-batch/)
+DIAGNOSTIC_BATCH_MAX_CONCURRENCY = int(os.environ.get('DIAGNOSTIC_BATCH_MAX_CONCURRENCY', 32))
+DIAGNOSTIC_BATCH_MAX_JOBS = int(os.environ.get('DIAGNOSTIC_BATCH_MAX_JOBS', 1000))
+
+# Load test mode of /api/run-diagnostic/ (test_type=load)
+DIAGNOSTIC_LOAD_MAX_DURATION = float(os.environ.get('DIAGNOSTIC_LOAD_MAX_DURATION', 30))
+DIAGNOSTIC_LOAD_MAX_CONCURRENCY = int(os.environ.get('DIAGNOSTIC_LOAD_MAX_CONCURRENCY', 64))
+DIAGNOSTIC_LOAD_MAX_RPS = float(os.environ.get('DIAGNOSTIC_LOAD_MAX_RPS', 1000))
+
+# Webhook replay from the dashboard (/api/replay-webhooks/); the
+# `replay_webhooks` command has no limits
+REPLAY_MAX_LOGS = int(os.environ.get('REPLAY_MAX_LOGS', 5000))
+REPLAY_MAX_CONCURRENCY = int(os.environ.get('REPLAY_MAX_CONCURRENCY', 32))
+REPLAY_MAX_DURATION = float(os.environ.get('REPLAY_MAX_DURATION', 60))
+
+# Response bodies of diagnostic probes are streamed: at most PREVIEW_BYTES are
+# kept in memory, and undeclared-length bodies are counted up to MAX_BODY_BYTES
+DIAGNOSTIC_PREVIEW_BYTES = int(os.environ.get('DIAGNOSTIC_PREVIEW_BYTES', 1024 * 1024))
+DIAGNOSTIC_MAX_BODY_BYTES = int(os.environ.get('DIAGNOSTIC_MAX_BODY_BYTES', 10 * 1024 * 1024))
+
+# Latency / fault injection profiles for the mock PSP endpoints (core/faults.py).
+# Edit the file while running; workers reload it within RELOAD_INTERVAL seconds.
+MOCK_PROFILES_FILE = os.environ.get('MOCK_PROFILES_FILE', str(BASE_DIR / 'mock_profiles.json'))
+MOCK_PROFILES_RELOAD_INTERVAL = float(os.environ.get('MOCK_PROFILES_RELOAD_INTERVAL', 1))
+MOCK_DEFAULT_PROFILE = os.environ.get('MOCK_DEFAULT_PROFILE', '')
+
+# Server processes sharing this app; gunicorn.conf.py exports the worker count
+# it resolved. Per-process memory cannot hold mock PSP state across several.
+WEB_CONCURRENCY = int(os.environ.get('WEB_CONCURRENCY') or 1)
+
+# Mock PSP ledger (core/ledger.py). PERSIST adds the MockTransaction table so
+# token reuse, external_id idempotency and status lookups hold across gunicorn
+# workers; on by default with more than one. The in-memory mode is only
+# correct when a single process serves every request.
+MOCK_LEDGER_TTL = int(os.environ.get('MOCK_LEDGER_TTL', 3600))
+MOCK_LEDGER_MAX_ENTRIES = int(os.environ.get('MOCK_LEDGER_MAX_ENTRIES', 200000))
+MOCK_LEDGER_PERSIST = os.environ.get('MOCK_LEDGER_PERSIST', '1' if WEB_CONCURRENCY > 1 else '0') == '1'
+MOCK_TOKEN_TTL = int(os.environ.get('MOCK_TOKEN_TTL', 900))
+
+# Idempotency cache for create-transaction / withdraw-request (core/idempotency.py).
+# DB_TIER shares stored responses and in-flight locks across gunicorn workers
+# (on by default with more than one; memory alone lets a retry that lands on
+# another worker run again).
+IDEMPOTENCY_ENABLED = os.environ.get('IDEMPOTENCY_ENABLED', '1') == '1'
+IDEMPOTENCY_TTL = int(os.environ.get('IDEMPOTENCY_TTL', 86400))
+IDEMPOTENCY_MAX_ENTRIES = int(os.environ.get('IDEMPOTENCY_MAX_ENTRIES', 100000))
+IDEMPOTENCY_DB_TIER = os.environ.get('IDEMPOTENCY_DB_TIER', '1' if WEB_CONCURRENCY > 1 else '0') == '1'
+IDEMPOTENCY_LOCK_TIMEOUT = int(os.environ.get('IDEMPOTENCY_LOCK_TIMEOUT', 30))
+
+# JSON backend of the API views (core/fastjson.py): auto (orjson if installed), orjson or stdlib
+JSON_BACKEND = os.environ.get('JSON_BACKEND', 'auto')
+
+# Request / callback / WebhookLog metrics served at /metrics (core/metrics.py).
+# Each worker snapshots its counters into METRICS_DIR every FLUSH_INTERVAL
+# seconds so the endpoint can sum them; empty METRICS_DIR = this process only.
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') == '1'
+METRICS_DIR = os.environ.get('METRICS_DIR', os.path.join(tempfile.gettempdir(), 'nexkasa-metrics'))
+METRICS_FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL', 5))
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+# Structured JSON logging of the core app (core/log.py): records are queued
+# and written by a background thread. SAMPLE_RATES thins out high-volume
+# events, e.g. "webhook.received=0.1,callback.delivered=0.1".
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+LOG_SAMPLE_RATES = os.environ.get('LOG_SAMPLE_RATES', '')
+LOG_MAX_FIELD_CHARS = int(os.environ.get('LOG_MAX_FIELD_CHARS', 512))
+LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', 10000))
@@ -1,18 +1,33 @@
 from django.contrib import admin
 from django.urls import path
+from django.conf import settings
 from core.views import (
     debug_connection, diagnostic_dashboard, run_diagnostic_test, 
     mock_get_account, mock_create_transaction, mock_withdraw_request,
-    CustomLoginView, logout_view, webhook_listener, get_webhook_logs
+    CustomLoginView, logout_view, webhook_listener, get_webhook_logs,
+    get_webhook_ingest_stats, stream_webhook_logs, run_diagnostic_batch,
+    mock_transaction_status, get_ledger_stats, metrics_endpoint, run_webhook_replay,
+    export_webhook_logs, search_webhook_logs
 )
 from django.contrib.auth.views import LogoutView
 
+if settings.ASYNC_API_VIEWS:
+    # Native async mock endpoints (run under uvicorn workers, SERVER_MODE=asgi)
+    from core.async_views import (
+        mock_get_account, mock_create_transaction, mock_withdraw_request, webhook_listener
+    )
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     
     # Webhook System (New)
     path('api/webhook-listener/', webhook_listener, name='webhook_listener'),
     path('api/get-webhook-logs/', get_webhook_logs, name='get_webhook_logs'),
+    path('api/search-webhook-logs/', search_webhook_logs, name='search_webhook_logs'),
+    path('api/stream-webhook-logs/', stream_webhook_logs, name='stream_webhook_logs'),
+    path('api/webhook-ingest-stats/', get_webhook_ingest_stats, name='webhook_ingest_stats'),
+    path('api/replay-webhooks/', run_webhook_replay, name='replay_webhooks'),
+    path('api/export-webhook-logs/', export_webhook_logs, name='export_webhook_logs'),
     
     # Auth
     path('', CustomLoginView.as_view(), name='login'),
@@ -21,6 +36,7 @@ urlpatterns = [
     # Dashboard & Runner
     path('diagnostics/', diagnostic_dashboard, name='dashboard'),
     path('api/run-diagnostic/', run_diagnostic_test, name='run_diagnostic'),
+    path('api/run-diagnostic-batch/', run_diagnostic_batch, name='run_diagnostic_batch'),
 
     # Target Endpoints (Mock & Debug)
     path('api/test-connection/', debug_connection, name='debug_connection'),
@@ -34,4 +50,11 @@ urlpatterns = [
     
     path('api/public/withdraw-request', mock_withdraw_request, name='mock_withdraw_request'),
     path('api/public/withdraw-request/', mock_withdraw_request, name='mock_withdraw_request_slash'),
+
+    path('api/transaction-status', mock_transaction_status, name='mock_transaction_status'),
+    path('api/transaction-status/', mock_transaction_status, name='mock_transaction_status_slash'),
+    path('api/ledger-stats/', get_ledger_stats, name='ledger_stats'),
+
+    # Prometheus scrape target
+    path('metrics', metrics_endpoint, name='metrics'),
 ]
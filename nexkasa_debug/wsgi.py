@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'nexkasa_debug.settings')
 
 application = get_wsgi_application()
+
+# Public API endpoints take a shorter middleware chain (LEAN_API_PATHS)
+from core.lean import wrap_wsgi  # noqa: E402 (needs the apps loaded above)
+
+application = wrap_wsgi(application)